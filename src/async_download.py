@@ -0,0 +1,182 @@
+import raw_cache
+
+import requests
+from requests.adapters import HTTPAdapter
+import os
+import json
+import random
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+def fetch_years(urls,cache_dir='data/raw_cache',max_concurrency=4,retries=5,backoff=1.0,compression='gzip',revalidate=None,chunk_size=1024*1024,timeout=60):
+    '''
+    Download several archive csv files into the raw cache at once. See fetch_years_async.
+    Returns
+    -------
+    cached_paths : dict
+        url as keys and the path of the cached file as values, urls that failed are left out
+    '''
+    return asyncio.run(fetch_years_async(urls,cache_dir,max_concurrency,retries,backoff,compression,revalidate,chunk_size,timeout))
+
+async def fetch_years_async(urls,cache_dir='data/raw_cache',max_concurrency=4,retries=5,backoff=1.0,compression='gzip',revalidate=None,chunk_size=1024*1024,timeout=60):
+    '''
+    Download archive csv files into the raw cache, up to 'max_concurrency' at a time. Files that are already cached (and current) are not downloaded again.
+    The concurrency is thread based: the HTTP requests are blocking requests calls run on 'max_concurrency' worker threads, and asyncio only schedules them and waits between retries. requests Sessions aren't documented as thread safe, so each worker thread has its own Session, which keeps its connection open for the next file it downloads.
+    Each file is streamed to a '.part' file first. If the connection drops the download is retried with exponential backoff, resuming from the end of the '.part' file with an HTTP Range request. The size is checked against the size reported by the server before the file is compressed into the cache.
+    Parameters
+    ----------
+    urls : list
+    cache_dir : str
+        directory of the raw data cache
+    max_concurrency : int
+        number of files downloaded at the same time, also the number of worker threads
+    retries : int
+        number of times a file is retried before giving up
+    backoff : float
+        seconds to wait before the first retry, doubled for each retry after that
+    compression : str ('gzip' or 'zstd')
+    revalidate : bool
+        see raw_cache.get_cached_csv
+    chunk_size : int
+        number of bytes to stream from the server at a time
+    timeout : float
+        seconds to wait for the server to respond or send data
+    Returns
+    -------
+    cached_paths : dict
+        url as keys and the path of the cached file as values, urls that failed are left out
+    '''
+    os.makedirs(cache_dir,exist_ok=True)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    workers = {'executor': ThreadPoolExecutor(max_workers=max_concurrency), 'local': threading.local(), 'sessions': []}
+    try:
+        tasks = [_fetch_with_retries(workers,semaphore,url,cache_dir,retries,backoff,compression,revalidate,chunk_size,timeout) for url in urls]
+        results = await asyncio.gather(*tasks,return_exceptions=True)
+    finally:
+        workers['executor'].shutdown()
+        for session in workers['sessions']:
+            session.close()
+    cached_paths = {}
+    for url,result in zip(urls,results):
+        if isinstance(result,Exception):
+            print(f'Failed to download {url} ({result})')
+        else:
+            cached_paths[url] = result
+    return cached_paths
+
+def make_session(pool_size=1):
+    '''
+    requests Session whose connection pool can hold 'pool_size' connections to a host. Retries are handled by the downloader so they can resume.
+    '''
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size,pool_maxsize=pool_size,max_retries=0)
+    session.mount('http://',adapter)
+    session.mount('https://',adapter)
+    return session
+
+def _call_with_thread_session(workers,func):
+    '''
+    Call func(session) with the Session of the current worker thread, made the first time the thread needs one.
+    '''
+    if not hasattr(workers['local'],'session'):
+        workers['local'].session = make_session()
+        workers['sessions'].append(workers['local'].session)
+    return func(workers['local'].session)
+
+def _run_in_worker(workers,func):
+    '''
+    Run func(session) on a worker thread and wait for it without blocking the event loop.
+    '''
+    return asyncio.get_running_loop().run_in_executor(workers['executor'],_call_with_thread_session,workers,func)
+
+async def _fetch_with_retries(workers,semaphore,url,cache_dir,retries,backoff,compression,revalidate,chunk_size,timeout):
+    year = url.split('/')[-1].split('.')[0]
+    async with semaphore:
+        cached_path = await _run_in_worker(workers,lambda session: raw_cache.find_cached_csv(url,cache_dir,revalidate,session))
+        if cached_path:
+            return cached_path
+        part_path = os.path.join(cache_dir,f'{year}.csv.part')
+        for attempt in range(retries + 1):
+            try:
+                validators = await _run_in_worker(workers,lambda session: download_with_resume(session,url,part_path,chunk_size,timeout))
+                break
+            except (requests.RequestException,IOError) as e:
+                # dropped connections, timeouts, truncated downloads and server errors are retried, client errors (e.g. 404) are not
+                is_client_error = isinstance(e,requests.HTTPError) and e.response is not None and e.response.status_code < 500
+                if attempt == retries or is_client_error:
+                    raise
+                delay = backoff * 2**attempt * (1 + random.random() / 2)
+                print(f'{year} download failed ({e}), retrying in {delay:.1f} s')
+                await asyncio.sleep(delay)
+        cached_path = await _run_in_worker(workers,lambda session: raw_cache.add_file_to_cache(part_path,url,year,cache_dir,compression,validators,chunk_size))
+        os.remove(part_path)
+        os.remove(part_path + '.json')
+        print(f'{year} downloaded to {cached_path}')
+        return cached_path
+
+def download_with_resume(session,url,part_path,chunk_size=1024*1024,timeout=60):
+    '''
+    Download a file to 'part_path', continuing from the end of it if it already has part of the file.
+    The ETag or Last-Modified of the first response is kept next to the part file and sent as If-Range, so if the remote file changed in the meantime the server sends the whole new file instead of the rest of the old one.
+    Parameters
+    ----------
+    session : requests.Session
+    url : str
+    part_path : str
+    chunk_size : int
+    timeout : float
+    Returns
+    -------
+    validators : dict
+        ETag, Last-Modified and Content-Length (the full size) of the remote file
+    Raises
+    ------
+    IOError
+        if the downloaded size doesn't match the size reported by the server
+    '''
+    part_meta_path = part_path + '.json'
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    part_validators = {}
+    if offset and os.path.exists(part_meta_path):
+        with open(part_meta_path) as f:
+            part_validators = json.load(f)
+    headers = {}
+    if offset and (part_validators.get('ETag') or part_validators.get('Last-Modified')):
+        headers['Range'] = f'bytes={offset}-'
+        headers['If-Range'] = part_validators.get('ETag') or part_validators.get('Last-Modified')
+
+    with session.get(url,headers=headers,stream=True,timeout=timeout) as response:
+        if response.status_code == 416:
+            # the part file should already have the whole file
+            expected_size = int(response.headers.get('Content-Range','*/-1').split('/')[-1])
+            if expected_size != offset:
+                os.remove(part_path)
+                raise IOError(f'part file has {offset} bytes, the remote file has {expected_size}')
+            return part_validators
+        response.raise_for_status()
+        if response.status_code == 206:
+            expected_size = int(response.headers['Content-Range'].split('/')[-1])
+            mode = 'ab'
+        else:
+            # no part file, the server ignored the range, or the file changed: start over
+            expected_size = int(response.headers['Content-Length']) if 'Content-Length' in response.headers else None
+            mode = 'wb'
+            offset = 0
+            part_validators = {header: response.headers.get(header) for header in raw_cache.validator_headers}
+            part_validators['Content-Length'] = None if expected_size is None else str(expected_size)
+            with open(part_meta_path,'w') as f:
+                json.dump(part_validators,f)
+        # a dropped connection ends the body early instead of raising, so the bytes received are kept for the next try (the size is checked below)
+        response.raw.enforce_content_length = False
+        with open(part_path,mode) as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                f.write(chunk)
+
+    size = os.path.getsize(part_path)
+    if expected_size is not None and size != expected_size:
+        raise IOError(f'downloaded {size} of {expected_size} bytes')
+    return part_validators
+
+if __name__ == "__main__":
+    pass
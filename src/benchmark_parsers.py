@@ -0,0 +1,77 @@
+import prep_data as prep
+
+import pandas as pd
+import os
+import time
+import tempfile
+import importlib.util
+
+def to_archive_layout(path,save_dir):
+    '''
+    The sample files were saved by pandas with a header row and an index column. Write a copy in the layout of the archive files (no header or index) so every parser reads the same format.
+    Parameters
+    ----------
+    path : str
+        sample csv file
+    save_dir : str
+        directory to write the copy to
+    Returns
+    -------
+    archive_path : str
+    '''
+    archive_path = os.path.join(save_dir,os.path.basename(path))
+    with open(path) as f_in, open(archive_path,'w') as f_out:
+        header = f_in.readline()
+        has_index = header.startswith(',')
+        for line in f_in:
+            f_out.write(line.split(',',1)[1] if has_index else line)
+    return archive_path
+
+def available_parsers():
+    '''
+    Parser backends that can run in this environment.
+    '''
+    parsers = ['legacy','c']
+    if importlib.util.find_spec('pyarrow') is not None:
+        parsers.append('pyarrow')
+    return parsers
+
+def benchmark_parsers(files,parsers=None,repeats=5):
+    '''
+    Time read_data_of_interest for each parser backend on each file.
+    Parameters
+    ----------
+    files : list
+        csv files to read
+    parsers : list
+        parser backends to compare, defaults to all that are available
+    repeats : int
+        number of times to read each file, the fastest time is reported
+    Returns
+    -------
+    results : DataFrame
+        columns: ['file','parser','rows','seconds','rows_per_second','speedup']. 'speedup' is relative to the 'legacy' parser.
+    '''
+    if parsers is None:
+        parsers = available_parsers()
+    records = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for file in files:
+            archive_path = to_archive_layout(file,tmp_dir)
+            for parser in parsers:
+                times = []
+                for _ in range(repeats):
+                    start = time.perf_counter()
+                    df = prep.read_data_of_interest(archive_path,prep.column_names,prep.columns_of_interest,parser=parser)
+                    times.append(time.perf_counter() - start)
+                records.append({'file': os.path.basename(file), 'parser': parser, 'rows': len(df), 'seconds': min(times)})
+    results = pd.DataFrame(records)
+    results['rows_per_second'] = results['rows'] / results['seconds']
+    legacy_seconds = results[results['parser']=='legacy'].set_index('file')['seconds']
+    results['speedup'] = results['file'].map(legacy_seconds) / results['seconds']
+    return results
+
+if __name__ == "__main__":
+    files = [os.path.join('data','sample_data','2019_sample.csv'),os.path.join('data','sample_data','1994.csv')]
+    results = benchmark_parsers(files)
+    print(results.to_string(index=False,float_format=lambda x: f'{x:,.3f}'))
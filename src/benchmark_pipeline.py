@@ -0,0 +1,250 @@
+import prep_data as prep
+import hypothesis_test as ht
+import status_cube as sc
+import synthetic_data as sd
+
+import pandas as pd
+import numpy as np
+import os
+import sys
+import json
+import time
+import datetime
+import platform
+import argparse
+import tempfile
+import subprocess
+from itertools import combinations
+
+# default data sizes, days of data for each regime
+default_sizes = {'10min': [90,365], '10s': [7,30,90]}
+# years of daily status hours used for combining and hypothesis testing
+default_num_years = [10,25]
+
+acceptable_ranges = {
+    'temperature': (-273,40),
+    'humidity': (0,100),
+    'wind_speed': (0,100),
+    'visibility': (0,100000),
+    'precipitation': (0,100),
+    'dewpoint': (-273,40)
+    }
+thresholds = {
+    'humidity': (75,85),
+    'wind_sust': (10,12),
+    'wind_gust': (15,15),
+    'visibility': (50000,40000),
+    'precipitation': (0,0),
+    'dewpoint_delta': (6,3)
+    }
+
+def time_function(func,make_args,repeats=3):
+    '''
+    Time a function, calling 'make_args' before each run (outside of the timing) so functions that modify their inputs get a fresh copy.
+    Parameters
+    ----------
+    func : function
+    make_args : function
+        returns the tuple of arguments to call 'func' with
+    repeats : int
+    Returns
+    -------
+    seconds : float
+        fastest time of the repeats
+    '''
+    times = []
+    for _ in range(repeats):
+        args = make_args()
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def benchmark_prep_stages(path,regime,days,repeats=3):
+    '''
+    Time each stage of preparing a year of raw data.
+    Parameters
+    ----------
+    path : str
+        archive format csv file
+    regime : str ('10min' or '10s')
+    days : int
+    repeats : int
+    Returns
+    -------
+    records : list of dicts
+    '''
+    raw = prep.read_data_of_interest(path,prep.column_names,prep.columns_of_interest)
+    cleaned = raw.copy()
+    prep.remove_unreasonable_measurements(cleaned,acceptable_ranges,inplace=True)
+    with_wind = prep.determine_wind_sust_and_gust(cleaned.copy())
+    with_wind['dewpoint_delta'] = with_wind['temperature'] - with_wind['dewpoint']
+    with_status = with_wind.copy()
+    with_status['status'] = prep.get_weather_status(with_status,thresholds)
+
+    stages = {
+        'read_data_of_interest': (prep.read_data_of_interest,lambda: (path,prep.column_names,prep.columns_of_interest)),
+        'remove_unreasonable_measurements': (prep.remove_unreasonable_measurements,lambda: (raw.copy(),acceptable_ranges,True)),
+        'determine_wind_sust_and_gust': (prep.determine_wind_sust_and_gust,lambda: (cleaned.copy(),)),
+        'get_weather_status': (prep.get_weather_status,lambda: (with_wind,thresholds)),
+        'clean_and_classify': (prep.clean_and_classify,lambda: (raw.copy(),acceptable_ranges,thresholds)),
+        'generate_status_hours_df': (prep.generate_status_hours_df,lambda: (with_status.copy(),)),
+        }
+    records = []
+    for name,(func,make_args) in stages.items():
+        seconds = time_function(func,make_args,repeats)
+        records.append({'function': name, 'regime': regime, 'days': days, 'rows': len(raw), 'seconds': seconds, 'rows_per_second': len(raw) / seconds})
+    return records
+
+def benchmark_analysis(num_years,tmp_dir,repeats=3):
+    '''
+    Time combining the status hours files and the Mann-Whitney U tests for 'num_years' years of daily data.
+    Returns
+    -------
+    records : list of dicts
+    '''
+    data_dir = os.path.join(tmp_dir,f'status_hours_{num_years}_years')
+    os.makedirs(data_dir,exist_ok=True)
+    for year,df in sd.generate_synthetic_status_hours(range(2000,2000 + num_years),seed=num_years).items():
+        df.to_csv(os.path.join(data_dir,f'status_hours_{year}.csv'))
+    df = prep.combine_status_hour_dfs(data_dir)
+    df = prep.normalize_daily_hours_to_24(df)
+    prep.add_month_year_columns(df)
+    combos = list(combinations(ht.sort_dict_keys_by_values(ht.get_monthly_means(df)),2))
+
+    stages = {
+        'combine_status_hour_dfs': (prep.combine_status_hour_dfs,lambda: (data_dir,)),
+        'build_cube': (sc.build_cube,lambda: (df,)),
+        'mwu_test_month_combos': (ht.mwu_test_month_combos,lambda: (df,combos)),
+        }
+    records = []
+    for name,(func,make_args) in stages.items():
+        seconds = time_function(func,make_args,repeats)
+        records.append({'function': name, 'regime': 'daily', 'days': len(df), 'rows': len(df), 'seconds': seconds, 'rows_per_second': len(df) / seconds})
+    return records
+
+def run_benchmarks(sizes=None,num_years=None,repeats=3,nan_rate=0.01,out_of_range_rate=0.001,seed=0):
+    '''
+    Run the full benchmark suite on synthetic data.
+    Parameters
+    ----------
+    sizes : dict
+        regime ('10min' or '10s') as keys and a list of the number of days to generate as values
+    num_years : list of int
+        numbers of years of daily data to use for the combining and hypothesis testing benchmarks
+    repeats : int
+        number of times each function is timed, the fastest is reported
+    nan_rate : float
+        fraction of missing measurements in the synthetic data
+    out_of_range_rate : float
+        fraction of out of range measurements in the synthetic data
+    seed : int
+    Returns
+    -------
+    results : dict
+        'environment' information and a list of 'results', one for each function and data size
+    '''
+    if sizes is None:
+        sizes = default_sizes
+    if num_years is None:
+        num_years = default_num_years
+    records = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for regime,days_list in sizes.items():
+            for days in days_list:
+                path = os.path.join(tmp_dir,f'{regime}_{days}.csv')
+                sd.write_archive_csv(sd.generate_synthetic_year(2010,regime=regime,days=days,nan_rate=nan_rate,out_of_range_rate=out_of_range_rate,seed=seed),path)
+                print(f'Benchmarking {regime} data, {days} days')
+                records += benchmark_prep_stages(path,regime,days,repeats)
+        for n in num_years:
+            print(f'Benchmarking analysis, {n} years')
+            records += benchmark_analysis(n,tmp_dir,repeats)
+    settings = {'sizes': sizes, 'num_years': list(num_years), 'repeats': repeats, 'nan_rate': nan_rate, 'out_of_range_rate': out_of_range_rate, 'seed': seed}
+    return {'environment': get_environment(), 'settings': settings, 'results': records}
+
+def get_environment():
+    '''
+    Information to identify where and on what commit the benchmarks were run.
+    '''
+    try:
+        commit = subprocess.run(['git','rev-parse','--short','HEAD'],capture_output=True,text=True,check=True).stdout.strip()
+    except (OSError,subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count()
+        }
+
+def save_results(results,save_dir='benchmarks'):
+    '''
+    Save benchmark results as JSON, named by commit and time.
+    Returns
+    -------
+    path : str
+    '''
+    os.makedirs(save_dir,exist_ok=True)
+    env = results['environment']
+    timestamp = env['timestamp'].replace(':','').replace('-','')
+    path = os.path.join(save_dir,f'benchmark_{timestamp}_{env["commit"] or "nocommit"}.json')
+    with open(path,'w') as f:
+        json.dump(results,f,indent=2)
+    return path
+
+def load_results(path):
+    '''
+    Load benchmark results saved with save_results as a DataFrame.
+    '''
+    with open(path) as f:
+        return pd.DataFrame(json.load(f)['results'])
+
+def compare_results(baseline_path,current_path,tolerance=1.2):
+    '''
+    Compare two benchmark runs. Functions that are more than 'tolerance' times slower than the baseline are flagged as regressions.
+    Parameters
+    ----------
+    baseline_path : str
+    current_path : str
+    tolerance : float
+    Returns
+    -------
+    comparison : DataFrame
+    '''
+    keys = ['function','regime','days']
+    baseline = load_results(baseline_path).set_index(keys)['seconds']
+    current = load_results(current_path).set_index(keys)['seconds']
+    comparison = pd.DataFrame({'baseline_seconds': baseline,'current_seconds': current}).dropna()
+    comparison['ratio'] = comparison['current_seconds'] / comparison['baseline_seconds']
+    comparison['is_regression'] = comparison['ratio'] > tolerance
+    return comparison.reset_index()
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description='Benchmark the data preparation and analysis pipeline on synthetic IfA format data.')
+    parser.add_argument('--days-10min',type=int,nargs='*',default=default_sizes['10min'],help='days of 10 minute average data to benchmark')
+    parser.add_argument('--days-10s',type=int,nargs='*',default=default_sizes['10s'],help='days of 10 second raw data to benchmark')
+    parser.add_argument('--years',type=int,nargs='*',default=default_num_years,help='years of daily data for the combine and hypothesis test benchmarks')
+    parser.add_argument('--repeats',type=int,default=3)
+    parser.add_argument('--nan-rate',type=float,default=0.01)
+    parser.add_argument('--out-of-range-rate',type=float,default=0.001)
+    parser.add_argument('--save-dir',default='benchmarks',help='directory to save the JSON results to')
+    parser.add_argument('--compare',help='earlier JSON results to compare against')
+    parser.add_argument('--tolerance',type=float,default=1.2,help='slowdown ratio that counts as a regression')
+    return parser.parse_args(args)
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    sizes = {'10min': args.days_10min, '10s': args.days_10s}
+    results = run_benchmarks(sizes,args.years,args.repeats,args.nan_rate,args.out_of_range_rate)
+    path = save_results(results,args.save_dir)
+    print(pd.DataFrame(results['results']).to_string(index=False,float_format=lambda x: f'{x:,.4f}'))
+    print(f'\nResults saved to {path}')
+    if args.compare:
+        comparison = compare_results(args.compare,path,args.tolerance)
+        print(comparison.to_string(index=False,float_format=lambda x: f'{x:,.3f}'))
+        if comparison['is_regression'].any():
+            sys.exit(1)
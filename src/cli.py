@@ -0,0 +1,289 @@
+'''
+Command line interface for the pipeline, e.g.
+
+    python src/cli.py status
+    python src/cli.py fetch --years 2018 2019
+    python src/cli.py prep --config my_config.json
+    python src/cli.py combine
+    python src/cli.py update --follow 300
+    python src/cli.py raw-store --years 2018 2019
+    python src/cli.py test
+    python src/cli.py plot --preview
+
+Each subcommand only imports the modules it needs, so light commands like 'status' start quickly.
+'''
+import utilities as ut
+import config as cfg
+
+import os
+import sys
+import json
+import argparse
+
+def get_data_dir(args,config):
+    '''
+    Directory of the prepped data to use, the given one or the most recent 'prepped_data_XXXX'.
+    '''
+    if args.data_dir:
+        return args.data_dir
+    last_number_string = ut.get_last_number_string(config['data_dir'],'prepped_data')
+    if not last_number_string:
+        sys.exit(f'No prepped data found in {config["data_dir"]}, run the prep command first')
+    return os.path.join(config['data_dir'],f'prepped_data_{last_number_string}')
+
+def get_results_dir(args,config):
+    '''
+    Directory for the results, the given one or a new 'results_XXXX'.
+    '''
+    if args.results_dir:
+        os.makedirs(args.results_dir,exist_ok=True)
+        return args.results_dir
+    os.makedirs(config['results_dir'],exist_ok=True)
+    return ut.make_numbered_directory(parent_dir=config['results_dir'],base_name='results')
+
+def filter_urls_by_year(csv_urls,years,skip_years):
+    '''
+    Keep the urls for 'years' (all if None) that aren't in 'skip_years'.
+    '''
+    kept = []
+    for url in csv_urls:
+        year = ut.get_year_number(os.path.basename(url))
+        if year in skip_years or (years and year not in years):
+            continue
+        kept.append(url)
+    return kept
+
+def status_command(args,config):
+    '''
+    Print the prepped years of a data directory and the state of the caches.
+    '''
+    data_dir = get_data_dir(args,config)
+    years = ut.get_years(data_dir)
+    manifest = ut.load_manifest(data_dir)
+    print(f'Data directory: {data_dir}')
+    print(f'Years prepped ({len(years)}): {" ".join(years)}')
+    missing_from_manifest = [year for year in years if year not in manifest]
+    if missing_from_manifest:
+        print(f'Years without a manifest entry: {" ".join(missing_from_manifest)}')
+    print(f'Store: {"yes" if os.path.exists(os.path.join(data_dir,"daily_status.sqlite")) else "no"}')
+    print(f'Combined file: {"yes" if os.path.exists(os.path.join(data_dir,"combined_status_hours.csv")) else "no"}')
+    for name in ['raw_cache_dir','parsed_cache_dir']:
+        cache_dir = config[name]
+        if not cache_dir:
+            print(f'{name}: disabled')
+            continue
+        num_entries = len(os.listdir(cache_dir)) if os.path.isdir(cache_dir) else 0
+        print(f'{name}: {cache_dir} ({num_entries} entries)')
+    if os.path.exists(os.path.join(config['raw_store_dir'],'meta.json')):
+        with open(os.path.join(config['raw_store_dir'],'meta.json')) as f:
+            raw_store_meta = json.load(f)
+        print(f'raw_store_dir: {config["raw_store_dir"]} ({raw_store_meta["rows"]:,} rows, years {" ".join(raw_store_meta["years"])})')
+    if args.json:
+        print(json.dumps({'data_dir': data_dir, 'years': years, 'missing_from_manifest': missing_from_manifest}))
+
+def fetch_command(args,config):
+    '''
+    Download the archive files into the raw cache.
+    '''
+    import prep_data as prep
+    import async_download
+
+    csv_urls = filter_urls_by_year(prep.get_csv_file_links(config['base_url']),args.years,config['skip_years'])
+    cached_paths = async_download.fetch_years(csv_urls,cache_dir=config['raw_cache_dir'],max_concurrency=config['max_concurrency'])
+    print(f'{len(cached_paths)} of {len(csv_urls)} files in {config["raw_cache_dir"]}')
+    if len(cached_paths) < len(csv_urls):
+        sys.exit(1)
+
+def prep_command(args,config):
+    '''
+    Prepare the daily status hours for every year into a new (or the given) prepped data directory.
+    '''
+    import prep_data as prep
+    import instrumentation as ins
+
+    if args.data_dir:
+        data_dir = args.data_dir
+        os.makedirs(data_dir,exist_ok=True)
+    else:
+        os.makedirs(config['data_dir'],exist_ok=True)
+        data_dir = ut.make_numbered_directory(parent_dir=config['data_dir'],base_name='prepped_data')
+    csv_urls = filter_urls_by_year(prep.get_csv_file_links(config['base_url']),args.years,config['skip_years'])
+    if args.streaming:
+        # download, parse and compute overlapped, the downloads are cached as they stream in
+        import streaming_pipeline
+        timings = streaming_pipeline.prep_all_available_data_streaming(csv_urls,config['acceptable_ranges'],config['thresholds'],save_path=data_dir,cache_dir=config['raw_cache_dir'],num_workers=config['num_workers'],parsed_cache_dir=config['parsed_cache_dir'],chunksize=config['chunksize'] or 100000,parser=config['parser'],previous_runs_dir=config['data_dir'])
+    else:
+        if config['raw_cache_dir']:
+            import async_download
+            async_download.fetch_years(csv_urls,cache_dir=config['raw_cache_dir'],max_concurrency=config['max_concurrency'])
+        timings = prep.prep_all_available_data(csv_urls,config['acceptable_ranges'],config['thresholds'],save_path=data_dir,num_workers=config['num_workers'],cache_dir=config['raw_cache_dir'],parsed_cache_dir=config['parsed_cache_dir'],chunksize=config['chunksize'],parser=config['parser'],previous_runs_dir=config['data_dir'])
+
+    # record the set up info to a file
+    years = ut.get_years(data_dir)
+    with open(os.path.join(data_dir,'run_info.txt'),'a') as f:
+        ut.record_setup(config['thresholds'],config['acceptable_ranges'],years,f)
+    cfg.save_config(config,os.path.join(data_dir,'config.json'))
+    if timings:
+        print(ins.summarize_timings(timings).to_string(float_format=lambda x: f'{x:,.2f}'))
+    print(f'Prepped data saved to {data_dir}')
+
+def update_command(args,config):
+    '''
+    Update the tables of the current (or given) year with the rows appended to its archive file since the last update, once or every --follow seconds.
+    '''
+    import prep_data as prep
+    import incremental
+    import datetime
+
+    data_dir = get_data_dir(args,config)
+    link = args.file
+    if not link:
+        year = args.year or datetime.date.today().year
+        urls = filter_urls_by_year(prep.get_csv_file_links(config['base_url']),[year],set())
+        if not urls:
+            sys.exit(f'No archive file found for {year}')
+        link = urls[0]
+    if args.follow:
+        incremental.follow_year(link,config['acceptable_ranges'],config['thresholds'],save_path=data_dir,interval=args.follow)
+        return
+    updated = incremental.update_year(link,config['acceptable_ranges'],config['thresholds'],save_path=data_dir,flush=args.flush)
+    print(f'{len(updated)} days updated in {data_dir}')
+    if len(updated):
+        print(updated.tail())
+
+def raw_store_command(args,config):
+    '''
+    Add the cleaned raw measurements of every year (or the given ones) to the memory mapped raw store.
+    '''
+    import prep_data as prep
+    import raw_store
+
+    csv_urls = filter_urls_by_year(prep.get_csv_file_links(config['base_url']),args.years,config['skip_years'])
+    if config['raw_cache_dir']:
+        import async_download
+        async_download.fetch_years(csv_urls,cache_dir=config['raw_cache_dir'],max_concurrency=config['max_concurrency'])
+    meta = raw_store.build_store(csv_urls,config['acceptable_ranges'],store_dir=config['raw_store_dir'],float_dtype=args.float_dtype,parser=config['parser'],cache_dir=config['raw_cache_dir'])
+    print(f'{meta["rows"]:,} rows from {len(meta["years"])} years in {config["raw_store_dir"]}')
+
+def combine_command(args,config):
+    '''
+    Export the daily status hours of every year (or the days selected) to 'combined_status_hours.csv'.
+    '''
+    data_dir = get_data_dir(args,config)
+    df = load_combined(data_dir,args,config)
+    ut.save_df_to_csv(df,'combined_status_hours',data_dir)
+    print(f'Combined {len(df)} days from {data_dir}')
+
+def load_combined(data_dir,args,config):
+    '''
+    Load the daily status hours for the analysis from the store of the prepped data (see prep_data.load_status_hours), only the days selected with --start, --end, --months and --years.
+    '''
+    import prep_data as prep
+
+    if not ut.get_years(data_dir):
+        sys.exit(f'No prepped data found in {data_dir}, run the prep command first')
+    return prep.load_status_hours(data_dir,start=args.start,end=args.end,months=args.months,years=args.years,min_coverage=config['min_coverage'])
+
+def test_command(args,config):
+    '''
+    Mann-Whitney U tests, bootstrap confidence intervals and permutation p values for each pair of months.
+    '''
+    import hypothesis_test as ht
+    import resampling as rs
+    from itertools import combinations
+
+    data_dir = get_data_dir(args,config)
+    df = load_combined(data_dir,args,config)
+    results_dir = get_results_dir(args,config)
+    ut.copy_txt_files(data_dir,results_dir)
+
+    # sort the months by mean to make results easier to read
+    months_sorted_by_mean = ht.sort_dict_keys_by_values(ht.get_monthly_means(df,column=args.column))
+    combos = list(combinations(months_sorted_by_mean,2))
+    num_combos = len(combos)
+    alpha = config['alpha']
+    fwer = 1 - (1 - alpha)**num_combos
+    alpha_adj = alpha / num_combos
+    with open(os.path.join(results_dir,'run_info.txt'),'a') as f:
+        print(f'\nThe family-wise error rate for alpha={alpha} and {num_combos} combinations is: {fwer}',file=f)
+        print(f'Apply a Bonferroni correction and use an adjusted alpha of {alpha_adj:.5f}',file=f)
+    results = ht.mwu_test_month_combos(df,combos,column=args.column,alpha=alpha_adj,is_alpha_adjusted=True)
+    ut.save_df_to_csv(results,'hyp_test_results',results_dir)
+    if config['num_resamples']:
+        resampling_results = rs.resample_month_combos(df,combos,column=args.column,num_resamples=config['num_resamples'],seed=config['seed'],num_workers=config['num_workers'])
+        ut.save_df_to_csv(resampling_results,'resampling_results',results_dir)
+
+    # view significant results
+    print(results[results['is_significant']==True].drop('is_significant',axis=1))
+    print(f'Results saved to {results_dir}')
+
+def plot_command(args,config):
+    '''
+    Render the report figures into the 'images' directory of the results.
+    '''
+    import myplots
+
+    data_dir = get_data_dir(args,config)
+    df = load_combined(data_dir,args,config)
+    image_dir = os.path.join(get_results_dir(args,config),'images')
+    os.makedirs(image_dir,exist_ok=True)
+    myplots.render_figures(df,image_dir,preview=args.preview or config['preview_plots'],num_workers=config['num_workers'])
+    print(f'Figures saved to {image_dir}')
+
+commands = {'status': status_command, 'fetch': fetch_command, 'prep': prep_command, 'update': update_command, 'raw-store': raw_store_command, 'combine': combine_command, 'test': test_command, 'plot': plot_command}
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description='Haleakala weather conditions pipeline.')
+    parser.add_argument('--config',help='JSON file with the settings to use instead of the defaults (see config.py)')
+    parser.add_argument('--workers',type=int,help='number of worker processes')
+    subparsers = parser.add_subparsers(dest='command',required=True)
+
+    status_parser = subparsers.add_parser('status',help='show the prepped years and the caches')
+    status_parser.add_argument('--data-dir',help='prepped data directory, defaults to the most recent one')
+    status_parser.add_argument('--json',action='store_true',help='also print the status as JSON')
+
+    for name,description in [('fetch','download the archive files into the raw cache'),('prep','prepare the daily status hours of each year')]:
+        sub = subparsers.add_parser(name,help=description)
+        sub.add_argument('--years',type=int,nargs='*',help='only these years, defaults to all')
+        if name == 'prep':
+            sub.add_argument('--data-dir',help='directory to save the prepped data to, defaults to a new prepped_data_XXXX')
+            sub.add_argument('--streaming',action='store_true',help='overlap the download, parsing and computing of each year')
+
+    update_parser = subparsers.add_parser('update',help='add the rows appended to the archive file of a year since the last update')
+    update_parser.add_argument('--data-dir',help='prepped data directory, defaults to the most recent one')
+    update_parser.add_argument('--year',type=int,help='year to update, defaults to the current year')
+    update_parser.add_argument('--file',help='path or url of the growing csv file to read instead of the archive file of the year')
+    update_parser.add_argument('--follow',type=float,help='keep updating every FOLLOW seconds')
+    update_parser.add_argument('--flush',action='store_true',help='the file is complete, also count its last row')
+
+    raw_store_parser = subparsers.add_parser('raw-store',help='add the cleaned raw measurements to the memory mapped raw store')
+    raw_store_parser.add_argument('--years',type=int,nargs='*',help='only these years, defaults to all')
+    raw_store_parser.add_argument('--float-dtype',default='float64',choices=['float64','float32'],help='dtype to store the measurements as')
+
+    combine_parser = subparsers.add_parser('combine',help='export the prepped days to one csv file')
+    combine_parser.add_argument('--data-dir',help='prepped data directory, defaults to the most recent one')
+
+    test_parser = subparsers.add_parser('test',help='hypothesis tests between each pair of months')
+    test_parser.add_argument('--data-dir',help='prepped data directory, defaults to the most recent one')
+    test_parser.add_argument('--results-dir',help='directory to save the results to, defaults to a new results_XXXX')
+    test_parser.add_argument('--column',default='Green',choices=['Green','Yellow','Red'])
+
+    plot_parser = subparsers.add_parser('plot',help='render the report figures')
+    plot_parser.add_argument('--data-dir',help='prepped data directory, defaults to the most recent one')
+    plot_parser.add_argument('--results-dir',help='directory to save the figures to, defaults to a new results_XXXX')
+    plot_parser.add_argument('--preview',action='store_true',help='save low dpi figures for a quick look')
+
+    for sub in [combine_parser,test_parser,plot_parser]:
+        sub.add_argument('--start',help='first day to use (YYYY-MM-DD)')
+        sub.add_argument('--end',help='last day to use (YYYY-MM-DD)')
+        sub.add_argument('--months',nargs='*',help='only these months (Jan, Feb, ... or 1-12)')
+        sub.add_argument('--years',type=int,nargs='*',help='only these years')
+    return parser.parse_args(args)
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    config = cfg.load_config(args.config,overrides={'num_workers': args.workers})
+    commands[args.command](args,config)
+
+if __name__ == "__main__":
+    main()
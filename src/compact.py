@@ -0,0 +1,127 @@
+'''
+Compact memory mode for prepped years, so several 10 second years fit in memory at once for cross-year studies. Compared to the frames of prep_data.clean_and_classify:
+    - the measurements and derived columns are float32
+    - '10min' is a bool
+    - the timestamps are a uint32 'time' column of epoch seconds (local time, as in the archive) with a RangeIndex
+    - 'status' stays a Categorical (int8 codes)
+    - columns that are mostly NaN (e.g. 'wind_gust' of the 10 min average years) are sparse
+
+The measurements are read and classified as float32, so a value within float32 rounding of a threshold can get a different status than with float64. On the 2019 archive and a synthetic 10 second year this changed about 1 row in 20000 and the daily hours of a status by at most 0.012 hours (under a minute), see status_hours_tolerance.
+'''
+import prep_data as prep
+
+import pandas as pd
+import numpy as np
+
+# bound on the difference in the daily hours of a status between the compact and the full precision frames (a minute, at most 0.012 hours was seen)
+status_hours_tolerance = 1 / 60
+# columns with more than this fraction of NaN are stored sparse
+sparse_min_nan_fraction = 0.5
+
+def compact_frame(df,sparse_min_nan_fraction=sparse_min_nan_fraction):
+    '''
+    Compact copy of a raw or prepped frame.
+    Parameters
+    ----------
+    df : DataFrame
+        datetime index and the columns of read_data_of_interest, optionally with those added by clean_and_classify
+    sparse_min_nan_fraction : float
+        columns with more than this fraction of NaN are stored as a sparse array of only their values
+    Returns
+    -------
+    compact_df : DataFrame
+    '''
+    seconds = df.index.as_unit('s').asi8
+    if len(seconds) and (seconds.min() < 0 or seconds.max() > np.iinfo(np.uint32).max):
+        raise ValueError('Timestamps must be between 1970 and 2106 to be stored as uint32 seconds')
+    columns = {'time': seconds.astype(np.uint32)}
+    for col in df.columns:
+        values = df[col]
+        if col == '10min':
+            columns[col] = values.to_numpy() == 1
+        elif isinstance(values.dtype,pd.CategoricalDtype):
+            columns[col] = values.array
+        elif values.isna().mean() > sparse_min_nan_fraction:
+            columns[col] = pd.arrays.SparseArray(values.to_numpy(dtype=np.float32),fill_value=np.nan)
+        else:
+            columns[col] = values.to_numpy(dtype=np.float32)
+    return pd.DataFrame(columns)
+
+def expand_frame(df):
+    '''
+    Frame like the ones of prep_data (datetime index, float64 measurements, float '10min') from a compact one, for functions that need them.
+    '''
+    expanded = {}
+    for col in df.columns:
+        if col == 'time':
+            continue
+        values = df[col]
+        if col == '10min':
+            expanded[col] = values.to_numpy().astype(float)
+        elif isinstance(values.dtype,pd.CategoricalDtype):
+            # the array, a Series would be aligned on the RangeIndex
+            expanded[col] = values.array
+        else:
+            expanded[col] = np.asarray(values,dtype=float)
+    return pd.DataFrame(expanded,index=get_datetime_index(df))
+
+def get_datetime_index(df):
+    '''
+    DatetimeIndex of the 'time' column of a compact frame.
+    '''
+    return pd.DatetimeIndex(df['time'].to_numpy().astype('datetime64[s]').astype('datetime64[ns]'),name='date_time')
+
+def bytes_per_row(df):
+    '''
+    Memory used by a frame (including its index and object values) per row.
+    '''
+    return df.memory_usage(index=True,deep=True).sum() / max(len(df),1)
+
+def load_compact_year(link,range_limits,thresholds,parser='auto'):
+    '''
+    Read, clean and classify a year as float32 and keep it as a compact frame, printing the bytes per row of the full precision prepped frame it replaces and of the compact one.
+    Parameters
+    ----------
+    link : str
+        URL or path of the CSV file to read
+    range_limits : dict
+        lower and upper limits for each columns except the date_time
+    thresholds : dict
+        (green, red) thresholds, see prep_data.get_and_prep_data
+    parser : str
+        see prep_data.read_data_of_interest
+    Returns
+    -------
+    compact_df : DataFrame
+    '''
+    df = prep.read_data_of_interest(link,prep.column_names,prep.columns_of_interest,parser=parser,float_dtype='float32')
+    prepped = prep.clean_and_classify(df,range_limits,thresholds)
+    # the frame of a full precision run has the same columns as float64
+    full_precision_bytes = bytes_per_row(prepped.astype({col: np.float64 for col in prepped.columns if prepped[col].dtype == np.float32}))
+    compact_df = compact_frame(prepped)
+    print(f'{prep.get_year_from_url(link)}: {full_precision_bytes:.1f} bytes per row at full precision, {bytes_per_row(compact_df):.1f} compact')
+    return compact_df
+
+def load_compact_years(links,range_limits,thresholds,parser='auto'):
+    '''
+    load_compact_year for several years.
+    Returns
+    -------
+    years : dict
+        years as keys and compact frames as values
+    '''
+    return {prep.get_year_from_url(link): load_compact_year(link,range_limits,thresholds,parser=parser) for link in links}
+
+def get_status_hours(df):
+    '''
+    Daily, hour of day and night status hours of a compact prepped frame (see prep_data.get_status_seconds), only the timestamps, '10min' and 'status' are expanded to do it.
+    Returns
+    -------
+    tables : dict
+        'status_hours', 'hourly_status' and 'night_status'
+    '''
+    view = pd.DataFrame({'10min': df['10min'].to_numpy(), 'status': df['status'].to_numpy()},index=get_datetime_index(df))
+    return prep.finish_status_tables(prep.get_status_seconds(view))
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,87 @@
+import os
+import json
+import copy
+
+# settings used when no config file is given, the same as the ones in main.py
+default_config = {
+    # link for data files
+    'base_url': 'http://kopiko.ifa.hawaii.edu/weather/archivedata/',
+    # reasonable ranges for each column
+    'acceptable_ranges': {
+        'temperature': (-273,40),
+        'humidity': (0,100),
+        'wind_speed': (0,100),
+        'visibility': (0,100000),
+        'precipitation': (0,100),
+        'dewpoint': (-273,40)
+        },
+    # thresholds for ('Green', 'Red') weather
+    'thresholds': {
+        'humidity': (75,85),
+        'wind_sust': (10,12),
+        'wind_gust': (15,15),
+        'visibility': (50000,40000),
+        'precipitation': (0,0),
+        'dewpoint_delta': (6,3)
+        },
+    # years that don't have data (1993) or have formatting issues (2020-2021)
+    'skip_years': [1993,2020,2021],
+    # number of worker processes, None uses every cpu
+    'num_workers': None,
+    'data_dir': 'data',
+    'results_dir': 'results',
+    'raw_cache_dir': os.path.join('data','raw_cache'),
+    'parsed_cache_dir': os.path.join('data','parsed_cache'),
+    # memory mapped store of the cleaned raw measurements of every year (see raw_store.py)
+    'raw_store_dir': os.path.join('data','raw_store'),
+    # number of archive files downloaded at the same time
+    'max_concurrency': 4,
+    'chunksize': None,
+    'parser': 'auto',
+    'alpha': 0.05,
+    'num_resamples': 10000,
+    'seed': 0,
+    'preview_plots': False,
+    # days with less than this fraction measured are left out of the combined data, None keeps every day
+    'min_coverage': None
+    }
+
+def load_config(path=None,overrides=None):
+    '''
+    Load the settings for a run. Any setting missing from the file uses the value in default_config.
+    Parameters
+    ----------
+    path : str
+        JSON file with the settings to change, if None the defaults are used
+    overrides : dict
+        settings that take precedence over the file (e.g. from command line arguments), None values are ignored
+    Returns
+    -------
+    config : dict
+    '''
+    config = copy.deepcopy(default_config)
+    if path:
+        with open(path) as f:
+            config.update(json.load(f))
+    if overrides:
+        config.update({key: value for key,value in overrides.items() if value is not None})
+    # JSON has no tuples, the pipeline expects (low,high) tuples
+    for key in ['acceptable_ranges','thresholds']:
+        config[key] = {col: tuple(limits) for col,limits in config[key].items()}
+    config['skip_years'] = set(int(year) for year in config['skip_years'])
+    return config
+
+def save_config(config,path):
+    '''
+    Save the settings of a run as JSON so it can be repeated with load_config.
+    Parameters
+    ----------
+    config : dict
+    path : str
+    '''
+    config = dict(config,skip_years=sorted(config['skip_years']))
+    with open(path,'w') as f:
+        json.dump(config,f,indent=2)
+
+if __name__ == "__main__":
+    pass
@@ -1,29 +1,27 @@
-import utilities as ut
+import status_cube as sc
 
-import os
 import scipy.stats as stats
+from scipy import special
 import pandas as pd
+import numpy as np
 from itertools import combinations
 import shutil
 
-def get_monthly_means(df,column='Green'):
+def get_monthly_means(data,column='Green'):
     '''
     Parameters
     ----------
-    df : DataFrame
-        df must have 'months' as a column, with three letter abreviations as the values (Jan, Feb, ...)
+    data : DataFrame or dict
+        daily hours with the dates as the index, or a cube of them from status_cube.build_cube (to reuse one already built)
     column : string
         Column name to calculate the mean for
     Returns
     -------
     monthly_means : dict
-        Dictionary with month abbreviations as the keys and the corresponding mean of column as the values.
+        Dictionary with month abbreviations as the keys and the corresponding mean of column as the values. Months without any days (e.g. filtered out) are left out.
     '''
-    months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
-    monthly_means = {}
-    for month in months:
-        monthly_means[month] = df[df['month']==month][column].mean()
-    return monthly_means
+    cube = data if isinstance(data,dict) else sc.build_cube(data,[column])
+    return sc.summarize(cube,column,by='month')['mean'].dropna().to_dict()
 
 def sort_dict_keys_by_values(d,descending=True):
     '''
@@ -40,6 +38,134 @@ def sort_dict_keys_by_values(d,descending=True):
     sorted_keys = sorted(d,key=d.get,reverse=descending)
     return sorted_keys
 
+def sort_groups(df,column='Green',group_column='month'):
+    '''
+    Split the values of a column by group and sort each group, with a single sort of the whole column. The sorted groups can then be compared pairwise without ranking the data again.
+    Parameters
+    ----------
+    df : DataFrame
+    column : str
+        Column name to grab values from
+    group_column : str
+        Column with the group labels, e.g. 'month', 'year' or 'threshold_set'
+    Returns
+    -------
+    sorted_groups : dict
+        group labels as keys (in category order for categorical columns, otherwise sorted) and sorted arrays of the values as values. NaN values are left out.
+    '''
+    values = df[column].to_numpy(dtype=float)
+    codes,labels = pd.factorize(df[group_column],sort=True)
+    is_valid = ~np.isnan(values) & (codes >= 0)
+    values,codes = values[is_valid],codes[is_valid]
+    order = np.lexsort((values,codes))
+    splits = np.cumsum(np.bincount(codes,minlength=len(labels)))[:-1]
+    return dict(zip(labels,np.split(values[order],splits)))
+
+def _tie_counts(x):
+    '''
+    Unique values of a sorted array and the number of times each occurs.
+    '''
+    if len(x) == 0:
+        return x,np.zeros(0,dtype=np.int64)
+    starts = np.flatnonzero(np.r_[True,x[1:] != x[:-1]])
+    return x[starts],np.diff(np.r_[starts,len(x)])
+
+def mwu_sorted_groups(sorted_groups,pairs,use_continuity=True):
+    '''
+    Two-sided Mann-Whitney U test for each pair of sorted groups. The U statistic and the tie correction of each pair come from merging the two sorted groups, instead of ranking the combined values from scratch. Gives the same results as scipy.stats.mannwhitneyu with the default method ('auto').
+    Parameters
+    ----------
+    sorted_groups : dict
+        output of sort_groups
+    pairs : list
+        List of tuples of the two groups to compare
+    use_continuity : bool
+        whether a continuity correction is applied to the normal approximation
+    Returns
+    -------
+    u_statistics : array
+        U statistic of the first group of each pair
+    p_values : array
+    '''
+    # groups without any values (e.g. unobserved categories) give NaN p values
+    sorted_groups = {group: sorted_groups.get(group,np.empty(0)) for pair in pairs for group in pair}
+    tie_counts = {group: _tie_counts(x) for group,x in sorted_groups.items()}
+    n1 = np.array([len(sorted_groups[group1]) for group1,_ in pairs],dtype=float)
+    n2 = np.array([len(sorted_groups[group2]) for _,group2 in pairs],dtype=float)
+    u1 = np.empty(len(pairs))
+    tie_term = np.empty(len(pairs))
+    exact_p = {}
+    for i,(group1,group2) in enumerate(pairs):
+        y = sorted_groups[group2]
+        unique1,counts1 = tie_counts[group1]
+        counts2 = tie_counts[group2][1]
+        # number of values in y below and equal to each unique value of x
+        below = np.searchsorted(y,unique1,side='left')
+        equal = np.searchsorted(y,unique1,side='right') - below
+        u1[i] = (counts1 * (2 * below + equal)).sum() / 2
+        # tie counts of the combined values: the matched values of both groups plus the unmatched values of y
+        tie_term[i] = (_cube_minus(counts1 + equal).sum() + _cube_minus(counts2).sum() - _cube_minus(equal).sum())
+        # scipy uses the exact distribution for small samples without ties
+        if (n1[i] <= 8 or n2[i] <= 8) and n1[i] > 0 and n2[i] > 0 and tie_term[i] == 0:
+            exact_p[i] = stats.mannwhitneyu(sorted_groups[group1],y,use_continuity=use_continuity,method='exact').pvalue
+
+    n = n1 + n2
+    u = np.maximum(u1,n1 * n2 - u1)
+    with np.errstate(divide='ignore',invalid='ignore'):
+        s = np.sqrt(n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1))))
+        z = (u - n1 * n2 / 2 - (0.5 if use_continuity else 0)) / s
+    p_values = np.clip(2 * special.ndtr(-z),0,1)
+    for i,p in exact_p.items():
+        p_values[i] = p
+    p_values[(n1 == 0) | (n2 == 0)] = np.nan
+    return u1,p_values
+
+def _cube_minus(counts):
+    counts = np.asarray(counts,dtype=float)
+    return counts**3 - counts
+
+def mwu_test_group_combos(df, combos=None, column='Green', group_column='month', alpha=0.05, is_alpha_adjusted=False):
+    '''
+    Performs a Mann-Whitney U test on each combination of groups, e.g. months, years or threshold sets. The values are grouped and sorted once and shared by every test.
+    Parameters
+    ----------
+    df : DataFrame
+        Contains the daily hours for each status
+    combos : list
+        List of tuples containing the group combinations. If None every combination of the groups in 'group_column' is tested.
+    column : str ('Green','Yellow','Red')
+        Column name to grab values from 
+    group_column : str
+        Column with the group labels
+    alpha : float
+        Significance threshold, see mwu_test_month_combos
+    is_alpha_adjusted : bool
+        If True uses 'alpha' as significance threshold for each test. If False, applies Bonferroni correction ('alpha'/len('combos')) for individual tests.
+    Returns
+    -------
+    results : DataFrame
+        Data Frame with columns: ['group_1', 'group_2', 'group_1_mean', 'group_2_mean', 'mean_diff', 'u_statistic', 'p_value', 'is_significant'], and rows are each combination of groups.
+    '''
+    sorted_groups = sort_groups(df,column,group_column)
+    if combos is None:
+        combos = list(combinations(sorted_groups,2))
+    if not is_alpha_adjusted:
+        alpha = alpha/len(combos)
+
+    u_statistics,p_values = mwu_sorted_groups(sorted_groups,combos)
+    means = {group: x.mean() if len(x) else np.nan for group,x in sorted_groups.items()}
+    results = pd.DataFrame({
+            'group_1': [group1 for group1,_ in combos],
+            'group_2': [group2 for _,group2 in combos],
+            'group_1_mean': [means.get(group1,np.nan) for group1,_ in combos],
+            'group_2_mean': [means.get(group2,np.nan) for _,group2 in combos]
+            })
+    results['mean_diff'] = results['group_1_mean'] - results['group_2_mean']
+    results['u_statistic'] = u_statistics
+    results['p_value'] = p_values
+    results['is_significant'] = p_values < alpha
+    return results
+
 def mwu_test_month_combos(df, combos, column='Green', alpha=0.05, is_alpha_adjusted=False):
     '''
     Performs a Mann-Whitney U test on each combination of months.
@@ -60,53 +186,14 @@ def mwu_test_month_combos(df, combos, column='Green', alpha=0.05, is_alpha_adjus
     results : DataFrame
         Data Frame with columns: ['month_1', 'month_2', 'month_1_mean', 'month_2_mean', 'mean_diff', 'p_value', 'is_significant'], and rows are each combination of months.
     '''
-    if not is_alpha_adjusted:
-        alpha = alpha/len(combos)
-
-    results = pd.DataFrame()
-    for month1,month2 in combos:
-        month1_values = df[df['month']==month1][column]
-        month2_values = df[df['month']==month2][column]
-        
-        t,p = stats.mannwhitneyu(month1_values,month2_values)
-        is_significant = p < alpha
-        
-        month1_mean = month1_values.mean()
-        month2_mean = month2_values.mean()
-        diff_means = month1_mean - month2_mean
-        
-        results = results.append({
-                'month_1':month1, 'month_2': month2, 'month_1_mean': month1_mean, 'month_2_mean': month2_mean, 
-                'mean_diff': diff_means, 'p_value': p, 'is_significant': is_significant
-                }, ignore_index=True)
+    results = mwu_test_group_combos(df,combos,column=column,group_column='month',alpha=alpha,is_alpha_adjusted=is_alpha_adjusted)
+    results = results.drop('u_statistic',axis=1)
+    results.columns = [col.replace('group','month') for col in results.columns]
     return results 
 
 
-
 if __name__ == "__main__":
-    # load df
-    # get data directory
-    data_dir = input('Enter data directory: ')
-    df = pd.read_csv(os.path.join(data_dir,'combined_status_hours.csv'))
-    df.set_index('date',inplace=True)
-
-    # make results directory for current run - allows for running multiple tests 
-    results_dir = ut.make_numbered_directory(parent_dir='results',base_name='results')
-
-    ut.copy_txt_files(data_dir,results_dir)
-
-    # sort the months by mean to make results easier to read
-    months_sorted_by_mean = sort_dict_keys_by_values(get_monthly_means(df))
-    combos = list(combinations(months_sorted_by_mean,2))
-    num_combos = len(combos)
-    alpha = 0.05 
-    fwer = 1 - (1 - alpha)**num_combos
-    alpha_adj = alpha / num_combos
-    with open(os.path.join(results_dir,'run_info.txt'),'a') as f:
-        print(f'\nThe family-wise error rate for alpha={alpha} and {num_combos} combinations is: {fwer}',file=f)
-        print(f'Apply a Bonferroni correction and use an adjusted alpha of {alpha_adj:.5f}',file=f)
-    results = mwu_test_month_combos(df,combos,alpha=alpha_adj,is_alpha_adjusted=True)
-    ut.save_df_to_csv(results,'hyp_test_results',results_dir)
-
-    # view significant results
-    print(results[results['is_significant']==True].drop('is_significant',axis=1))
+    # same as 'python src/cli.py test', e.g. --data-dir data/prepped_data_0001, without prompting for the directory
+    import cli
+    import sys
+    cli.main(['test'] + sys.argv[1:])
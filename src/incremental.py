@@ -0,0 +1,328 @@
+'''
+Incremental (tail follow) mode for the archive file of the current year, which keeps growing. Each update only reads the bytes appended since the last one, classifies the new rows and updates the days they fall on in the tables of the year, e.g.
+
+    python src/cli.py update --year 2024 --follow 300
+'''
+import prep_data as prep
+import status_store
+import solar
+import utilities as ut
+
+import requests
+import pandas as pd
+import numpy as np
+import os
+import io
+import json
+import time
+import re
+
+# bump if the layout of the state file changes so old states start over
+state_format_version = 2
+
+def update_year(link,range_limits,thresholds,save_path='data/',flush=False,block_size=8*1024*1024):
+    '''
+    Bring the tables of a year (see prep_data.get_status_tables) up to date with the rows appended to its archive file since the last update.
+    The byte offset of the first row not counted yet, the header line of the file (if it has one) and the cleaned wind speeds of the sustained wind window before it are kept in 'incremental_XXXX.json' in save_path, so only the new bytes are read and the rolling wind is the same as for the whole year.
+    The last row is only counted once the next one arrives, since it covers the time until then (see prep_data.get_row_durations). Starts over from the beginning of the file if there is no state, the file got shorter or the thresholds, range limits or pipeline changed.
+    Only the changed days are read from the store and written back to it and to the end of the csv files (see write_updated_days). The NaN report of the year in 'NaN_info.txt' is made again from the daily quality table in the store. The year's entry in 'manifest.json' is only recorded once a flushed update has read the whole file, so the tables are those of a full run of it; until then the entry is removed, so prep_data.prep_all_available_data (and later runs reusing this one) prepare the year again instead of trusting an older key.
+    Parameters
+    ----------
+    link : str
+        URL or path of the archive csv file of the year, e.g. a local file that is still being written
+    range_limits : dict
+        lower and upper limits for each columns except the date_time
+    thresholds : dict
+        (green, red) thresholds, see prep_data.get_and_prep_data
+    save_path : str
+        prepped data directory with the tables of the year
+    flush : bool
+        also count the last row (with its nominal seconds), when the file is complete
+    block_size : int
+        number of bytes to parse at a time, bounds the memory used when there is a lot of new data
+    Returns
+    -------
+    updated : DataFrame
+        the status hours of the days that changed
+    '''
+    year = prep.get_year_from_url(link)
+    state_path = os.path.join(save_path,f'incremental_{year}.json')
+    state = load_state(state_path)
+    # the inputs of the file as it is before reading, recorded in the manifest if this update reads all of it
+    key,inputs = prep.get_year_input_key(link,range_limits,thresholds) if flush else (None,None)
+    size = get_size(link)
+    if state is None or state['settings'] != _settings_key(range_limits,thresholds) or size < state['offset']:
+        state = {'format_version': state_format_version, 'settings': _settings_key(range_limits,thresholds), 'offset': 0, 'header': None, 'previous_rows': None}
+    previous_rows = _rows_from_json(state['previous_rows'])
+
+    chunk_tables = []
+    pending = None
+    last_line_bytes = 0
+    consumed = 0
+    for block in iter_complete_lines(open_from_offset(link,state['offset']),block_size):
+        consumed += len(block)
+        if consumed == len(block) and state['offset'] == 0:
+            state['header'] = prep.get_block_header(block)
+        chunk = prep.parse_raw_block(block,prep.column_names,prep.columns_of_interest,header=state['header'])
+        if not len(chunk):
+            # only the header so far
+            continue
+        last_line_bytes = len(block) - (block.rfind(b'\n',0,len(block) - 1) + 1)
+        prepped = prep.clean_and_classify(chunk,range_limits,thresholds,previous_rows=previous_rows)
+        # a few new rows can be shorter than the wind window, so the rows kept from before are added
+        window_rows = _join_rows(previous_rows,prepped[['wind_speed','10min']])
+        previous_rows = _keep_window(window_rows,prepped.index[-1])
+        if pending is not None:
+            chunk_tables.append(prep.get_status_tables(*pending,next_time=chunk.index[0]))
+        pending = (chunk,prepped)
+
+    if pending is None:
+        return pd.DataFrame(columns=prep.statuses)
+    chunk,prepped = pending
+    if flush:
+        chunk_tables.append(prep.get_status_tables(chunk,prepped))
+        offset = state['offset'] + consumed
+    else:
+        # the last row is read again next time, with the window of rows before it
+        if len(chunk) > 1:
+            chunk_tables.append(prep.get_status_tables(chunk.iloc[:-1],prepped.iloc[:-1],next_time=chunk.index[-1]))
+        previous_rows = _keep_window(window_rows.iloc[:-1],prepped.index[-1])
+        offset = state['offset'] + consumed - last_line_bytes
+
+    tables = {}
+    if chunk_tables:
+        new_tables = {name: pd.concat([t[name] for t in chunk_tables]).groupby(level='date',sort=False).sum(min_count=1) for name in chunk_tables[0]}
+        new_tables = prep.finish_status_tables(new_tables)
+        if state['offset']:
+            tables = write_updated_days(new_tables,year,save_path)
+        else:
+            # starting over, the tables of any earlier run are replaced
+            tables = {name: add_tables(None,df) for name,df in new_tables.items()}
+            prep.write_prepped_year(tables,year,save_path)
+    nan_report = update_nan_report(year,save_path) if tables else None
+    update_manifest(year,save_path,key,inputs,nan_report,complete=flush and offset == size)
+    state.update({'offset': offset, 'previous_rows': _rows_to_json(previous_rows)})
+    save_state(state_path,state)
+    if not tables:
+        return pd.DataFrame(columns=prep.statuses)
+    updated_days = pd.DatetimeIndex(new_tables['status_hours'].index)
+    return tables['status_hours'].loc[updated_days]
+
+def follow_year(link,range_limits,thresholds,save_path='data/',interval=300,max_updates=None):
+    '''
+    Update the tables of a year every 'interval' seconds (see update_year), printing the status hours of the latest day.
+    Parameters
+    ----------
+    max_updates : int
+        stop after this many updates, None keeps going
+    '''
+    num_updates = 0
+    while max_updates is None or num_updates < max_updates:
+        updated = update_year(link,range_limits,thresholds,save_path=save_path)
+        if len(updated):
+            latest = updated.iloc[-1]
+            print(f'{updated.index[-1]:%Y-%m-%d} ' + ' '.join(f'{status}: {latest[status]:.2f}' for status in prep.statuses))
+        num_updates += 1
+        if max_updates is None or num_updates < max_updates:
+            time.sleep(interval)
+
+def _settings_key(range_limits,thresholds):
+    return ut.hash_inputs({'thresholds': thresholds, 'range_limits': range_limits, 'column_names': prep.column_names, 'columns_of_interest': prep.columns_of_interest, 'pipeline_version': prep.pipeline_version, 'format_version': state_format_version})
+
+def get_size(link):
+    '''
+    Size in bytes of a local file or of a file on the archive (from the Content-Length of a HEAD request).
+    '''
+    if not link.startswith(('http://','https://')):
+        return os.path.getsize(link)
+    response = requests.head(link,timeout=60)
+    response.raise_for_status()
+    return int(response.headers.get('Content-Length',0))
+
+def open_from_offset(link,offset):
+    '''
+    Binary stream of a local file or a file on the archive, starting at byte 'offset' (with an HTTP Range request).
+    '''
+    if not link.startswith(('http://','https://')):
+        f = open(link,'rb')
+        f.seek(offset)
+        return f
+    response = requests.get(link,headers={'Range': f'bytes={offset}-'},stream=True,timeout=60)
+    if response.status_code == 416:
+        # nothing after the offset
+        return io.BytesIO()
+    response.raise_for_status()
+    response.raw.decode_content = True
+    if response.status_code != 206 and offset:
+        # the server ignored the range, skip the bytes already read
+        response.raw.read(offset)
+    return response.raw
+
+def iter_complete_lines(stream,block_size):
+    '''
+    Read a binary stream in blocks of about 'block_size' bytes, each ending at the end of a line. A last line without a newline is still being written, so it is left for the next update.
+    '''
+    with stream:
+        leftover = b''
+        while True:
+            data = stream.read(block_size)
+            if not data:
+                return
+            data = leftover + data
+            end = data.rfind(b'\n') + 1
+            leftover = data[end:]
+            if end:
+                yield data[:end]
+
+def add_tables(old,new):
+    '''
+    Add the hours and counts of 'new' to those of 'old' for the days in both, keeping the other days of each. The coverage and the length of the nights are worked out again instead of added.
+    '''
+    new = new.set_axis(pd.DatetimeIndex(new.index,name='date'))
+    if old is None or not len(old):
+        return new
+    derived = [col for col in ['coverage','night_hours'] if col in new.columns]
+    total = pd.concat([old.drop(columns=derived),new.drop(columns=derived)]).groupby(level='date').sum(min_count=1)
+    if 'coverage' in derived:
+        total.insert(new.columns.get_loc('coverage'),'coverage',total['observed_seconds'] / prep.seconds_per_day)
+    if 'night_hours' in derived:
+        total['night_hours'] = solar.get_night_hours(total.index.values.astype('datetime64[D]'))
+    return total[new.columns]
+
+def write_updated_days(new_tables,year,save_path):
+    '''
+    Add the hours and counts of the new rows to the days they fall on. The days of each table from the first changed one on are read from the store, added to and written back to the store and over the end of the csv file of the table, so the work depends on the number of days changed and not on the days already in the year.
+    Parameters
+    ----------
+    new_tables : dict
+        tables of the new rows (see prep_data.finish_status_tables)
+    year : str
+    save_path : str
+        prepped data directory with the tables of the year
+    Returns
+    -------
+    tables : dict
+        rows of each table from its first changed day on
+    '''
+    store_path = status_store.get_store_path(save_path)
+    tables = {}
+    for name,new in new_tables.items():
+        first_day = pd.DatetimeIndex(new.index).min()
+        old = status_store.read_days(store_path,table=name,start=first_day,years=[ut.get_year_number(year)])
+        # sqlite gives a column that is only NULL for the days read as objects
+        old = old[new.columns].astype(new.dtypes.to_dict())
+        tables[name] = add_tables(old,new)
+        status_store.update_days(tables[name],year,store_path,table=name)
+        replace_csv_days(tables[name],os.path.join(save_path,f'{name}_{year}.csv'))
+    return tables
+
+def replace_csv_days(df,path):
+    '''
+    Replace the rows of a daily csv file from the first day of df on with the rows of df. The file is read backwards from its end to find the first row to replace, so only the rows replaced are read and written.
+    Parameters
+    ----------
+    df : DataFrame
+        dates as the index, with every day of the file from its first day on
+    path : str
+        csv file written by prep_data.write_prepped_year, in date order
+    '''
+    first_day = pd.Timestamp(df.index[0]).strftime('%Y-%m-%d').encode()
+    with open(path,'r+b') as f:
+        f.seek(_find_day_offset(f,first_day))
+        f.truncate()
+        f.write(df.to_csv(header=False).encode())
+
+def _find_day_offset(f,day,block_size=64*1024):
+    '''
+    Byte offset of the first row of a csv file in date order whose date is 'day' or later (the end of the file if there is none), reading blocks from the end of the file until a row before 'day' or the header is found.
+    '''
+    f.seek(0,os.SEEK_END)
+    size = f.tell()
+    while True:
+        start = max(0,size - block_size)
+        f.seek(start)
+        data = f.read(size - start)
+        end = len(data)
+        while True:
+            line_start = data.rfind(b'\n',0,max(end - 1,0)) + 1
+            if line_start == 0 and start > 0:
+                # the line can start before the block
+                break
+            if line_start == 0 or data[line_start:line_start + len(day)] < day:
+                # the header or a day that is kept
+                return start + end
+            end = line_start
+        block_size *= 2
+
+def update_nan_report(year,save_path):
+    '''
+    Replace the NaN report of a year in 'NaN_info.txt' with one made from the daily quality table of the year in the store, and return it.
+    '''
+    df_quality = status_store.read_days(status_store.get_store_path(save_path),table='daily_quality',years=[ut.get_year_number(year)])
+    nan_report = prep.get_nan_report(df_quality)
+    nan_path = os.path.join(save_path,'NaN_info.txt')
+    reports = []
+    if os.path.exists(nan_path):
+        with open(nan_path) as f:
+            # each report starts with an empty line and the year
+            reports = re.split(r'(?<=\n)(?=\n\d+\nTotal rows)',f.read())
+    header = f'\n{df_quality.index[0].year}\n'
+    reports = [report for report in reports if report and not report.startswith(header)]
+    with open(nan_path + '.tmp','w') as f:
+        f.write(''.join(reports) + nan_report)
+    os.replace(nan_path + '.tmp',nan_path)
+    return nan_report
+
+def update_manifest(year,save_path,key,inputs,nan_report,complete):
+    '''
+    Record the inputs and NaN report of a year in the manifest of save_path once its tables are those of a full run of the file ('complete'), otherwise remove its entry so the year isn't taken as prepped.
+    '''
+    manifest = ut.load_manifest(save_path)
+    if complete:
+        manifest[year] = {'key': key, 'inputs': inputs, 'nan_report': nan_report}
+    elif year in manifest:
+        del manifest[year]
+    else:
+        return
+    ut.save_manifest(save_path,manifest)
+
+def _join_rows(previous_rows,rows):
+    return rows if previous_rows is None else pd.concat([previous_rows,rows])
+
+def _keep_window(rows,last_time):
+    '''
+    The rows inside the sustained wind window of a row at 'last_time'.
+    '''
+    return rows.loc[rows.index > last_time - pd.Timedelta(prep.sustained_wind_window)]
+
+def _rows_to_json(rows):
+    if rows is None:
+        return None
+    return {'times': rows.index.as_unit('ns').asi8.tolist(), 'wind_speed': [None if np.isnan(x) else float(x) for x in rows['wind_speed']], '10min': rows['10min'].astype(float).tolist()}
+
+def _rows_from_json(rows):
+    if not rows:
+        return None
+    return pd.DataFrame({'wind_speed': np.array(rows['wind_speed'],dtype=float), '10min': rows['10min']},index=pd.DatetimeIndex(np.array(rows['times'],dtype='datetime64[ns]'),name='date_time'))
+
+def load_state(state_path):
+    '''
+    Load the state of the last update, None if there isn't one or it is from an older format.
+    '''
+    if not os.path.exists(state_path):
+        return None
+    with open(state_path) as f:
+        state = json.load(f)
+    return state if state.get('format_version') == state_format_version else None
+
+def save_state(state_path,state):
+    '''
+    Save the state of an update, written to a temporary file first so an interrupted update leaves the old state.
+    '''
+    tmp_path = state_path + '.tmp'
+    with open(tmp_path,'w') as f:
+        json.dump(state,f)
+    os.replace(tmp_path,state_path)
+
+if __name__ == "__main__":
+    pass
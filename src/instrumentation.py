@@ -0,0 +1,130 @@
+import os
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+try:
+    import resource
+except ImportError:
+    # not available on Windows, peak RSS isn't recorded there
+    resource = None
+
+# stages recorded by the pipeline for each year, in the order they run (chunked and streaming runs record 'parse', 'clean_classify' and 'aggregate' once per chunk)
+stage_names = ['download','parse','clean_classify','aggregate','nan_report','write']
+
+@contextmanager
+def stage(timings,year,name,rows=None):
+    '''
+    Context manager that records the wall time and memory use of a pipeline stage.
+    The record is yielded so the number of rows can be set once it is known (e.g. after parsing). If tracemalloc is tracing (see start_memory_tracing) the peak traced memory during the stage is recorded too.
+    Parameters
+    ----------
+    timings : list or None
+        list to append the record to. If None nothing is recorded.
+    year : str
+    name : str
+        stage name, one of stage_names for the pipeline stages
+    rows : int
+        number of rows processed in the stage, if known up front
+    Yields
+    ------
+    record : dict
+    '''
+    record = {'year': str(year), 'stage': name, 'rows': rows, 'pid': os.getpid()}
+    if timings is None:
+        yield record
+        return
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        start_traced,_ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['seconds'] = time.perf_counter() - start
+        record['rows_per_second'] = record['rows'] / record['seconds'] if record['rows'] and record['seconds'] > 0 else None
+        record['peak_rss_mb'] = get_peak_rss_mb()
+        if tracing:
+            _,peak_traced = tracemalloc.get_traced_memory()
+            record['tracemalloc_peak_delta_mb'] = (peak_traced - start_traced) / 2**20
+        timings.append(record)
+
+def timed_iter(iterable,timings,year,name):
+    '''
+    Wrap an iterable so the time spent producing each item is recorded as a stage, e.g. reading the chunks of a file. 'rows' is set from the length of each item.
+    '''
+    iterator = iter(iterable)
+    while True:
+        with stage(timings,year,name) as record:
+            try:
+                item = next(iterator)
+            except StopIteration:
+                record['rows'] = 0
+                return
+            record['rows'] = len(item)
+        yield item
+
+def get_peak_rss_mb():
+    '''
+    Peak resident set size of this process so far in MB, None if it can't be determined.
+    '''
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes on Linux
+    if os.uname().sysname == 'Darwin':
+        return peak / 2**20
+    return peak / 2**10
+
+def start_memory_tracing():
+    '''
+    Start tracemalloc so stages also record the peak memory allocated while they run. Tracing slows the pipeline down, so it is off by default.
+    '''
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def write_timings(timings,save_path,file_name='stage_timings.jsonl'):
+    '''
+    Append timing records to a JSON lines file.
+    Parameters
+    ----------
+    timings : list of dicts
+    save_path : str
+        directory to write the file to
+    file_name : str
+    '''
+    with open(os.path.join(save_path,file_name),'a') as f:
+        for record in timings:
+            print(json.dumps(record),file=f)
+
+def load_timings(path):
+    '''
+    Load the records from a JSON lines timing file.
+    '''
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def summarize_timings(timings):
+    '''
+    Summarize timing records as a table of the seconds spent in each stage for each year, with the totals.
+    Parameters
+    ----------
+    timings : list of dicts
+    Returns
+    -------
+    summary : DataFrame
+        years as the index and stages as the columns, plus 'total' row and column
+    '''
+    import pandas as pd
+    df = pd.DataFrame(timings)
+    if df.empty:
+        return df
+    stage_order = list(dict.fromkeys(df['stage']))
+    summary = df.pivot_table(index='year',columns='stage',values='seconds',aggfunc='sum')[stage_order]
+    summary['total'] = summary.sum(axis=1)
+    summary.loc['total'] = summary.sum()
+    return summary
+
+if __name__ == "__main__":
+    pass
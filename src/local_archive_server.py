@@ -0,0 +1,119 @@
+import os
+import threading
+import email.utils
+from http.server import ThreadingHTTPServer,BaseHTTPRequestHandler
+
+def start_server(directory,port=0,fail_after_bytes=None,num_failures=0,request_log=None):
+    '''
+    Serve the csv files in a directory like the IfA archive, for trying the downloaders without the network. Supports HEAD, ETag/Last-Modified, Range and If-Range requests and an index page with links to the files.
+    Parameters
+    ----------
+    directory : str
+        directory with the '<year>.csv' files
+    port : int
+        0 picks a free port
+    fail_after_bytes : int
+        if given, the first 'num_failures' downloads of each file are cut off after this many bytes, to test resuming
+    num_failures : int
+    request_log : list
+        if given, the method, file name and Range and If-Range headers of each request are appended to it, to check what the downloaders send
+    Returns
+    -------
+    server : ThreadingHTTPServer
+        running in a background thread, stop it with server.shutdown()
+    base_url : str
+        URL of the index page, like the archive's base_url
+    '''
+    handler = type('ArchiveHandler',(_ArchiveHandler,),{
+        'directory': directory,
+        'fail_after_bytes': fail_after_bytes,
+        'failures_left': {},
+        'num_failures': num_failures,
+        'request_log': request_log,
+        'lock': threading.Lock()
+        })
+    server = ThreadingHTTPServer(('127.0.0.1',port),handler)
+    threading.Thread(target=server.serve_forever,daemon=True).start()
+    return server,f'http://127.0.0.1:{server.server_address[1]}/'
+
+class _ArchiveHandler(BaseHTTPRequestHandler):
+
+    def log_message(self,format,*args):
+        pass
+
+    def do_HEAD(self):
+        self.respond(send_body=False)
+
+    def do_GET(self):
+        self.respond(send_body=True)
+
+    def respond(self,send_body):
+        name = self.path.lstrip('/')
+        if self.request_log is not None:
+            self.request_log.append({'method': self.command, 'name': name, 'Range': self.headers.get('Range'), 'If-Range': self.headers.get('If-Range')})
+        if name == '':
+            return self.send_index(send_body)
+        path = os.path.join(self.directory,os.path.basename(name))
+        if not os.path.isfile(path):
+            return self.send_error(404)
+        stat = os.stat(path)
+        size = stat.st_size
+        etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+        last_modified = email.utils.formatdate(stat.st_mtime,usegmt=True)
+
+        start,end = 0,size - 1
+        status = 200
+        range_header = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        if range_header and (if_range is None or if_range in (etag,last_modified)):
+            start = int(range_header.split('=')[1].split('-')[0])
+            if start >= size:
+                self.send_response(416)
+                self.send_header('Content-Range',f'bytes */{size}')
+                self.send_header('Content-Length','0')
+                self.end_headers()
+                return
+            status = 206
+
+        self.send_response(status)
+        self.send_header('Content-Type','text/csv')
+        self.send_header('Content-Length',str(end - start + 1))
+        self.send_header('ETag',etag)
+        self.send_header('Last-Modified',last_modified)
+        self.send_header('Accept-Ranges','bytes')
+        if status == 206:
+            self.send_header('Content-Range',f'bytes {start}-{end}/{size}')
+        self.end_headers()
+        if not send_body:
+            return
+
+        limit = None
+        with self.lock:
+            failures_left = self.failures_left.setdefault(name,self.num_failures)
+            if self.fail_after_bytes is not None and failures_left > 0:
+                self.failures_left[name] -= 1
+                limit = self.fail_after_bytes
+        with open(path,'rb') as f:
+            f.seek(start)
+            data = f.read(end - start + 1)
+        if limit is not None:
+            # send part of the file then drop the connection
+            self.wfile.write(data[:limit])
+            self.wfile.flush()
+            self.close_connection = True
+            self.connection.shutdown(2)
+            return
+        self.wfile.write(data)
+
+    def send_index(self,send_body):
+        links = ''.join(f'<a href="{name}">{name}</a>\n' for name in sorted(os.listdir(self.directory)) if name.endswith('.csv'))
+        body = f'<html><body>\n{links}</body></html>\n'.encode()
+        self.send_response(200)
+        self.send_header('Content-Type','text/html')
+        self.send_header('Content-Length',str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+if __name__ == "__main__":
+    pass
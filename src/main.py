@@ -1,7 +1,11 @@
 import prep_data as prep
 import hypothesis_test as ht
+import resampling as rs
 import myplots
 import utilities as ut
+import instrumentation as ins
+import async_download
+import status_cube as sc
 
 import os
 from itertools import combinations
@@ -18,6 +22,25 @@ if __name__ == "__main__":
         skip_years.update(set(range(2006,2020,1)))
         
 
+    # number of processes used to prep the years in parallel (1 runs serially)
+    num_workers = os.cpu_count()
+    # raw archive files are cached here so they are only downloaded once
+    raw_cache_dir = os.path.join('data','raw_cache')
+    # parsed years are cached here so changing thresholds doesn't require parsing the csv files again
+    parsed_cache_dir = os.path.join('data','parsed_cache')
+    # number of archive files downloaded at the same time
+    max_concurrency = 4
+    # rows to stream through the pipeline at a time to bound memory (None reads each year at once)
+    chunksize = None
+    # csv parser backend ('auto', 'c', 'pyarrow' or 'legacy')
+    parser = 'auto'
+    # save the figures at a low dpi for a quick look instead of the 300 dpi report versions
+    preview_plots = False
+    # leave out days with less than this fraction of the day measured (see daily_quality_XXXX.csv), None keeps every day
+    min_coverage = None
+    # also export the combined daily status hours to combined_status_hours.csv (the days are kept in the daily_status.sqlite store of the prepped data)
+    export_combined_csv = True
+
     # Establish required info
     # link for data files
     base_url = "http://kopiko.ifa.hawaii.edu/weather/archivedata/"
@@ -48,19 +71,12 @@ if __name__ == "__main__":
 
     # get list of all data file urls
     csv_urls = prep.get_csv_file_links(base_url)
+    # download the years that aren't cached yet, several at a time
+    async_download.fetch_years([url for url in csv_urls if ut.get_year_number(prep.get_year_from_url(url)) not in skip_years],cache_dir=raw_cache_dir,max_concurrency=max_concurrency)
 
 
-    # prep all data 
-    for url in csv_urls:
-        year = url.split('/')[-1].split('.')[0]
-        if int(year) in skip_years:
-            continue
-        # if prepped data file already exist for that year skip it
-        elif ut.prepped_data_exists(year,base_path=data_dir):
-            print(f'{year} data already prepped.')
-            continue
-        else:
-            prep.get_and_prep_data(url,acceptable_ranges,thresholds,save_path=data_dir)
+    # prep all data - each year is prepared in its own process, years with unchanged inputs are reused from earlier runs
+    timings = prep.prep_all_available_data(csv_urls,acceptable_ranges,thresholds,save_path=data_dir,skip_years=skip_years,num_workers=num_workers,cache_dir=raw_cache_dir,parsed_cache_dir=parsed_cache_dir,chunksize=chunksize,parser=parser,previous_runs_dir='data')
 
     # record the set up info to a file
     years = ut.get_years(data_dir)
@@ -68,25 +84,25 @@ if __name__ == "__main__":
         ut.record_setup(thresholds,acceptable_ranges,years,f)
 
 
-    # combine the daily status hours for all years into one df
-    df = prep.combine_status_hour_dfs(base_path=data_dir)
-    df = prep.normalize_daily_hours_to_24(df)
-    prep.add_month_year_columns(df)
-    ut.save_df_to_csv(df,'combined_status_hours',data_dir)
+    # load the daily status hours for all years from the store into one df
+    df = prep.load_status_hours(data_dir,min_coverage=min_coverage)
+    if export_combined_csv:
+        ut.save_df_to_csv(df,'combined_status_hours',data_dir)
+
 
+    # sums, means and variances of each status for every year and month, read by the plots and the analysis instead of grouping the days again
+    cube = sc.build_cube(df)
 
     # Make plots
     image_dir = os.path.join(results_dir,'images')
     os.mkdir(image_dir)
-    myplots.daily_green_weather_over_time(df,save_path=image_dir,marker='o',show_comb_avg=True)
-    myplots.avg_daily_hours(df,save_path=image_dir)
-    myplots.plot_monthly_distribution_green_wx(df,months='All',save_path=image_dir)
-    myplots.plot_combined_distribution_wx_stacked(df,save_path=image_dir)
+    # the aggregates are computed once and each figure is rendered in its own process, set preview_plots to True for quick low dpi figures
+    myplots.render_figures(df,image_dir,preview=preview_plots,num_workers=num_workers,cube=cube)
 
     ut.copy_txt_files(data_dir,results_dir)
 
     # sort the months by mean to make results easier to read
-    months_sorted_by_mean = ht.sort_dict_keys_by_values(ht.get_monthly_means(df))
+    months_sorted_by_mean = ht.sort_dict_keys_by_values(ht.get_monthly_means(cube))
     combos = list(combinations(months_sorted_by_mean,2))
     num_combos = len(combos)
     alpha = 0.05 
@@ -98,6 +114,14 @@ if __name__ == "__main__":
     results = ht.mwu_test_month_combos(df,combos,alpha=alpha_adj,is_alpha_adjusted=True)
     ut.save_df_to_csv(results,'hyp_test_results',results_dir)
 
+    # bootstrap confidence intervals and permutation p values for the differences in the monthly means
+    resampling_results = rs.resample_month_combos(df,combos,num_resamples=10000,seed=0,num_workers=num_workers)
+    ut.save_df_to_csv(resampling_results,'resampling_results',results_dir)
+
     # view significant results
     print(results[results['is_significant']==True].drop('is_significant',axis=1))
 
+    # seconds spent in each stage of the data prep, per year (details in stage_timings.jsonl)
+    if timings:
+        print(ins.summarize_timings(timings).to_string(float_format=lambda x: f'{x:,.2f}'))
+
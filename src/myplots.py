@@ -1,5 +1,9 @@
+import status_cube as sc
+
 import matplotlib.pyplot as plt
+import numpy as np
 import os
+from concurrent.futures import ProcessPoolExecutor
 
 plt.style.use('ggplot')
 plt.rcParams.update({'font.size':16,'axes.labelcolor': '#000000','ytick.color': '#000000','xtick.color': '#000000'})
@@ -9,9 +13,68 @@ yellow = '#fff176'
 red = '#ff5252'
 colors = [green,yellow,red]
 conditions = ['Green','Yellow','Red']
+all_months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+# dpi of the saved figures, and of quick previews
+report_dpi = 300
+preview_dpi = 72
+# aggregates of compute_plot_aggregates, and those taken from the year x month cube
+aggregate_names = ['monthly_means','green_by_year_month','green_by_year','green_month_histograms','status_histograms']
+cube_aggregate_names = ['monthly_means','green_by_year_month','green_by_year']
+# number of bins of the histograms
+hist_bins = 24
+
+def compute_plot_aggregates(df,cube=None,names=None):
+    '''
+    Compute everything the figures need from the daily status hours in one pass, so they can be drawn without going back to the full data frame. The means come from the year x month cube, only the histograms need the daily rows.
+    Parameters
+    ----------
+    df : DataFrame
+        daily hours with 'month' and 'year' columns (see prep_data.add_month_year_columns)
+    cube : dict
+        output of status_cube.build_cube of the same days as 'df', built from 'df' if not given
+    names : list
+        the aggregates to compute, defaults to all of them
+    Returns
+    -------
+    aggregates : dict
+        'monthly_means': mean hours of each status for each month
+        'green_by_year_month': mean green hours for each year (rows) and month (columns)
+        'green_by_year': mean green hours for each year
+        'green_month_histograms': dict of months to (counts,bin_edges) of the green hours
+        'status_histograms': dict of statuses to (counts,bin_edges) of the hours
+    '''
+    if names is None:
+        names = aggregate_names
+    if cube is None and set(names) & set(cube_aggregate_names):
+        cube = sc.build_cube(df,conditions)
+    elif cube is not None:
+        sc.check_cube_matches(cube,df)
+    aggregates = {}
+    if 'monthly_means' in names:
+        aggregates['monthly_means'] = sc.get_means(cube,conditions,by='month')
+    if 'green_by_year_month' in names:
+        aggregates['green_by_year_month'] = sc.get_year_month_means(cube,'Green')
+    if 'green_by_year' in names:
+        aggregates['green_by_year'] = sc.summarize(cube,'Green',by='year')['mean']
+    if 'green_month_histograms' in names:
+        green_month_histograms = {}
+        for month,values in df.groupby('month',observed=False)['Green']:
+            if len(values):
+                green_month_histograms[month] = np.histogram(values.dropna(),bins=hist_bins)
+        aggregates['green_month_histograms'] = green_month_histograms
+    if 'status_histograms' in names:
+        aggregates['status_histograms'] = {status: np.histogram(df[status].dropna(),bins=hist_bins) for status in conditions}
+    return aggregates
+
+def _plot_histogram(ax,histogram,**kwargs):
+    '''
+    Draw a histogram from precomputed (counts,bin_edges).
+    '''
+    counts,edges = histogram
+    ax.hist(edges[:-1],bins=edges,weights=counts,**kwargs)
 
 
-def avg_daily_hours(df,save_path=None):
+def avg_daily_hours(df,save_path=None,dpi=report_dpi,aggregates=None):
     '''
     Creates a bar chart showing the average daily weather status for green, yellow and red weather for all months.
     Parameters
@@ -19,9 +82,14 @@ def avg_daily_hours(df,save_path=None):
     df : DataFrame
     save_path : str
         Location to save figure.
+    dpi : int
+    aggregates : dict
+        output of compute_plot_aggregates, only the ones needed are computed from 'df' if not given
     '''
+    if aggregates is None:
+        aggregates = compute_plot_aggregates(df,names=['monthly_means'])
     fig,ax = plt.subplots(figsize=(6,5))
-    df.drop('year',axis=1).groupby(['month']).mean().plot.bar(color=colors,ax=ax,stacked=True)
+    aggregates['monthly_means'].plot.bar(color=colors,ax=ax,stacked=True)
     ax.set_ylim(0,27)
     ax.set_xlabel(None)
     ax.set_ylabel('Hours')
@@ -30,9 +98,9 @@ def avg_daily_hours(df,save_path=None):
     ax.legend(ncol=3,fontsize=14,loc='upper center', bbox_to_anchor=(.5,1.02))
     fig.tight_layout()
     if save_path:
-        fig.savefig(os.path.join(save_path,'mean_monthly_hours.png'),dpi=300)
+        fig.savefig(os.path.join(save_path,'mean_monthly_hours.png'),dpi=dpi)
 
-def daily_green_weather_over_time(df,months='All',show_comb_avg=False,save_path=None,**kwargs):
+def daily_green_weather_over_time(df,months='All',show_comb_avg=False,save_path=None,dpi=report_dpi,aggregates=None,**kwargs):
     '''
     Creates line plot for the average daily temperature for each month in 'months' over all years in 'df'
     Parameters
@@ -44,9 +112,14 @@ def daily_green_weather_over_time(df,months='All',show_comb_avg=False,save_path=
         If true plots the monthly averages with lower alpha and overlays the combined average for all months.
     save_path : str
         Location to save the figure to.
+    dpi : int
+    aggregates : dict
+        output of compute_plot_aggregates, only the ones needed are computed from 'df' if not given
     '''
+    if aggregates is None:
+        aggregates = compute_plot_aggregates(df,names=['green_by_year_month','green_by_year'])
     if months == 'All':
-        months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+        months = all_months
     # if only one month is given put it in a list
     elif type(months) == str:
         months = months.split()
@@ -59,18 +132,18 @@ def daily_green_weather_over_time(df,months='All',show_comb_avg=False,save_path=
         alpha = 1
 
     for month in months:
-        df[df['month']==month].groupby('year')['Green'].mean().plot(ax=ax,label=month,alpha=alpha)
+        aggregates['green_by_year_month'][month].dropna().plot(ax=ax,label=month,alpha=alpha)
     if show_comb_avg:
-        df.groupby('year')['Green'].mean().plot(ax=ax,label='Mean',color='g',**kwargs)
+        aggregates['green_by_year'].plot(ax=ax,label='Mean',color='g',**kwargs)
     ax.set_xlabel('Year')
     ax.set_ylabel('Hours')
     ax.set_title('Daily Green Weather Averages')
     ax.legend(bbox_to_anchor=(1,1))
     fig.tight_layout()
     if save_path:
-        fig.savefig(os.path.join(save_path,'average_daily_green_weather_over_time.png'),dpi=300)
+        fig.savefig(os.path.join(save_path,'average_daily_green_weather_over_time.png'),dpi=dpi)
 
-def plot_monthly_distribution_green_wx(df,months='All',save_path=None):
+def plot_monthly_distribution_green_wx(df,months='All',save_path=None,dpi=report_dpi,aggregates=None):
     '''
     Create histogram plots of the green weather for each month in 'months' as subplots in a figure.
     Parameters
@@ -80,9 +153,14 @@ def plot_monthly_distribution_green_wx(df,months='All',save_path=None):
         Month names must be three letter abreviations. Put multiple months in a list. A single month does not have to be in a list, but can be.
     save_path : str
         Location to save the figure to. 
+    dpi : int
+    aggregates : dict
+        output of compute_plot_aggregates, only the ones needed are computed from 'df' if not given
     '''
+    if aggregates is None:
+        aggregates = compute_plot_aggregates(df,names=['green_month_histograms'])
     if months == 'All':
-        months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+        months = all_months
     # if only one month is given put it in a list
     elif type(months) == str:
         months = months.split()
@@ -96,16 +174,17 @@ def plot_monthly_distribution_green_wx(df,months='All',save_path=None):
         if i >= num_ax:
             ax.axes.remove()
             continue
-        df[df['month']==months[i]].hist('Green',ax=ax,color='g',bins=24)
+        if months[i] in aggregates['green_month_histograms']:
+            _plot_histogram(ax,aggregates['green_month_histograms'][months[i]],color='g')
         ax.set_title(months[i])
     fig.suptitle('Distribution of Green Weather')
     fig.text(.5,0,'Hours')
     fig.text(0,0.5,'Frequency',rotation='vertical')
     fig.tight_layout()
     if save_path:
-        fig.savefig(os.path.join(save_path,'green_weather_distribution.png'),dpi=300)
+        fig.savefig(os.path.join(save_path,'green_weather_distribution.png'),dpi=dpi)
 
-def plot_combined_distribution_wx(df,statuses='All',save_path=None):
+def plot_combined_distribution_wx(df,statuses='All',save_path=None,dpi=report_dpi,aggregates=None):
     '''
     Plot the combined distribution all months.
     Parameters
@@ -115,7 +194,12 @@ def plot_combined_distribution_wx(df,statuses='All',save_path=None):
         Options {'All','Green','Yellow','Red'} - if multiple put in list.
     save_path : str
         Location to save the figure to. 
+    dpi : int
+    aggregates : dict
+        output of compute_plot_aggregates, only the ones needed are computed from 'df' if not given
     '''
+    if aggregates is None:
+        aggregates = compute_plot_aggregates(df,names=['status_histograms'])
     if statuses == 'All':
         status_list = ['Green','Yellow','Red']
     elif type(statuses) == str:
@@ -123,16 +207,16 @@ def plot_combined_distribution_wx(df,statuses='All',save_path=None):
     color_dict = {'Green': green, 'Yellow': yellow, 'Red': red}
     fig,ax = plt.subplots(figsize=(10,5))
     for status in status_list:
-        df[status].hist(bins=24,ax=ax,alpha=0.3,color=color_dict[status],label=status)
+        _plot_histogram(ax,aggregates['status_histograms'][status],alpha=0.3,color=color_dict[status],label=status)
     ax.set_xlim(0,24)
     ax.set_xlabel('Hours')
     ax.set_ylabel('Frequency')
     ax.set_title('Distribution of Weather Status')
     ax.legend()
     if save_path:
-        fig.savefig(os.path.join(save_path,'combined_weather_distribution.png'),dpi=300)
+        fig.savefig(os.path.join(save_path,'combined_weather_distribution.png'),dpi=dpi)
 
-def plot_combined_distribution_wx_stacked(df,save_path=None):
+def plot_combined_distribution_wx_stacked(df,save_path=None,dpi=report_dpi,aggregates=None):
     '''
     Plot the combined distribution all months.
     Parameters
@@ -140,12 +224,17 @@ def plot_combined_distribution_wx_stacked(df,save_path=None):
     df : DataFrame
     save_path : str
         Location to save the figure to. 
+    dpi : int
+    aggregates : dict
+        output of compute_plot_aggregates, only the ones needed are computed from 'df' if not given
     '''
+    if aggregates is None:
+        aggregates = compute_plot_aggregates(df,names=['status_histograms'])
     fig,axs = plt.subplots(3,1,figsize=(8,10),sharex=True)
     conditions = ['Green','Yellow','Red']
     colors = [green,yellow,red]
     for idx,ax in enumerate(axs.flatten()):
-        df[conditions[idx]].hist(ax=ax,bins=24,color=colors[idx])
+        _plot_histogram(ax,aggregates['status_histograms'][conditions[idx]],color=colors[idx])
         ax.set_xlim(0,24)
         ax.set_ylim(0,3100)
         ax.set_title(conditions[idx],y=.85)
@@ -155,7 +244,60 @@ def plot_combined_distribution_wx_stacked(df,save_path=None):
     fig.suptitle('Distribution of Weather Conditions')
     fig.tight_layout()   
     if save_path:
-        fig.savefig(os.path.join(save_path,'combined_weather_distribution_stacked.png'),dpi=300)   
+        fig.savefig(os.path.join(save_path,'combined_weather_distribution_stacked.png'),dpi=dpi)   
+
+# figures of the report made by main.py, as (function, keyword arguments)
+report_figures = [
+    (daily_green_weather_over_time,{'marker': 'o', 'show_comb_avg': True}),
+    (avg_daily_hours,{}),
+    (plot_monthly_distribution_green_wx,{'months': 'All'}),
+    (plot_combined_distribution_wx_stacked,{})
+    ]
+
+def render_figures(df,save_path,figures=None,preview=False,dpi=report_dpi,num_workers=None,cube=None):
+    '''
+    Compute the aggregates once and render the figures in parallel worker processes with the (headless) Agg backend.
+    Parameters
+    ----------
+    df : DataFrame
+        daily hours with 'month' and 'year' columns
+    save_path : str
+        Location to save the figures to.
+    figures : list
+        (plot function, keyword arguments) of each figure, defaults to report_figures
+    preview : bool
+        if true the figures are saved at 'preview_dpi' for a quick look
+    dpi : int
+        dpi of the saved figures when not a preview
+    num_workers : int
+        number of worker processes to use. If 1 the figures are rendered in this process, which is switched to the Agg backend.
+    cube : dict
+        output of status_cube.build_cube of the same days as 'df', built from 'df' if not given
+    '''
+    if figures is None:
+        figures = report_figures
+    if preview:
+        dpi = preview_dpi
+    aggregates = compute_plot_aggregates(df,cube)
+    if num_workers is None or num_workers > 1:
+        with ProcessPoolExecutor(max_workers=num_workers,initializer=_use_agg_backend) as executor:
+            futures = [executor.submit(_render_figure,func,kwargs,save_path,dpi,aggregates) for func,kwargs in figures]
+            for future in futures:
+                future.result()
+    else:
+        _use_agg_backend()
+        for func,kwargs in figures:
+            _render_figure(func,kwargs,save_path,dpi,aggregates)
+
+def _use_agg_backend():
+    plt.switch_backend('Agg')
+
+def _render_figure(func,kwargs,save_path,dpi,aggregates):
+    '''
+    Draw and save a single figure from the aggregates, then close it.
+    '''
+    func(None,save_path=save_path,dpi=dpi,aggregates=aggregates,**kwargs)
+    plt.close('all')
 
 if __name__ == "__main__":
     pass
\ No newline at end of file
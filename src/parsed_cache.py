@@ -0,0 +1,121 @@
+import raw_cache
+
+import pandas as pd
+import numpy as np
+import os
+import json
+import hashlib
+import shutil
+
+# bump if the layout of the cached files changes so old caches are rebuilt
+cache_format_version = 1
+
+def read_data_of_interest_cached(link,column_names,columns_of_interest,cache_dir='data/parsed_cache',read_func=None,parser='auto',float_dtype='float64',raw_cache_dir=None):
+    '''
+    Same output as prep_data.read_data_of_interest, but the parsed year is stored as one .npy file per column (int64 datetime index, typed numeric columns) and loaded from there on later runs instead of parsing the csv again.
+    The cache is rebuilt if the source file, the column schema, the parser or the float dtype changes.
+    Parameters
+    ----------
+    link : str
+        URL or path of the CSV file to read
+    column_names : list of strings
+        Column names for the CSV files
+    columns_of_interest : list of strings
+        List of columns to keep in the returned DataFrame
+    cache_dir : str
+        Directory to store the parsed years in, one subdirectory per year
+    read_func : function
+        Function used to parse the csv when the cache is missing or stale, called as read_func(link,column_names,columns_of_interest,parser=parser,float_dtype=float_dtype). Defaults to prep_data.read_data_of_interest.
+    parser : str
+        see prep_data.read_data_of_interest
+    float_dtype : str ('float64' or 'float32')
+        dtype for the measurement columns
+    raw_cache_dir : str
+        raw cache of the archive files (see raw_cache.get_cached_csv). If given, a URL is checked against and read from the raw cache, None checks it on the archive.
+    Return
+    ------
+    df : DataFrame
+    '''
+    year = link.split('/')[-1].split('.')[0]
+    year_dir = os.path.join(cache_dir,year)
+    key = {
+        'format_version': cache_format_version,
+        'source': raw_cache.source_signature(link,cache_dir=raw_cache_dir),
+        'schema': schema_hash(column_names,columns_of_interest),
+        'parser': parser,
+        'float_dtype': float_dtype
+        }
+    if cache_is_valid(year_dir,key):
+        return load_parsed_year(year_dir)
+
+    if read_func is None:
+        from prep_data import read_data_of_interest as read_func
+    if raw_cache_dir and link.startswith(('http://','https://')):
+        link = raw_cache.get_cached_csv(link,cache_dir=raw_cache_dir)
+    df = read_func(link,column_names,columns_of_interest,parser=parser,float_dtype=float_dtype)
+    save_parsed_year(df,year_dir,key)
+    return df
+
+def schema_hash(column_names,columns_of_interest):
+    '''
+    Hash of the column schema used to parse the file.
+    '''
+    schema = json.dumps({'column_names': list(column_names), 'columns_of_interest': list(columns_of_interest)})
+    return hashlib.sha256(schema.encode()).hexdigest()
+
+def cache_is_valid(year_dir,key):
+    '''
+    Check if the cached year exists and was built with the same source, schema, parser and float dtype as 'key'.
+    '''
+    meta_path = os.path.join(year_dir,'meta.json')
+    if not os.path.exists(meta_path):
+        return False
+    with open(meta_path) as f:
+        meta = json.load(f)
+    return meta.get('key') == key
+
+def save_parsed_year(df,year_dir,key):
+    '''
+    Save a parsed year as one .npy file per column. Written to a temporary directory first and then moved into place, so a partially written cache is never used.
+    Non-numeric columns can't be stored without pickling, so in that case nothing is cached.
+    Parameters
+    ----------
+    df : DataFrame
+        DataFrame with a datetime index, as returned by read_data_of_interest
+    year_dir : str
+    key : dict
+        source, schema, parser and float dtype information stored with the cache
+    '''
+    if not all(pd.api.types.is_numeric_dtype(df[col]) for col in df) or not isinstance(df.index,pd.DatetimeIndex):
+        print(f'Not caching {year_dir}, it has non-numeric columns')
+        return
+    tmp_dir = year_dir + '.tmp'
+    shutil.rmtree(tmp_dir,ignore_errors=True)
+    os.makedirs(tmp_dir)
+    np.save(os.path.join(tmp_dir,'index.npy'),df.index.values.astype('datetime64[ns]').view('int64'))
+    for col in df.columns:
+        np.save(os.path.join(tmp_dir,f'{col}.npy'),df[col].to_numpy())
+    meta = {'key': key, 'index_name': df.index.name, 'columns': list(df.columns), 'rows': len(df)}
+    with open(os.path.join(tmp_dir,'meta.json'),'w') as f:
+        json.dump(meta,f,indent=2)
+    shutil.rmtree(year_dir,ignore_errors=True)
+    os.replace(tmp_dir,year_dir)
+
+def load_parsed_year(year_dir):
+    '''
+    Load a year saved with save_parsed_year.
+    Parameters
+    ----------
+    year_dir : str
+    Return
+    ------
+    df : DataFrame
+    '''
+    with open(os.path.join(year_dir,'meta.json')) as f:
+        meta = json.load(f)
+    index = pd.DatetimeIndex(np.load(os.path.join(year_dir,'index.npy')).view('datetime64[ns]'),name=meta['index_name'])
+    data = {col: np.load(os.path.join(year_dir,f'{col}.npy')) for col in meta['columns']}
+    return pd.DataFrame(data,index=index,copy=False)
+
+if __name__ == "__main__":
+    pass
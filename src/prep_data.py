@@ -1,11 +1,42 @@
 import utilities as ut
+import raw_cache
+import parsed_cache
+import instrumentation as ins
+import wind
+import status_kernel as sk
+import status_store
+import solar
 
 import requests
 from bs4 import BeautifulSoup
 import pandas as pd
 import numpy as np
 import os
-import glob
+import io
+import gzip
+from contextlib import nullcontext
+from functools import partial
+from shutil import copy2
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor
+
+# data column names
+column_names = ['date_time','temperature','pressure','humidity','wind_speed','wind_direction','visibility','co2','insolation','vertical_wind_speed','precipitation','10min','dewpoint']
+columns_of_interest = ['date_time','temperature','humidity','wind_speed','visibility','precipitation','dewpoint','10min']
+# bump when a change to the pipeline changes the prepped data, so earlier runs are not reused
+pipeline_version = 6
+# timestamp format used in the archive files
+date_time_format = '%Y-%m-%d %H:%M:%S'
+# weather statuses, the position in the list is the integer code used for each status
+statuses = ['Green','Yellow','Red']
+# window used to calculate the sustained wind from raw measurements
+sustained_wind_window = '120s'
+seconds_per_day = 24 * 3600
+# nominal seconds covered by a raw measurement and by a 10 min average
+raw_seconds = 10
+average_seconds = 600
+# a measurement covers the time until the next one, unless that gap is longer than this many times its nominal seconds (missing data), then it only covers its nominal seconds
+max_gap_factor = 2
 
 def get_csv_file_links(base_url):
     '''
@@ -35,7 +66,202 @@ def get_csv_file_links(base_url):
         print(f'No csv files found at {base_url}')
     return csv_urls
 
-def get_and_prep_data(url,range_limits,thresholds,save_results=True,save_path='data/',return_df=False):
+def prep_all_available_data(csv_urls,range_limits,thresholds,save_results=True,save_path='data/',skip_years=None,num_workers=1,cache_dir=None,parsed_cache_dir=None,chunksize=None,parser='auto',previous_runs_dir=None,trace_memory=False):
+    '''
+    Prepare the data for every year in 'csv_urls'. Years are independent, so with 'num_workers' > 1 each year is read, cleaned, classified and aggregated in its own worker process. The NaN reports and status hours files are only written by the parent process, in year order, so the output is the same as a serial run.
+    The inputs of each year are recorded in 'manifest.json' in save_path, so only years whose inputs changed are prepared again.
+    The time and memory used by each stage of each year are written to 'stage_timings.jsonl' in save_path.
+    Parameters
+    ----------
+    csv_urls : list
+        list of urls for the csv files to prepare
+    range_limits : dict
+        lower and upper limits for each columns except the date_time
+    thresholds : dict
+        Must contain the columns above as keys with the values being a tuple with the green and red weather threshold values.
+    save_results : bool
+        if true, results saved in location given by save_path
+    save_path : str
+        location to store the df with the status hours and the NaN report
+    skip_years : set
+        years (int) to skip, e.g. years without data or with formatting issues
+    num_workers : int
+        number of worker processes to use. If 1 the years are prepared serially in this process.
+    cache_dir : str
+        directory of the local raw data cache. If None the files are read directly from the archive.
+    parsed_cache_dir : str
+        directory of the parsed (columnar) data cache. If None the csv files are always parsed.
+    chunksize : int
+        if given, each year is streamed through the pipeline 'chunksize' rows at a time to bound the memory used
+    parser : str ('auto', 'c', 'pyarrow' or 'legacy')
+        csv parser backend, see read_data_of_interest
+    previous_runs_dir : str
+        directory with the 'prepped_data_XXXX' directories of earlier runs. Years whose raw input, thresholds, range limits and pipeline version match an earlier run are copied from it instead of being prepared again.
+    trace_memory : bool
+        if true, tracemalloc is used to also record the peak memory allocated in each stage. Slows the pipeline down.
+    Returns
+    -------
+    timings : list of dicts
+        wall time, rows and memory of each stage for each year that was prepared, also written to 'stage_timings.jsonl' in save_path
+    '''
+    year_options = {'cache_dir': cache_dir, 'parsed_cache_dir': parsed_cache_dir, 'chunksize': chunksize, 'parser': parser, 'trace_memory': trace_memory}
+    manifest = ut.load_manifest(save_path)
+    timings = []
+    urls_to_prep = find_years_to_prep(csv_urls,range_limits,thresholds,save_path,manifest,skip_years=skip_years,cache_dir=cache_dir,previous_runs_dir=previous_runs_dir,save_results=save_results)
+
+    if num_workers is None or num_workers > 1:
+        executor = ProcessPoolExecutor(max_workers=num_workers)
+        results = [executor.submit(_prep_year_in_worker,url,range_limits,thresholds,**year_options) for url,_,_ in urls_to_prep]
+    else:
+        executor = None
+        results = [partial(_prep_year_in_worker,url,range_limits,thresholds,**year_options) for url,_,_ in urls_to_prep]
+    # collect in year order so the outputs are written deterministically
+    for (url,key,inputs),result in zip(urls_to_prep,results):
+        year = get_year_from_url(url)
+        try:
+            tables,year_timings = result.result() if executor else result()
+        except Exception as e:
+            print(f'Failed to prep data for {year} at: {url} ({e})')
+            continue
+        save_prepped_year(tables,year_timings,year,key,inputs,save_path,manifest,save_results=save_results)
+        timings += year_timings
+    if executor:
+        executor.shutdown()
+    return timings
+
+def find_years_to_prep(csv_urls,range_limits,thresholds,save_path,manifest,skip_years=None,cache_dir=None,previous_runs_dir=None,save_results=True):
+    '''
+    Years of 'csv_urls' that need to be prepared. Years with the same inputs as their manifest entry in save_path are skipped, and years with the same inputs as an earlier run in previous_runs_dir are copied from it.
+    Remote years that aren't in the raw cache yet are checked with a HEAD request (the same validators the cache stores) instead of being downloaded here, so the workers that prepare them fetch them in parallel.
+    Parameters
+    ----------
+    manifest : dict
+        manifest of save_path, updated with the copied years
+    see prep_all_available_data for the others
+    Returns
+    -------
+    urls_to_prep : list of tuples
+        (url, key, inputs) of each year to prepare, in year order
+    '''
+    if skip_years is None:
+        skip_years = set()
+    urls_to_prep = []
+    for url in sorted(csv_urls,key=get_year_from_url):
+        year = get_year_from_url(url)
+        if ut.get_year_number(year) in skip_years:
+            continue
+        key_cache_dir = cache_dir
+        if cache_dir and url.startswith(('http://','https://')) and raw_cache.find_cached_csv(url,cache_dir) is None:
+            key_cache_dir = None
+        key,inputs = get_year_input_key(url,range_limits,thresholds,cache_dir=key_cache_dir)
+        # if prepped data file already exist for that year with the same inputs skip it
+        if ut.prepped_data_exists(year,base_path=save_path) and manifest.get(year,{}).get('key') == key:
+            print(f'{year} data already prepped.')
+            continue
+        # reuse the output of an earlier run with the same inputs
+        previous_dir = None
+        if previous_runs_dir:
+            previous_dir = ut.find_prepped_year(year,key,previous_runs_dir,'prepped_data',exclude=save_path)
+        if previous_dir:
+            if save_results:
+                for table in status_store.tables:
+                    copy2(os.path.join(previous_dir,f'{table}_{year}.csv'),save_path)
+                _add_year_csvs_to_store(year,save_path)
+            nan_report = ut.load_manifest(previous_dir)[year]['nan_report']
+            _record_prepped_year(save_path,manifest,year,key,inputs,nan_report)
+            print(f'{year} unchanged, reused from {previous_dir}')
+            continue
+        urls_to_prep.append((url,key,inputs))
+    return urls_to_prep
+
+def save_prepped_year(tables,year_timings,year,key,inputs,save_path,manifest,save_results=True):
+    '''
+    Write the tables of a prepared year (if save_results), its NaN report and manifest entry, and its stage timings.
+    '''
+    if save_results:
+        with ins.stage(year_timings,year,'write',len(tables['status_hours'])):
+            write_prepped_year(tables,year,save_path)
+    _record_prepped_year(save_path,manifest,year,key,inputs,get_nan_report(tables['daily_quality']))
+    ins.write_timings(year_timings,save_path)
+    print(f'{year} results written')
+
+def get_year_input_key(url,range_limits,thresholds,cache_dir=None):
+    '''
+    Hash of everything the prepped data for a year depends on: the raw input file (size/ETag/Last-Modified), the thresholds, the range limits, the column schema and the pipeline version.
+    Parameters
+    ----------
+    url : str
+    range_limits : dict
+    thresholds : dict
+    cache_dir : str
+        directory of the local raw data cache, if used the cached file is checked instead of the archive
+    Returns
+    -------
+    key : str
+    inputs : dict
+        the inputs that were hashed
+    '''
+    inputs = {
+        'raw': raw_cache.source_signature(url,cache_dir=cache_dir),
+        'thresholds': thresholds,
+        'range_limits': range_limits,
+        'column_names': column_names,
+        'columns_of_interest': columns_of_interest,
+        'pipeline_version': pipeline_version
+        }
+    return ut.hash_inputs(inputs),inputs
+
+def _record_prepped_year(save_path,manifest,year,key,inputs,nan_report):
+    '''
+    Append the NaN report for a year and record its inputs in the manifest.
+    '''
+    with open(os.path.join(save_path,'NaN_info.txt'),'a') as f:
+        f.write(nan_report)
+    manifest[year] = {'key': key, 'inputs': inputs, 'nan_report': nan_report}
+    ut.save_manifest(save_path,manifest)
+
+def _prep_year_in_worker(url,range_limits,thresholds,cache_dir=None,parsed_cache_dir=None,chunksize=None,parser='auto',trace_memory=False):
+    '''
+    Run get_and_prep_data for a single year in a worker process. Nothing is written to disk, the tables of the year are returned to the parent.
+    Returns
+    -------
+    tables : dict
+        see get_status_tables, the NaN report is made from the daily quality table
+    timings : list of dicts
+        timing records for each stage
+    '''
+    if trace_memory:
+        ins.start_memory_tracing()
+    timings = []
+    with io.StringIO() as nan_file:
+        tables = get_and_prep_data(url,range_limits,thresholds,save_results=False,return_df=True,return_tables=True,nan_file=nan_file,cache_dir=cache_dir,parsed_cache_dir=parsed_cache_dir,chunksize=chunksize,parser=parser,timings=timings)
+    return tables,timings
+
+def write_prepped_year(tables,year,save_path):
+    '''
+    Save each table of a year (see get_status_tables) to '<name>_XXXX.csv', e.g. 'status_hours_XXXX.csv', and replace the year in the store of the directory (see status_store).
+    '''
+    store_path = status_store.get_store_path(save_path)
+    for name,df in tables.items():
+        ut.save_df_to_csv(df,f'{name}_{year}',save_path=save_path)
+        status_store.write_year(df,year,store_path,table=name)
+
+def _add_year_csvs_to_store(year,save_path):
+    '''
+    Add a year that only has its csv files (e.g. copied from an earlier run) to the store of the directory.
+    '''
+    store_path = status_store.get_store_path(save_path)
+    for table in status_store.tables:
+        df = pd.read_csv(os.path.join(save_path,f'{table}_{year}.csv'),index_col='date',parse_dates=['date'])
+        status_store.write_year(df,year,store_path,table=table)
+
+def get_year_from_url(url):
+    '''
+    Get the year from the url (or path) of an archive csv file, e.g. '.../2019.csv' -> '2019'
+    '''
+    return url.split('/')[-1].split('.')[0]
+
+def get_and_prep_data(url,range_limits,thresholds,save_results=True,save_path='data/',return_df=False,return_tables=False,nan_file=None,cache_dir=None,parsed_cache_dir=None,chunksize=None,parser='auto',timings=None):
     '''
     Pipeline to load raw csv file from the IfA archive, clean it, and prepare it by calculating the hours of green, yellow, and red weather.
     Parameters
@@ -52,50 +278,188 @@ def get_and_prep_data(url,range_limits,thresholds,save_results=True,save_path='d
         location to store the df with the status hours
     return_df : bool
         if true, returns the df with the calculated status hours
+    return_tables : bool
+        if true (and return_df), returns every table of the year instead (see get_status_tables)
+    nan_file : file object
+        open file object to write the NaN report to. If None, the report is appended to 'NaN_info.txt' in save_path
+    cache_dir : str
+        directory of the local raw data cache. If given the file is read from a compressed local copy, only downloading it if it is not cached or has changed.
+    parsed_cache_dir : str
+        directory of the parsed data cache. If given the parsed columns are loaded from there instead of parsing the csv again (rebuilt if the source or column schema changes).
+    chunksize : int
+        if given, the file is processed 'chunksize' rows at a time with get_and_prep_data_in_chunks to bound the memory used (parsed_cache_dir is not used)
+    parser : str ('auto', 'c', 'pyarrow' or 'legacy')
+        csv parser backend, see read_data_of_interest. Chunked reads always use 'c'.
+    timings : list
+        if given, a record of the wall time, rows and memory of each stage is appended to it (see instrumentation.stage)
     '''
-    # data column names
-    column_names = ['date_time','temperature','pressure','humidity','wind_speed','wind_direction','visibility','co2','insolation','vertical_wind_speed','precipitation','10min','dewpoint']
-    columns_of_interest = ['date_time','temperature','humidity','wind_speed','visibility','precipitation','dewpoint','10min']
+    if chunksize:
+        return get_and_prep_data_in_chunks(url,range_limits,thresholds,chunksize,save_results=save_results,save_path=save_path,return_df=return_df,return_tables=return_tables,nan_file=nan_file,cache_dir=cache_dir,timings=timings)
 
-    year = url.split('/')[-1].split('.')[0]
+    year = get_year_from_url(url)
     try:
         # read data
-        df = read_data_of_interest(url,column_names,columns_of_interest)
+        if cache_dir:
+            with ins.stage(timings,year,'download'):
+                link = raw_cache.get_cached_csv(url,cache_dir=cache_dir)
+        else:
+            link = url
+        with ins.stage(timings,year,'parse') as record:
+            if parsed_cache_dir:
+                df = parsed_cache.read_data_of_interest_cached(link,column_names,columns_of_interest,cache_dir=parsed_cache_dir,parser=parser,raw_cache_dir=cache_dir)
+            else:
+                df = read_data_of_interest(link,column_names,columns_of_interest,parser=parser)
+            record['rows'] = len(df)
         print(f'{year} data read, processing now.')
-    except:
-        print(f'Failed to read data for {year} at: {url} ')
+    except Exception as e:
+        print(f'Failed to read data for {year} at: {url} ({e})')
+        raise
+    rows = len(df)
 
-    # record the number of NaNs for awareness (possible later anaylsis)
-    with open(os.path.join(save_path,'NaN_info.txt'),'a') as f:
-       print('',file=f) # print an empty line to break up the years
-       count_NaNs(df,f)
+    # check for reasonable values, split wind into sustained and gusts, add delta dew point and convert thresholds to status
+    with ins.stage(timings,year,'clean_classify',rows):
+        df_prepped = clean_and_classify(df,range_limits,thresholds)
 
-    # check for reasonable values
-    remove_unreasonable_measurements(df,range_limits,inplace=True)
-    
-    # split wind into sustaind and gusts
-    df = determine_wind_sust_and_gust(df)
+    # make new dfs with the daily, hour of day and night hours, and the daily counts of NaNs and values removed outside limit range
+    with ins.stage(timings,year,'aggregate',rows):
+        tables = finish_status_tables(get_status_tables(df,df_prepped))
 
-    # add delta dew point
-    df['dewpoint_delta'] = df['temperature'] - df['dewpoint']
+    # record the number of NaNs for awareness (possible later anaylsis)
+    with ins.stage(timings,year,'nan_report',rows), _open_nan_report(save_path,nan_file) as f:
+        f.write(get_nan_report(tables['daily_quality']))
 
-    # convert thresholds to status
-    df['status'] = get_weather_status(df,thresholds)
+    print(f'{year} data prep complete\n')
+    # save new df
+    if save_results:
+        with ins.stage(timings,year,'write',len(tables['status_hours'])):
+            write_prepped_year(tables,year,save_path)
+    if return_df:
+        return tables if return_tables else tables['status_hours']
 
-    # record NaNs after prepping data (will now include values removed outside limit range)
-    with open(os.path.join(save_path,'NaN_info.txt'),'a') as f:
-       print('After prep',file=f)
-       count_NaNs(df,f)
+def get_and_prep_data_in_chunks(url,range_limits,thresholds,chunksize=500000,save_results=True,save_path='data/',return_df=False,return_tables=False,nan_file=None,cache_dir=None,timings=None):
+    '''
+    Same pipeline as get_and_prep_data, but the file is read 'chunksize' rows at a time and each chunk is cleaned, classified and aggregated before the next one is read. Only the daily sums are kept between chunks, so the memory used is bounded by the chunk size rather than the size of the year.
+    The raw rows at the end of each chunk that are still inside the sustained wind window are carried over to the next chunk so the rolling average is the same as for the whole year. The file must be sorted by time.
+    Parameters
+    ----------
+    url : str
+        URL of the CSV file to read
+    range_limits : dict
+        lower and upper limits for each columns except the date_time
+    thresholds : dict
+        Must contain the columns above as keys with the values being a tuple with the green and red weather threshold values.
+    chunksize : int
+        number of rows to read at a time
+    save_results : bool
+        if true, results saved in location given by save_path
+    save_path : str
+        location to store the df with the status hours
+    return_df : bool
+        if true, returns the df with the calculated status hours
+    return_tables : bool
+        if true (and return_df), returns every table of the year instead (see get_status_tables)
+    nan_file : file object
+        open file object to write the NaN report to. If None, the report is appended to 'NaN_info.txt' in save_path
+    cache_dir : str
+        directory of the local raw data cache.
+    timings : list
+        if given, a record of the wall time, rows and memory of each stage of each chunk is appended to it
+    '''
+    year = get_year_from_url(url)
+    if cache_dir:
+        with ins.stage(timings,year,'download'):
+            link = raw_cache.get_cached_csv(url,cache_dir=cache_dir)
+    else:
+        link = url
 
-    # make new df with daily hours
-    df_status_hours = generate_status_hours_df(df)
+    chunks = ins.timed_iter(read_data_in_chunks(link,column_names,columns_of_interest,chunksize),timings,year,'parse')
+    tables = prep_chunks(chunks,range_limits,thresholds,year,timings=timings)
+    with ins.stage(timings,year,'nan_report',len(tables['daily_quality'])), _open_nan_report(save_path,nan_file) as f:
+        f.write(get_nan_report(tables['daily_quality']))
 
     print(f'{year} data prep complete\n')
-    # save new df
     if save_results:
-        ut.save_df_to_csv(df_status_hours,f'status_hours_{year}',save_path=save_path)
+        with ins.stage(timings,year,'write',len(tables['status_hours'])):
+            write_prepped_year(tables,year,save_path)
     if return_df:
-        return df_status_hours
+        return tables if return_tables else tables['status_hours']
+
+def prep_chunks(chunks,range_limits,thresholds,year,timings=None):
+    '''
+    Clean, classify and aggregate a year of raw data that arrives as consecutive chunks of rows, e.g. from read_data_in_chunks or a file that is still downloading. Gives the same tables as preparing the whole year at once.
+    Parameters
+    ----------
+    chunks : iterable of DataFrames
+        raw data in time order, formatted like the output of read_data_of_interest
+    range_limits : dict
+        lower and upper limits for each columns except the date_time
+    thresholds : dict
+        Must contain the columns above as keys with the values being a tuple with the green and red weather threshold values.
+    year : str
+    timings : list
+        if given, a record of the wall time, rows and memory of each stage of each chunk is appended to it
+    Returns
+    -------
+    tables : dict
+        see get_status_tables
+    '''
+    total_rows = 0
+    chunk_tables = []
+    carry_over = None
+    # each chunk is aggregated once the next one arrives, the time of its first row is when the last measurement of the chunk ends
+    pending = None
+    for chunk in chunks:
+        rows = len(chunk)
+        if not rows:
+            continue
+        if not total_rows:
+            print(f'{year} data read, processing in chunks of {rows} rows.')
+        total_rows += rows
+
+        with ins.stage(timings,year,'clean_classify',rows):
+            # the end of the previous chunk is passed along so the rolling wind window sees the same rows it would for the whole year
+            prepped = clean_and_classify(chunk,range_limits,thresholds,previous_rows=carry_over)
+            carry_over = get_wind_window_rows(carry_over,prepped)
+        if pending is not None:
+            with ins.stage(timings,year,'aggregate',len(pending[0])):
+                chunk_tables.append(get_status_tables(*pending,next_time=chunk.index[0]))
+        pending = (chunk,prepped)
+    if pending is None:
+        raise ValueError(f'No rows to prep for {year}')
+    with ins.stage(timings,year,'aggregate',len(pending[0])):
+        chunk_tables.append(get_status_tables(*pending))
+
+    # days (and nights) split across chunks have partial sums in more than one chunk
+    with ins.stage(timings,year,'aggregate',total_rows):
+        tables = {name: pd.concat([t[name] for t in chunk_tables]).groupby(level='date',sort=False).sum(min_count=1) for name in chunk_tables[0]}
+    return finish_status_tables(tables)
+
+def get_wind_window_rows(previous_rows,prepped):
+    '''
+    The cleaned rows inside the sustained wind window of the last row of a chunk, to pass as previous_rows to clean_and_classify for the next chunk. The rows carried over from before are included, so a chunk shorter than the window still passes on every row the window needs.
+    Parameters
+    ----------
+    previous_rows : DataFrame
+        rows carried over to the chunk, None for the first chunk
+    prepped : DataFrame
+        the chunk after clean_and_classify
+    Return
+    ------
+    window_rows : DataFrame
+        columns 'wind_speed' and '10min'
+    '''
+    rows = prepped[['wind_speed','10min']]
+    if previous_rows is not None:
+        rows = pd.concat([previous_rows,rows])
+    return rows.loc[rows.index > prepped.index[-1] - pd.Timedelta(sustained_wind_window)]
+
+def _open_nan_report(save_path,nan_file=None):
+    '''
+    Context manager for the NaN report. Uses 'nan_file' if given (left open), otherwise appends to 'NaN_info.txt' in save_path.
+    '''
+    if nan_file is not None:
+        return nullcontext(nan_file)
+    return open(os.path.join(save_path,'NaN_info.txt'),'a')
 
 def get_specific_year(year,url_list):
     '''
@@ -117,28 +481,169 @@ def get_specific_year(year,url_list):
     link = [url for url in url_list if year in url][0]
     return link
 
-def read_data_of_interest(link,column_names,columns_of_interest):
+def read_data_of_interest(link,column_names,columns_of_interest,parser='auto',float_dtype='float64'):
     '''
     Read the csv file as a DataFrame, assigns column names, and only keeps those of interest. Also converts teh datetime string to datetime format.
     Parameters
     ----------
     link : str
-        URL of the CSV file to read
+        URL or path of the CSV file to read. Compressed files (.gz, .zst) are decompressed while reading.
     colum_names : list of strings
         Column names for the CSV files
     columns_of_interest : list of strings
         List of columns to keep in the returned DataFrame
+    parser : str ('auto', 'c', 'pyarrow' or 'legacy')
+        'auto' uses 'pyarrow' if it is installed, otherwise 'c'. 'c' and 'pyarrow' only parse the columns of interest, with explicit dtypes and timestamp format, using that pandas engine. 'legacy' reads every column and infers the dtypes and timestamp format.
+    float_dtype : str ('float64' or 'float32')
+        dtype for the measurement columns, not used by the 'legacy' parser
     Return
     ------
     df : DataFrame
     '''
-    df = pd.read_csv(link,na_values='\\N',names=column_names)
-    # drop columns not interested in.
-    df = df[columns_of_interest] 
-    # change date string to date time
-    df['date_time'] = pd.to_datetime(df['date_time'])
-    df.set_index('date_time',inplace=True)
-    return df
+    if parser == 'legacy':
+        df = pd.read_csv(link,na_values='\\N',names=column_names)
+        # drop columns not interested in.
+        df = df[columns_of_interest] 
+        # change date string to date time
+        df['date_time'] = pd.to_datetime(df['date_time'])
+        df.set_index('date_time',inplace=True)
+        return df
+    elif parser == 'auto':
+        parser = 'pyarrow' if importlib.util.find_spec('pyarrow') is not None else 'c'
+    elif parser not in ('c','pyarrow'):
+        raise ValueError(f'Unknown parser: {parser}')
+    df = pd.read_csv(link,engine=parser,**_read_csv_options(link,column_names,columns_of_interest,float_dtype))
+    return _format_raw_df(df,column_names,columns_of_interest)
+
+def read_data_in_chunks(link,column_names,columns_of_interest,chunksize,float_dtype='float64'):
+    '''
+    Generator version of read_data_of_interest, yields DataFrames of 'chunksize' rows. Always uses the 'c' parser since the pyarrow engine can't read in chunks.
+    Parameters
+    ----------
+    link : str
+        URL or path of the CSV file to read
+    column_names : list of strings
+        Column names for the CSV files
+    columns_of_interest : list of strings
+        List of columns to keep in the returned DataFrames
+    chunksize : int
+        number of rows in each chunk
+    float_dtype : str ('float64' or 'float32')
+        dtype for the measurement columns
+    Yields
+    ------
+    df : DataFrame
+    '''
+    with pd.read_csv(link,chunksize=chunksize,**_read_csv_options(link,column_names,columns_of_interest,float_dtype)) as reader:
+        for df in reader:
+            yield _format_raw_df(df,column_names,columns_of_interest)
+
+def _read_csv_options(link,column_names,columns_of_interest,float_dtype='float64'):
+    '''
+    pd.read_csv keyword arguments to only parse the columns of interest with explicit dtypes. Archive files have no header so the columns are selected by position. Files saved by pandas (like the ones in data/sample_data, also when served over HTTP or compressed in the raw cache) have a header row and an extra index column, so they are selected by name.
+    '''
+    first_line = _read_first_line(link)
+    if first_line is not None:
+        if 'date_time' in first_line:
+            return {
+                'header': 0,
+                'usecols': columns_of_interest,
+                'na_values': ['\\N'],
+                'dtype': {col: float_dtype for col in columns_of_interest if col != 'date_time'}
+                }
+    usecols = sorted(column_names.index(col) for col in columns_of_interest)
+    # the used columns are named so the dtypes can be given by name, the engines read integer dtype keys differently
+    return {
+        'header': None,
+        'names': [column_names[i] for i in usecols],
+        'usecols': usecols,
+        'na_values': ['\\N'],
+        'dtype': {col: float_dtype for col in columns_of_interest if col != 'date_time'}
+        }
+
+def parse_raw_block(block,column_names,columns_of_interest,header=None,float_dtype='float64'):
+    '''
+    Parse a block of complete lines of a csv file, e.g. the bytes appended to an archive file since it was last read, into a DataFrame formatted like the output of read_data_of_interest.
+    Parameters
+    ----------
+    block : bytes
+        complete lines from anywhere in the file
+    column_names : list of strings
+        Column names for the CSV files
+    columns_of_interest : list of strings
+        List of columns to keep in the returned DataFrame
+    header : str
+        header line of the file the block is from (files saved by pandas), None for the archive files without one. A block at the start of the file can also begin with its header, which is used if 'header' isn't given.
+    float_dtype : str ('float64' or 'float32')
+        dtype for the measurement columns
+    Return
+    ------
+    df : DataFrame
+    '''
+    block_header = get_block_header(block)
+    if header is None:
+        header = block_header
+    if header is None:
+        options = _read_csv_options(None,column_names,columns_of_interest,float_dtype)
+    else:
+        # the columns are found by name, also in blocks after the header
+        options = {
+            'header': None,
+            'names': header.rstrip('\r\n').split(','),
+            'skiprows': 1 if block_header is not None else 0,
+            'usecols': columns_of_interest,
+            'na_values': ['\\N'],
+            'dtype': {col: float_dtype for col in columns_of_interest if col != 'date_time'}
+            }
+    return _format_raw_df(pd.read_csv(io.BytesIO(block),engine='c',**options),column_names,columns_of_interest)
+
+def get_block_header(block):
+    '''
+    Header line a block of a csv file starts with (files saved by pandas have one), None if it starts with a row.
+    '''
+    first_line = block[:block.find(b'\n') + 1].decode(errors='replace').rstrip('\r\n')
+    return first_line if 'date_time' in first_line.split(',') else None
+
+def _read_first_line(link):
+    '''
+    First line of a local file (plain or compressed), of a file on the archive or of a buffered stream (e.g. a download being parsed, looked at without consuming it), None for anything else. Only the start of a remote file is downloaded.
+    '''
+    if hasattr(link,'peek'):
+        return link.peek(1).split(b'\n')[0].decode(errors='replace')
+    if not isinstance(link,str):
+        return None
+    if link.startswith(('http://','https://')):
+        with requests.get(link,stream=True,timeout=60) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            stream = gzip.GzipFile(fileobj=response.raw) if link.endswith('.gz') else response.raw
+            return stream.readline().decode(errors='replace')
+    if not os.path.isfile(link):
+        return None
+    if link.endswith(('.gz','.zst')):
+        # pandas decompresses only as much as it needs for the first row
+        first_row = pd.read_csv(link,header=None,nrows=1,dtype=str,keep_default_na=False)
+        return ','.join(first_row.iloc[0])
+    with open(link) as f:
+        return f.readline()
+
+def _format_raw_df(df,column_names,columns_of_interest):
+    '''
+    Name and order the columns read with _read_csv_options, and convert the timestamps to a datetime index.
+    '''
+    if not set(columns_of_interest).issubset(df.columns):
+        # read without a header, the columns are in the order they are in the file
+        df.columns = sorted(columns_of_interest,key=column_names.index)
+    df = df[columns_of_interest]
+    if pd.api.types.is_datetime64_any_dtype(df['date_time']):
+        date_time = df['date_time'].astype('datetime64[ns]')
+    else:
+        try:
+            date_time = pd.to_datetime(df['date_time'],format=date_time_format)
+        except ValueError:
+            date_time = pd.to_datetime(df['date_time'])
+    df.index = pd.DatetimeIndex(date_time,name='date_time')
+    return df.drop(columns='date_time')
 
 def count_NaNs(df,file=None):
     '''
@@ -148,18 +653,108 @@ def count_NaNs(df,file=None):
     df : DataFrame
     f : file to write to, must be open and writable. If None, prints to terminal
     '''
-    len_df = len(df)
-    max_digits = int(np.log10(len_df) + 1)
-    year = df.index[0].year
+    write_NaN_counts(df.index[0].year,len(df),df.isna().sum(),file)
+
+def write_NaN_counts(year,total_rows,nan_counts,file=None):
+    '''
+    Write the NaN report for a year.
+    Parameters
+    ----------
+    year : int
+    total_rows : int
+    nan_counts : Series
+        number of NaNs with the column names as the index
+    file : file to write to, must be open and writable. If None, prints to terminal
+    '''
+    max_digits = int(np.log10(total_rows) + 1)
     print(f'{year}',file=file)
-    print(f'Total rows          : {len_df}',file=file)
+    print(f'Total rows          : {total_rows}',file=file)
     print('-----------------------------',file=file)
     print(f'Column                 NaNs',file=file)
     print('-----------------------------',file=file)
-    for col in df:
-        print(f'{col:20}: {sum(df[col].isna()):{max_digits}}',file=file)  
+    for col,count in nan_counts.items():
+        print(f'{col:20}: {count:{max_digits}}',file=file)
     print('-----------------------------',file=file)
-    pass
+
+def get_daily_quality(df_raw,df_prepped,durations=None):
+    '''
+    Data quality of each day: how much of the day the measurements cover and, for each column, how many values were missing in the archive, how many were removed for being out of range and how many derived values are missing.
+    Parameters
+    ----------
+    df_raw : DataFrame
+        the measurements as read, formatted like the output of read_data_of_interest
+    df_prepped : DataFrame
+        the same rows after clean_and_classify
+    durations : array
+        seconds covered by each measurement, see get_row_durations
+    Return
+    ------
+    df_quality : DataFrame
+        'date' as the index and the columns:
+        'rows' : number of measurements
+        'observed_seconds' : seconds covered by the measurements
+        'coverage' : observed_seconds / seconds in a day, the fraction of the day the status hours are based on
+        '<col>_nan' : for each column of df_raw, the values missing in the archive
+        '<col>_out_of_range' : for each column of df_raw, the values removed by the range limits
+        '<col>_nan' : for each column added by prepping (e.g. 'wind_sust'), the missing values
+    '''
+    return _add_coverage(_count_daily_quality(df_raw,df_prepped,durations))
+
+def _count_daily_quality(df_raw,df_prepped,durations=None):
+    '''
+    get_daily_quality without the coverage, so the counts of several chunks can be added up.
+    '''
+    if durations is None:
+        durations = get_row_durations(df_prepped)
+    day_codes,days = get_day_codes(df_prepped.index)
+    is_valid = day_codes >= 0
+    codes = day_codes[is_valid]
+    num_days = len(days)
+
+    def count_by_day(flags):
+        return np.bincount(codes[flags[is_valid]],minlength=num_days)
+
+    is_nan_raw = df_raw.isna().to_numpy()
+    is_nan_prepped = df_prepped.isna().to_numpy()
+    prepped_columns = list(df_prepped.columns)
+    quality = {'rows': np.bincount(codes,minlength=num_days), 'observed_seconds': np.bincount(codes,weights=durations[is_valid],minlength=num_days)}
+    for i,col in enumerate(df_raw.columns):
+        quality[f'{col}_nan'] = count_by_day(is_nan_raw[:,i])
+    for i,col in enumerate(df_raw.columns):
+        quality[f'{col}_out_of_range'] = count_by_day(is_nan_prepped[:,prepped_columns.index(col)] & ~is_nan_raw[:,i])
+    for i,col in enumerate(prepped_columns):
+        if col not in df_raw.columns:
+            quality[f'{col}_nan'] = count_by_day(is_nan_prepped[:,i])
+    return pd.DataFrame(quality,index=pd.Index(days,name='date'))
+
+def _add_coverage(df_quality):
+    df_quality.insert(2,'coverage',df_quality['observed_seconds'] / seconds_per_day)
+    return df_quality
+
+def get_nan_report(df_quality):
+    '''
+    NaN report of a year, as written to 'NaN_info.txt', made from its daily quality table: the NaNs in each column as read and after prepping (which includes the values removed for being out of range).
+    Parameters
+    ----------
+    df_quality : DataFrame
+        from get_daily_quality
+    Return
+    ------
+    nan_report : str
+    '''
+    # the counts without the (float) seconds covered, so they are written as integers
+    totals = df_quality.drop(columns=['observed_seconds','coverage']).sum().astype(int)
+    raw_columns = [col[:-len('_out_of_range')] for col in totals.index if col.endswith('_out_of_range')]
+    nans_before = pd.Series({col: totals[f'{col}_nan'] for col in raw_columns})
+    nans_after = pd.Series({col[:-len('_nan')]: count for col,count in totals.items() if col.endswith('_nan')})
+    nans_after[raw_columns] += totals[[f'{col}_out_of_range' for col in raw_columns]].to_numpy()
+    year = df_quality.index[0].year
+    with io.StringIO() as f:
+        print('',file=f) # print an empty line to break up the years
+        write_NaN_counts(year,int(totals['rows']),nans_before,f)
+        print('After prep',file=f)
+        write_NaN_counts(year,int(totals['rows']),nans_after,f)
+        return f.getvalue()
 
 def remove_unreasonable_measurements(df,range_limits,inplace=False):
     '''
@@ -180,22 +775,74 @@ def remove_unreasonable_measurements(df,range_limits,inplace=False):
     if not inplace:
         return df_new
 
-def determine_wind_sust_and_gust(df):
+def determine_wind_sust_and_gust(df,window=sustained_wind_window,gap_tolerance=None):
     '''
-    Determines if the 'wind_speed' is gusts or sustained. Will add additional columns to df for both. If 'wind_speed' is raw measurements the calculated sustained wind will be the rolling 2 min average. 
+    Determines if the 'wind_speed' is gusts or sustained. Will add additional columns to df for both. If 'wind_speed' is raw measurements the calculated sustained wind will be the rolling 2 min average of the raw measurements (see wind.py). 
     Parameters
     ----------
     df : DataFrame
         df must contain datetimes as the index and the columns 'wind_speed' and '10min'. '10min' is a indicator that the measurement is a 10 min average.
+    window : str
+        length of the rolling average
+    gap_tolerance : str
+        the rolling average starts over after a gap between raw measurements longer than this, None to only limit it by the window
     Return
     ------
     df : DataFrame 
         Additional colums 'wind_sust' and 'wind_gust' included. Note 'wind_gust' will be all NaN if the 'wind_speed' measurment was already a 10 min average
     '''
-    df['wind_sust'] = np.where(df['10min']==1,df['wind_speed'],df.wind_speed.rolling('120s').mean())
+    df['wind_sust'] = wind.sustained_wind(df,window,gap_tolerance)
     df['wind_gust'] = np.where(df['10min']==0,df['wind_speed'],np.nan)
     return df
 
+def clean_and_classify(df,range_limits,thresholds,previous_rows=None,float_dtype=None):
+    '''
+    Does remove_unreasonable_measurements, determine_wind_sust_and_gust, the dew point delta and get_weather_status with the fused kernel in status_kernel.py, which packs the measurements into one 2-D array and goes through it a block of rows at a time instead of making a pass over the whole frame for every mask and comparison. The result is the same.
+    Parameters
+    ----------
+    df : DataFrame
+        formatted like the output of read_data_of_interest
+    range_limits : dict
+        lower and upper limits for each columns except the date_time
+    thresholds : dict
+        Must contain the columns above as keys with the values being a tuple with the green and red weather threshold values. None only cleans the measurements, without the 'status' column.
+    previous_rows : DataFrame
+        the cleaned rows just before df, at least the sustained wind window, so the rolling average at the start of df is the same as for the whole year (used when processing in chunks)
+    float_dtype : str
+        dtype to classify the measurements in, defaults to the dtype they were read as. 'float32' halves the memory traffic, the rules are then applied to float32 values.
+    Return
+    ------
+    df : DataFrame
+        with the out of range values replaced by NaN and the columns 'wind_sust','wind_gust','dewpoint_delta' and 'status' added
+    '''
+    columns = [col for col in df.columns if col != '10min']
+    block = sk.pack_columns(df,columns,float_dtype)
+    ten_min = df['10min'].to_numpy()
+    # the sustained wind needs the cleaned wind speed of the rows before each row, so that column is masked first
+    wind_row = columns.index('wind_speed')
+    sk.mask_out_of_range(block[wind_row],*range_limits['wind_speed'])
+    times = df.index.as_unit('ns').asi8
+    speeds = block[wind_row]
+    is_raw = ten_min != 1
+    num_previous = 0
+    if previous_rows is not None and len(previous_rows):
+        num_previous = len(previous_rows)
+        times = np.concatenate([previous_rows.index.as_unit('ns').asi8,times])
+        speeds = np.concatenate([previous_rows['wind_speed'].to_numpy(dtype=float),speeds])
+        is_raw = np.concatenate([(previous_rows['10min'] != 1).to_numpy(),is_raw])
+    wind_sust = wind.sustained_wind_of_arrays(times,speeds,is_raw,sustained_wind_window)[num_previous:]
+
+    dewpoint_delta,wind_gust,codes = sk.clean_and_classify_block(block,columns,range_limits,thresholds,wind_sust,ten_min==0,skip_columns=['wind_speed'])
+    df = df.copy(deep=False)
+    for i,col in enumerate(columns):
+        df[col] = block[i]
+    df['wind_sust'] = wind_sust
+    df['wind_gust'] = wind_gust
+    df['dewpoint_delta'] = dewpoint_delta
+    if codes is not None:
+        df['status'] = pd.Categorical.from_codes(codes,categories=statuses)
+    return df
+
 def get_weather_status(df,thresholds):
     '''
     Determine the weather status (Green,Yellow, or Red) based on the given thresholds
@@ -205,26 +852,46 @@ def get_weather_status(df,thresholds):
         Must contain columns 'humidity','wind_sust','wind_gust','precipitation','visibility', and 'dewpoint_delta'
     thresholds : dict
         Must contain the columns above as keys with the values being a tuple with the green and red weather threshold values.
-    status : Series
-        Series of same length as df with corresponding status values as strings ('Green', 'Yellow', or 'Red')
+    Return
+    ------
+    status : Categorical
+        Categorical of same length as df with corresponding status values ('Green', 'Yellow', or 'Red'), stored as the integer codes from get_weather_status_codes
+    '''
+    return pd.Categorical.from_codes(get_weather_status_codes(df,thresholds),categories=statuses)
+
+def get_weather_status_codes(df,thresholds):
     '''
-    status_conditions = [(
+    Determine the weather status as integer codes (0: Green, 1: Yellow, 2: Red, the positions in 'statuses'). Red takes priority over Green.
+    Parameters
+    ----------
+    df : DataFrame
+        Must contain columns 'humidity','wind_sust','wind_gust','precipitation','visibility', and 'dewpoint_delta'
+    thresholds : dict
+        Must contain the columns above as keys with the values being a tuple with the green and red weather threshold values.
+    Return
+    ------
+    codes : ndarray of uint8
+    '''
+    is_red = (
         (df['humidity'] > max(thresholds['humidity'])) | 
         (df['wind_sust'] > max(thresholds['wind_sust'])) | 
         (df['wind_gust'] > max(thresholds['wind_gust'])) | 
         (df['precipitation'] > max(thresholds['precipitation'])) | 
         (df['dewpoint_delta'] < min(thresholds['dewpoint_delta'])) | 
         (df['visibility'] < min(thresholds['visibility']))
-        ),(
+        ).to_numpy()
+    is_green = (
         ((df['humidity'].isna()) | (df['humidity'] <= min(thresholds['humidity']))) &
         ((df['wind_sust'].isna()) | (df['wind_sust'] <= min(thresholds['wind_sust']))) & 
         ((df['wind_gust'].isna()) | (df['wind_gust'] <= min(thresholds['wind_gust']))) & 
         ((df['precipitation'].isna()) | (df['precipitation'] <= min(thresholds['precipitation']))) & 
         ((df['dewpoint_delta'].isna()) | (df['dewpoint_delta'] >= max(thresholds['dewpoint_delta']))) &
         ((df['visibility'].isna()) | (df['visibility'] >= max(thresholds['visibility'])))
-        )]
-    status_values = ['Red','Green']
-    return np.select(status_conditions,status_values,default='Yellow')
+        ).to_numpy()
+    codes = np.ones(len(df),dtype=np.uint8)
+    codes[is_green] = 0
+    codes[is_red] = 2
+    return codes
 
 def generate_status_hours_df(df):
     '''
@@ -232,50 +899,261 @@ def generate_status_hours_df(df):
     Parameters
     ----------
     df : DataFrame
-        Must contain datetime as index and columns: ['10min','status']. '10min' is bool and 'status' is either 'Green', 'Yellow', or 'Red'.
+        Must contain datetime as index and columns: ['10min','status']. '10min' is bool and 'status' is either 'Green', 'Yellow', or 'Red' (strings or the Categorical from get_weather_status).
     Return
     ------
     new_df : DataFrame
         DataFrame with 'date' as index and columns: ['Green','Yellow','Red']. Values are the hours of each condition for each day.
     '''
-    df['seconds'] = np.where(df['10min'],600,10)
-    df['date'] = df.index.date
-    new_df = pd.DataFrame(columns = ['Green','Yellow','Red'],index=df['date'].unique().tolist())
-    new_df.index.name = 'date'
-    for status in new_df.columns:
-        new_df[status] = (df[df.status==status].groupby(['date']).seconds.sum()) / 3600
+    new_df = get_status_seconds_by_day(df) / 3600
     return new_df
 
-def combine_status_hour_dfs(base_path):
+def get_status_seconds_by_day(df,durations=None):
+    '''
+    Total seconds of each status for each day. Days without any measurements of a status are NaN.
+    Parameters
+    ----------
+    df : DataFrame
+        Must contain datetime as index and columns: ['10min','status'].
+    durations : array
+        seconds covered by each measurement, defaults to get_row_durations(df)
+    Return
+    ------
+    new_df : DataFrame
+        DataFrame with 'date' as index and columns: ['Green','Yellow','Red'].
+    '''
+    return get_status_seconds(df,durations)['status_hours']
+
+def get_row_durations(df,next_time=None):
+    '''
+    Seconds covered by each measurement: the time until the next measurement, or the nominal seconds of the measurement (10 s raw, 10 min averages) if that gap is longer than max_gap_factor times the nominal seconds (missing data) or there is no next measurement.
+    Parameters
+    ----------
+    df : DataFrame
+        Must contain datetime as index in time order and the column '10min'
+    next_time : Timestamp
+        time of the measurement after the last row, e.g. the first row of the next chunk
+    Return
+    ------
+    durations : array of float
+    '''
+    nominal = np.where(df['10min'].to_numpy(),average_seconds,raw_seconds).astype(float)
+    times = df.index.as_unit('ns').asi8
+    spacing = np.full(len(df),np.nan)
+    spacing[:-1] = np.diff(times) / 1e9
+    if len(df) and next_time is not None:
+        spacing[-1] = (pd.Timestamp(next_time).as_unit('ns').value - times[-1]) / 1e9
+    # NaN, negative (out of order or NaT) and long gaps get the nominal seconds, duplicate timestamps cover nothing
+    is_spacing = (spacing >= 0) & (spacing <= nominal * max_gap_factor)
+    return np.where(is_spacing,spacing,nominal)
+
+def get_status_seconds(df,durations=None):
+    '''
+    Seconds of each status for each day, for each hour of each day and for each night, from one bincount over the days and hours of the rows and one over the nights.
+    Parameters
+    ----------
+    df : DataFrame
+        Must contain datetime as index and columns: ['10min','status'].
+    durations : array
+        seconds covered by each measurement, defaults to get_row_durations(df)
+    Return
+    ------
+    status_seconds : dict
+        'status_hours': 'date' as index and the columns ['Green','Yellow','Red']
+        'hourly_status': 'date' as index and a column for each status and hour of the day, e.g. 'Green_00' for 00:00-01:00
+        'night_status': the date of the evening each night starts on as index and the columns ['Green','Yellow','Red'], only the time from sunset to sunrise (see solar.get_night_codes)
+        Days, hours and nights without any measurements of a status are NaN.
+    '''
+    if durations is None:
+        durations = get_row_durations(df)
+    day_codes,days = get_day_codes(df.index)
+    status_codes = pd.Categorical(df['status'],categories=statuses).codes
+    times = df.index.as_unit('ns').asi8
+    hours = (times // 3600_000_000_000) % 24
+    night_codes,nights = solar.get_night_codes(times)
+    # rows without a valid status or date aren't counted
+    is_valid = (status_codes >= 0) & (day_codes >= 0)
+    bins = (day_codes[is_valid] * 24 + hours[is_valid]) * len(statuses) + status_codes[is_valid]
+    hourly_seconds = np.bincount(bins,weights=durations[is_valid],minlength=len(days) * 24 * len(statuses)).reshape(len(days),24,len(statuses))
+    is_night = is_valid & (night_codes >= 0)
+    bins = night_codes[is_night] * len(statuses) + status_codes[is_night]
+    night_seconds = np.bincount(bins,weights=durations[is_night],minlength=len(nights) * len(statuses)).reshape(len(nights),len(statuses))
+    has_rows = np.bincount(night_codes[is_night],minlength=len(nights)) > 0
+
+    day_index = pd.Index(days,name='date')
+    hourly_columns = [f'{status}_{hour:02d}' for status in statuses for hour in range(24)]
+    status_seconds = {
+        'status_hours': hourly_seconds.sum(axis=1),
+        'hourly_status': hourly_seconds.transpose(0,2,1).reshape(len(days),-1),
+        'night_status': night_seconds[has_rows]
+        }
+    return {
+        'status_hours': pd.DataFrame(_zero_to_nan(status_seconds['status_hours']),columns=statuses,index=day_index),
+        'hourly_status': pd.DataFrame(_zero_to_nan(status_seconds['hourly_status']),columns=hourly_columns,index=day_index),
+        'night_status': pd.DataFrame(_zero_to_nan(status_seconds['night_status']),columns=statuses,index=pd.Index(nights[has_rows].astype(object),name='date'))
+        }
+
+def _zero_to_nan(seconds):
+    return np.where(seconds > 0,seconds,np.nan)
+
+def get_status_tables(df_raw,df_prepped,next_time=None):
+    '''
+    Every table made for a year from the raw and prepped rows, in one pass. The values are seconds (and counts), so the tables of consecutive chunks can be added up before finish_status_tables converts them.
+    Parameters
+    ----------
+    df_raw : DataFrame
+        the measurements as read
+    df_prepped : DataFrame
+        the same rows after clean_and_classify
+    next_time : Timestamp
+        time of the measurement after the last row, see get_row_durations
+    Return
+    ------
+    tables : dict
+        'status_hours', 'hourly_status' and 'night_status' from get_status_seconds and 'daily_quality' from get_daily_quality (without the coverage)
+    '''
+    durations = get_row_durations(df_prepped,next_time)
+    tables = get_status_seconds(df_prepped,durations)
+    tables['daily_quality'] = _count_daily_quality(df_raw,df_prepped,durations)
+    return tables
+
+def finish_status_tables(tables):
+    '''
+    Convert the tables of get_status_tables from seconds to hours, add the coverage to the daily quality table and the length of each night (in hours) to the night table.
+    '''
+    tables = {name: df / 3600 if name != 'daily_quality' else _add_coverage(df) for name,df in tables.items()}
+    tables['night_status']['night_hours'] = solar.get_night_hours(tables['night_status'].index.values.astype('datetime64[D]'))
+    return tables
+
+def get_day_codes(index):
     '''
-    Loads the data from all the individual year 'status_hours' CSV files into a single Data Frame
+    Integer code for the day of each timestamp, numbered in the order the days first appear.
+    Parameters
+    ----------
+    index : DatetimeIndex
+    Return
+    ------
+    day_codes : ndarray of int
+        -1 for missing timestamps
+    days : ndarray of datetime.date
+        the day for each code
+    '''
+    day_codes,days = pd.factorize(index.values.astype('datetime64[D]'))
+    return day_codes,days.astype(object)
+
+def combine_status_hour_dfs(base_path,start=None,end=None,months=None,years=None):
+    '''
+    Loads the daily status hours of all the years (or only the days asked for) into a single Data Frame, from the store of the directory (see status_store).
+    Directories prepped before the store existed are read from the individual year 'status_hours' CSV files instead.
     Parameters
     ----------
     base_path : str
-        Directory path to location of the status hours CSV files.
+        Directory path to location of the prepped data.
+    start, end : str or Timestamp
+        first and last day to load (inclusive)
+    months : list
+        month numbers (1-12) or names ('Jan', ...) to load
+    years : list
+        years to load
     Returns
     -------
     df : DataFrame
     '''
-    status_csv_files = sorted(glob.glob(os.path.join(base_path,'status_hours*.csv')))
-    df = pd.DataFrame()
-    for file in status_csv_files:
-        df_to_add = pd.read_csv(file)
-        df = pd.concat([df,df_to_add],ignore_index=True)
-    df['date'] = pd.to_datetime(df['date'])
-    df.set_index('date',inplace=True)
+    return _combine_daily_tables(base_path,'status_hours',start,end,months,years)
+
+def combine_daily_quality_dfs(base_path,start=None,end=None,months=None,years=None):
+    '''
+    Loads the daily quality tables (see get_daily_quality) of all the years (or only the days asked for) into a single Data Frame, the same way as combine_status_hour_dfs.
+    Returns
+    -------
+    df_quality : DataFrame
+    '''
+    return _combine_daily_tables(base_path,'daily_quality',start,end,months,years)
+
+def _combine_daily_tables(base_path,table,start=None,end=None,months=None,years=None):
+    '''
+    Read a daily table from the store if it has every prepped year, otherwise from the csv files of each year.
+    '''
+    store_path = status_store.get_store_path(base_path)
+    prepped_years = ut.get_years(base_path)
+    if set(ut.get_year_number(year) for year in prepped_years) <= set(status_store.get_store_years(store_path,table)):
+        return _merge_split_nights(status_store.read_days(store_path,table,start=start,end=end,months=months,years=years))
+    csv_files = [os.path.join(base_path,f'{table}_{year}.csv') for year in prepped_years if not years or ut.get_year_number(year) in set(int(y) for y in years)]
+    df = pd.concat([pd.read_csv(file,index_col='date',parse_dates=['date']) for file in csv_files])
+    if start is not None:
+        df = df[df.index >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df.index <= pd.Timestamp(end)]
+    if months:
+        df = df[df.index.month.isin([status_store.get_month_number(month) for month in months])]
+    return _merge_split_nights(df)
+
+def _merge_split_nights(df):
+    '''
+    The night of Dec 31 is in the tables of both years, add up the two parts.
+    '''
+    if 'night_hours' not in df.columns or df.index.is_unique:
+        return df
+    merged = df.drop(columns='night_hours').groupby(level='date').sum(min_count=1)
+    merged['night_hours'] = df['night_hours'].groupby(level='date').first()
+    return merged
+
+def combine_night_status_dfs(base_path,start=None,end=None,months=None,years=None):
+    '''
+    Loads the status hours of each night (see get_status_seconds) of all the years, or only the nights asked for, the same way as combine_status_hour_dfs.
+    Returns
+    -------
+    df_night : DataFrame
+        the date of the evening each night starts on as the index
+    '''
+    return _combine_daily_tables(base_path,'night_status',start,end,months,years)
+
+def combine_hourly_status_dfs(base_path,start=None,end=None,months=None,years=None):
+    '''
+    Loads the status hours of each hour of the day (see get_status_seconds) of all the years, or only the days asked for, the same way as combine_status_hour_dfs.
+    Returns
+    -------
+    df_hourly : DataFrame
+    '''
+    return _combine_daily_tables(base_path,'hourly_status',start,end,months,years)
+
+def load_status_hours(data_dir,start=None,end=None,months=None,years=None,min_coverage=None):
+    '''
+    Load the daily status hours of a prepped data directory ready for the analysis: normalized to 24 hours, with the month and year columns added.
+    Parameters
+    ----------
+    data_dir : str
+    start, end, months, years
+        days to load, see combine_status_hour_dfs
+    min_coverage : float
+        see normalize_daily_hours_to_24
+    Returns
+    -------
+    df : DataFrame
+    '''
+    df = combine_status_hour_dfs(data_dir,start=start,end=end,months=months,years=years)
+    df_quality = combine_daily_quality_dfs(data_dir,start=start,end=end,months=months,years=years) if min_coverage else None
+    df = normalize_daily_hours_to_24(df,df_quality,min_coverage=min_coverage)
+    add_month_year_columns(df)
     return df
 
-def normalize_daily_hours_to_24(df):
+def normalize_daily_hours_to_24(df,df_quality=None,min_coverage=None):
     '''
-    Normalizes the hours of each status to 24 and replaces NaN with 0.
+    Normalizes the hours of each status to 24 and replaces NaN with 0. Days with only part of the day measured are scaled up, so with 'min_coverage' the days that are mostly missing can be dropped first.
     Parameters
     ----------
     df : DataFrame
+    df_quality : DataFrame
+        daily quality table with the same dates as df (see combine_daily_quality_dfs), needed for min_coverage
+    min_coverage : float
+        drop the days with less than this fraction of the day measured (e.g. 0.5), days missing from df_quality are dropped too
     Returns  
     -------
     normalized_df : DataFrame
     '''
+    if min_coverage:
+        coverage = df_quality['coverage'].reindex(df.index)
+        df = df[coverage.to_numpy() >= min_coverage]
     normalized_df = df.div(df.sum(axis=1),axis=0) * 24
     normalized_df.fillna({'Green': 0,'Yellow': 0,'Red':0},inplace=True)
     return normalized_df
@@ -289,11 +1167,9 @@ def add_month_year_columns(df):
         df should have index of date-times named 'date' 
     '''
     months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
-    df.reset_index(inplace=True)
-    df['month'] = pd.Categorical(df['date'].dt.strftime('%b'),categories=months,ordered=True)
-    df['year'] = df['date'].dt.year
-    df.set_index('date',inplace=True)
-    pass
+    # categories from the month numbers of the index, without formatting every date or rebuilding the index
+    df['month'] = pd.Categorical.from_codes(df.index.month - 1,categories=months,ordered=True)
+    df['year'] = df.index.year
 
 if __name__ == "__main__":
     # set testing to True to just use smaller data sets from 1994-2005
@@ -306,6 +1182,17 @@ if __name__ == "__main__":
         skip_years.update(set(range(2006,2020,1)))
         
 
+    # number of processes used to prep the years in parallel (1 runs serially)
+    num_workers = os.cpu_count()
+    # raw archive files are cached here so they are only downloaded once
+    raw_cache_dir = os.path.join('data','raw_cache')
+    # parsed years are cached here so changing thresholds doesn't require parsing the csv files again
+    parsed_cache_dir = os.path.join('data','parsed_cache')
+    # rows to stream through the pipeline at a time to bound memory (None reads each year at once)
+    chunksize = None
+    # csv parser backend ('auto', 'c', 'pyarrow' or 'legacy')
+    parser = 'auto'
+
     # Establish required info
     # link for data files
     base_url = "http://kopiko.ifa.hawaii.edu/weather/archivedata/"
@@ -338,19 +1225,9 @@ if __name__ == "__main__":
     # get list of all data file urls
     csv_urls = get_csv_file_links(base_url)
 
-    # prep all data
-    # prep_all_available_data(csv_urls,acceptable_ranges,thresholds,save_results=True,save_path=data_dir) 
-    for url in csv_urls:
-        year = url.split('/')[-1].split('.')[0]
-        if int(year) in skip_years:
-            continue
-        # if prepped data file already exist for that year skip it
-        elif ut.prepped_data_exists(year,base_path=data_dir):
-            print(f'{year} data already prepped.')
-            continue
-        else:
-            get_and_prep_data(url,acceptable_ranges,thresholds,save_results=True,save_path=data_dir)
-            
+    # prep all data - each year is prepared in its own process
+    timings = prep_all_available_data(csv_urls,acceptable_ranges,thresholds,save_results=True,save_path=data_dir,skip_years=skip_years,num_workers=num_workers,cache_dir=raw_cache_dir,parsed_cache_dir=parsed_cache_dir,chunksize=chunksize,parser=parser,previous_runs_dir='data')
+
     # record the set up info to a file
     years = ut.get_years(data_dir)
     with open(os.path.join(data_dir,'run_info.txt'),'a') as f:
@@ -358,8 +1235,6 @@ if __name__ == "__main__":
 
 
     # combine the daily status hours for all years into one df
-    df = combine_status_hour_dfs(base_path=data_dir)
-    df = normalize_daily_hours_to_24(df)
-    add_month_year_columns(df)
+    df = load_status_hours(data_dir)
     ut.save_df_to_csv(df,'combined_status_hours',data_dir)
 
@@ -0,0 +1,227 @@
+import requests
+import os
+import json
+import gzip
+import datetime
+
+# extension used for each supported compression, pandas infers the compression from it when reading
+compression_extensions = {'gzip': '.csv.gz', 'zstd': '.csv.zst'}
+# headers used to check if the remote file has changed since it was cached
+validator_headers = ['ETag','Last-Modified','Content-Length']
+
+def get_cached_csv(url,cache_dir='data/raw_cache',compression='gzip',revalidate=None,chunk_size=1024*1024):
+    '''
+    Get a local, compressed copy of an archive csv file, downloading it only if it is not cached or the remote file has changed.
+    Parameters
+    ----------
+    url : str
+        URL of the CSV file. Local paths are returned unchanged.
+    cache_dir : str
+        Directory to store the compressed files and their metadata in
+    compression : str ('gzip' or 'zstd')
+        Compression to use for newly cached files. 'zstd' requires the zstandard package.
+    revalidate : bool
+        If True the remote headers are checked before using a cached file. If None, only the current year is checked since historical years never change.
+    chunk_size : int
+        Number of bytes to stream from the server at a time
+    Returns
+    -------
+    cached_path : str
+        Path to the compressed csv file, can be passed directly to pd.read_csv
+    '''
+    if not url.startswith(('http://','https://')):
+        return url
+    os.makedirs(cache_dir,exist_ok=True)
+    cached_path = find_cached_csv(url,cache_dir,revalidate)
+    if cached_path:
+        return cached_path
+    year = url.split('/')[-1].split('.')[0]
+    return download_to_cache(url,year,cache_dir,compression,chunk_size)
+
+def find_cached_csv(url,cache_dir,revalidate=None,session=None):
+    '''
+    Path of the cached copy of an archive csv file, if it is cached and the remote file hasn't changed.
+    Parameters
+    ----------
+    url : str
+    cache_dir : str
+    revalidate : bool
+        If True the remote headers are checked. If None, only the current year is checked since historical years never change.
+    session : requests.Session
+        session to make the request with, to reuse its connections
+    Returns
+    -------
+    cached_path : str
+        None if the file needs to be downloaded
+    '''
+    year = url.split('/')[-1].split('.')[0]
+    meta = load_cache_metadata(year,cache_dir)
+    if not meta or meta['url'] != url or not os.path.exists(os.path.join(cache_dir,meta['filename'])):
+        return None
+    cached_path = os.path.join(cache_dir,meta['filename'])
+    if revalidate is None:
+        revalidate = not is_historical_year(year)
+    if not revalidate:
+        return cached_path
+    response = (session or requests).head(url,allow_redirects=True)
+    response.raise_for_status()
+    if not remote_file_changed(meta['validators'],response.headers):
+        return cached_path
+    print(f'{year} changed on the archive, downloading again.')
+    return None
+
+def download_to_cache(url,year,cache_dir,compression='gzip',chunk_size=1024*1024):
+    '''
+    Stream a csv file from the archive into a compressed file in the cache. The file is written to a temporary name and moved into place once complete, so an interrupted download never leaves a partial file in the cache.
+    Parameters
+    ----------
+    url : str
+    year : str
+    cache_dir : str
+    compression : str ('gzip' or 'zstd')
+    chunk_size : int
+    Returns
+    -------
+    cached_path : str
+    '''
+    cached_path = os.path.join(cache_dir,f'{year}{compression_extensions[compression]}')
+    tmp_path = cached_path + '.tmp'
+    with requests.get(url,stream=True) as response:
+        response.raise_for_status()
+        with open_compressed(tmp_path,compression) as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                f.write(chunk)
+        validators = {header: response.headers.get(header) for header in validator_headers}
+    os.replace(tmp_path,cached_path)
+    save_cache_metadata(year,cache_dir,_cache_metadata(url,cached_path,compression,validators))
+    print(f'{year} downloaded to {cached_path}')
+    return cached_path
+
+def add_file_to_cache(path,url,year,cache_dir,compression='gzip',validators=None,chunk_size=1024*1024):
+    '''
+    Compress a complete, downloaded csv file into the cache, e.g. one fetched by async_download.
+    Parameters
+    ----------
+    path : str
+        uncompressed csv file, left in place
+    url : str
+        URL the file was downloaded from
+    year : str
+    cache_dir : str
+    compression : str ('gzip' or 'zstd')
+    validators : dict
+        ETag, Last-Modified and Content-Length of the remote file
+    chunk_size : int
+    Returns
+    -------
+    cached_path : str
+    '''
+    os.makedirs(cache_dir,exist_ok=True)
+    cached_path = os.path.join(cache_dir,f'{year}{compression_extensions[compression]}')
+    tmp_path = cached_path + '.tmp'
+    with open(path,'rb') as f_in, open_compressed(tmp_path,compression) as f_out:
+        for chunk in iter(lambda: f_in.read(chunk_size),b''):
+            f_out.write(chunk)
+    os.replace(tmp_path,cached_path)
+    save_cache_metadata(year,cache_dir,_cache_metadata(url,cached_path,compression,validators or {}))
+    return cached_path
+
+def _cache_metadata(url,cached_path,compression,validators):
+    return {
+        'url': url,
+        'filename': os.path.basename(cached_path),
+        'compression': compression,
+        'validators': validators,
+        'downloaded': datetime.datetime.now().isoformat(timespec='seconds')
+        }
+
+def open_compressed(path,compression='gzip'):
+    '''
+    Open a binary file for writing with the given compression.
+    '''
+    if compression == 'gzip':
+        return gzip.open(path,'wb',compresslevel=6)
+    elif compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("compression='zstd' requires the zstandard package, use compression='gzip' instead")
+        return zstandard.open(path,'wb')
+    raise ValueError(f'Unknown compression: {compression}')
+
+def remote_file_changed(cached_validators,headers):
+    '''
+    Compare the cached ETag, Last-Modified and Content-Length to the current response headers. Only validators present in both are compared. If none are available the file is assumed to have changed.
+    Parameters
+    ----------
+    cached_validators : dict
+    headers : dict like
+        response headers from the archive
+    Returns
+    -------
+    changed : bool
+    '''
+    compared = False
+    for header in validator_headers:
+        cached = cached_validators.get(header)
+        current = headers.get(header)
+        if cached is None or current is None:
+            continue
+        if cached != current:
+            return True
+        compared = True
+    return not compared
+
+def source_signature(link,cache_dir=None):
+    '''
+    Identify the version of a source file without reading it. Local files use their size and modification time, remote files the ETag, Last-Modified and Content-Length headers.
+    Parameters
+    ----------
+    link : str
+        URL or path of the file
+    cache_dir : str
+        If given, remote files are fetched into (or revalidated in) the cache and the headers stored with the cached file are used, so historical years don't need a network request.
+    Returns
+    -------
+    signature : dict
+    '''
+    if not link.startswith(('http://','https://')):
+        stat = os.stat(link)
+        return {'path': os.path.abspath(link), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if cache_dir:
+        get_cached_csv(link,cache_dir=cache_dir)
+        validators = load_cache_metadata(link.split('/')[-1].split('.')[0],cache_dir)['validators']
+    else:
+        response = requests.head(link,allow_redirects=True)
+        response.raise_for_status()
+        validators = {header: response.headers.get(header) for header in validator_headers}
+    return {'url': link, **validators}
+
+def is_historical_year(year):
+    '''
+    Years before the current year are complete and no longer change on the archive.
+    '''
+    try:
+        return int(year) < datetime.date.today().year
+    except ValueError:
+        return False
+
+def load_cache_metadata(year,cache_dir):
+    '''
+    Load the metadata stored with a cached file. Returns None if the year is not cached.
+    '''
+    meta_path = os.path.join(cache_dir,f'{year}.json')
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        return json.load(f)
+
+def save_cache_metadata(year,cache_dir,meta):
+    '''
+    Save the metadata for a cached file next to it.
+    '''
+    with open(os.path.join(cache_dir,f'{year}.json'),'w') as f:
+        json.dump(meta,f,indent=2)
+
+if __name__ == "__main__":
+    pass
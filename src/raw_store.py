@@ -0,0 +1,242 @@
+'''
+Memory mapped store of the cleaned raw measurements of every year, to look at any stretch of time (e.g. a few weeks in a notebook) without loading whole years. The store is a directory with one flat binary file per column, rows in time order across all the years:
+    - 'time.bin': int64 nanosecond timestamps (local time, as in the archive), sorted
+    - '<column>.bin': the measurements with the out of range values replaced by NaN (prep_data.remove_unreasonable_measurements), and the '10min' flag
+    - 'meta.json': the number of rows, the dtypes, the range limits used and the first and last row of each year
+Years are only appended, a query maps the files and binary searches the timestamps, so it reads just the pages of the rows it returns, e.g.
+
+    store = raw_store.open_store('data/raw_store')
+    rows = raw_store.read_range(store,'2019-06-01','2019-06-15',columns=['humidity','wind_speed'])
+'''
+import prep_data as prep
+import raw_cache
+import utilities as ut
+
+import pandas as pd
+import numpy as np
+import os
+import json
+
+# bump if the layout of the files changes so old stores are rebuilt
+store_format_version = 1
+
+def build_store(csv_urls,range_limits,store_dir='data/raw_store',float_dtype='float64',parser='auto',cache_dir=None):
+    '''
+    Add the cleaned measurements of each year to the store, skipping the years already in it from the same source file. Since the files are append only, a year that is new or changed before the last stored year (e.g. the current year that is still growing) is written again with every year after it. The store starts over if the range limits, columns or float dtype change.
+    Parameters
+    ----------
+    csv_urls : list
+        URLs or paths of the yearly csv files
+    range_limits : dict
+        lower and upper limits for each columns except the date_time
+    store_dir : str
+    float_dtype : str ('float64' or 'float32')
+        dtype the measurements are stored as, float32 halves the size of the store
+    parser : str
+        see prep_data.read_data_of_interest
+    cache_dir : str
+        raw cache to read the archive files from (see raw_cache.get_cached_csv), None reads them directly
+    Returns
+    -------
+    meta : dict
+        the meta data of the store
+    '''
+    settings = _settings_key(range_limits,float_dtype)
+    meta = load_meta(store_dir)
+    if meta is None or meta['settings'] != settings:
+        meta = {'format_version': store_format_version, 'settings': settings, 'columns': _stored_columns(), 'dtypes': _stored_dtypes(float_dtype), 'rows': 0, 'years': {}}
+        _reset_files(store_dir,meta)
+    links = sorted(csv_urls,key=prep.get_year_from_url)
+    sources = {prep.get_year_from_url(link): raw_cache.source_signature(link,cache_dir=cache_dir) for link in links}
+    # years from the first one that is missing or changed are written (again)
+    changed = [year for year in sources if meta['years'].get(year,{}).get('source') != sources[year]]
+    if not changed:
+        return meta
+    first_changed = min(changed)
+    kept_years = {year: info for year,info in meta['years'].items() if year < first_changed}
+    dropped = sorted(year for year in meta['years'] if year > first_changed and year not in sources)
+    if dropped:
+        print(f'Dropping {" ".join(dropped)} from the raw store, they come after {first_changed} and have no csv file')
+    meta['rows'] = max([info['end_row'] for info in kept_years.values()],default=0)
+    meta['years'] = kept_years
+    _truncate_files(store_dir,meta)
+    save_meta(store_dir,meta)
+    for link in links:
+        year = prep.get_year_from_url(link)
+        if year < first_changed:
+            continue
+        read_link = raw_cache.get_cached_csv(link,cache_dir=cache_dir) if cache_dir else link
+        df = prep.read_data_of_interest(read_link,prep.column_names,prep.columns_of_interest,parser=parser,float_dtype=float_dtype)
+        append_year(df,year,store_dir,meta,range_limits,source=sources[year])
+        print(f'{year}: {len(df)} rows added to the raw store')
+    return meta
+
+def append_year(df,year,store_dir,meta,range_limits,source=None):
+    '''
+    Clean the measurements of a year and append them to the files of the store. The meta data is saved last, so the rows of an append that doesn't finish are cut off by the next one.
+    Parameters
+    ----------
+    df : DataFrame
+        a year as returned by prep_data.read_data_of_interest
+    year : str
+    store_dir : str
+    meta : dict
+        meta data of the store, updated in place
+    range_limits : dict
+    source : dict
+        signature of the source file (see raw_cache.source_signature)
+    '''
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index(kind='stable')
+    times = df.index.as_unit('ns').asi8
+    if meta['rows'] and len(times) and times[0] < _read_last_time(store_dir,meta):
+        raise ValueError(f'{year} starts before the last row in the store, years must be appended in time order')
+    cleaned = prep.remove_unreasonable_measurements(df,range_limits)
+    cleaned['10min'] = df['10min']
+    _truncate_files(store_dir,meta)
+    with open(os.path.join(store_dir,'time.bin'),'ab') as f:
+        f.write(np.ascontiguousarray(times,dtype=np.int64).tobytes())
+    for col in meta['columns']:
+        with open(os.path.join(store_dir,f'{col}.bin'),'ab') as f:
+            f.write(cleaned[col].to_numpy(dtype=meta['dtypes'][col]).tobytes())
+    meta['years'][year] = {'start_row': meta['rows'], 'end_row': meta['rows'] + len(times), 'source': source}
+    meta['rows'] += len(times)
+    save_meta(store_dir,meta)
+
+def open_store(store_dir='data/raw_store'):
+    '''
+    Map the files of the store (read only), nothing is read until the rows are used.
+    Returns
+    -------
+    store : dict
+        'meta': the meta data, 'time': the int64 timestamps and a memory mapped array for each column
+    '''
+    meta = load_meta(store_dir)
+    if meta is None:
+        raise FileNotFoundError(f'No raw store in {store_dir}, build it with build_store')
+    store = {'meta': meta, 'time': _map_file(store_dir,'time',np.int64,meta['rows'])}
+    for col in meta['columns']:
+        store[col] = _map_file(store_dir,col,meta['dtypes'][col],meta['rows'])
+    return store
+
+def _map_file(store_dir,name,dtype,rows):
+    if rows == 0:
+        # an empty file can't be mapped
+        return np.empty(0,dtype=dtype)
+    return np.memmap(os.path.join(store_dir,f'{name}.bin'),dtype=dtype,mode='r',shape=(rows,))
+
+def get_row_range(store,start=None,end=None):
+    '''
+    First and end (exclusive) row of the times in [start, end), found by binary search of the timestamps.
+    Parameters
+    ----------
+    store : dict
+        from open_store
+    start, end : str, Timestamp or datetime64
+        None is the first or last row of the store
+    Returns
+    -------
+    first_row, end_row : int
+    '''
+    times = store['time']
+    first_row = 0 if start is None else int(np.searchsorted(times,pd.Timestamp(start).as_unit('ns').value,side='left'))
+    end_row = len(times) if end is None else int(np.searchsorted(times,pd.Timestamp(end).as_unit('ns').value,side='left'))
+    return first_row,max(first_row,end_row)
+
+def read_range(store,start=None,end=None,columns=None):
+    '''
+    Rows of the store with times in [start, end), as views of the mapped files (no copy, read only).
+    Parameters
+    ----------
+    store : dict
+        from open_store
+    start, end : str, Timestamp or datetime64
+        None is the first or last row of the store
+    columns : list
+        columns to return, defaults to all
+    Returns
+    -------
+    rows : dict
+        'time' as datetime64[ns] and an array for each column
+    '''
+    first_row,end_row = get_row_range(store,start,end)
+    if columns is None:
+        columns = store['meta']['columns']
+    rows = {'time': store['time'][first_row:end_row].view('datetime64[ns]')}
+    for col in columns:
+        rows[col] = store[col][first_row:end_row]
+    return rows
+
+def read_range_df(store,start=None,end=None,columns=None):
+    '''
+    read_range as a DataFrame like the cleaned output of prep_data.read_data_of_interest. Pandas copies the values into the frame, use read_range for views.
+    '''
+    rows = read_range(store,start,end,columns)
+    index = pd.DatetimeIndex(rows.pop('time'),name='date_time')
+    return pd.DataFrame(rows,index=index)
+
+def get_year_rows(store,year):
+    '''
+    Rows of a year as stored, see read_range.
+    '''
+    info = store['meta']['years'][str(year)]
+    rows = {'time': store['time'][info['start_row']:info['end_row']].view('datetime64[ns]')}
+    for col in store['meta']['columns']:
+        rows[col] = store[col][info['start_row']:info['end_row']]
+    return rows
+
+def _stored_columns():
+    return [col for col in prep.columns_of_interest if col != 'date_time']
+
+def _stored_dtypes(float_dtype):
+    return {col: float_dtype for col in _stored_columns()}
+
+def _settings_key(range_limits,float_dtype):
+    return ut.hash_inputs({'range_limits': range_limits, 'columns_of_interest': prep.columns_of_interest, 'float_dtype': float_dtype, 'format_version': store_format_version})
+
+def _read_last_time(store_dir,meta):
+    with open(os.path.join(store_dir,'time.bin'),'rb') as f:
+        f.seek((meta['rows'] - 1) * 8)
+        return np.frombuffer(f.read(8),dtype=np.int64)[0]
+
+def _reset_files(store_dir,meta):
+    '''
+    Start an empty store.
+    '''
+    os.makedirs(store_dir,exist_ok=True)
+    for name in ['time'] + meta['columns']:
+        open(os.path.join(store_dir,f'{name}.bin'),'wb').close()
+    save_meta(store_dir,meta)
+
+def _truncate_files(store_dir,meta):
+    '''
+    Cut the files to the rows in the meta data, dropping the rows of an unfinished append or of the years to write again.
+    '''
+    for name,dtype in [('time',np.int64)] + list(meta['dtypes'].items()):
+        path = os.path.join(store_dir,f'{name}.bin')
+        size = meta['rows'] * np.dtype(dtype).itemsize
+        if os.path.getsize(path) != size:
+            os.truncate(path,size)
+
+def load_meta(store_dir):
+    '''
+    Meta data of the store, None if there isn't one or it is from an older format.
+    '''
+    meta_path = os.path.join(store_dir,'meta.json')
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    return meta if meta.get('format_version') == store_format_version else None
+
+def save_meta(store_dir,meta):
+    '''
+    Save the meta data, written to a temporary file first so an interrupted save leaves the old one.
+    '''
+    meta_path = os.path.join(store_dir,'meta.json')
+    with open(meta_path + '.tmp','w') as f:
+        json.dump(meta,f,indent=2)
+    os.replace(meta_path + '.tmp',meta_path)
+
+if __name__ == "__main__":
+    pass
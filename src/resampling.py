@@ -0,0 +1,195 @@
+import hypothesis_test as ht
+
+import pandas as pd
+import numpy as np
+from itertools import combinations
+from concurrent.futures import ProcessPoolExecutor
+
+# largest number of elements in the (resamples x values) index and value matrices built at once
+max_block_elements = 4000000
+# resamples drawn by each task, so the work is split into even batches however many groups and pooled sizes there are
+resample_batch_size = 1000
+
+def resample_group_combos(df, combos=None, column='Green', group_column='month', num_resamples=10000, confidence_level=0.95, seed=None, num_workers=1):
+    '''
+    Bootstrap confidence intervals and permutation p values for the difference in the mean of 'column' between each combination of groups.
+    The bootstrap resamples each group on its own, so the bootstrap means of a group are shared by every pair it is in. The permutation test shuffles the pooled values of each pair, and pairs with the same number of pooled values share the same permutations (see permutation_p_values).
+    Resamples are drawn thousands at a time as index matrices. The resamples of each group and each pooled size are split into batches of resample_batch_size, the tasks given to the workers, and each batch gets its own seed spawned from 'seed', so the results do not depend on 'num_workers'.
+    Parameters
+    ----------
+    df : DataFrame
+        Contains the daily hours for each status
+    combos : list
+        List of tuples containing the group combinations. If None every combination of the groups in 'group_column' is used.
+    column : str ('Green','Yellow','Red')
+        Column name to grab values from
+    group_column : str
+        Column with the group labels, e.g. 'month'
+    num_resamples : int
+        number of bootstrap resamples and of permutations
+    confidence_level : float
+        confidence level of the bootstrap (percentile) intervals
+    seed : int
+        seed for the random number generators
+    num_workers : int
+        number of worker processes to use. If 1 everything runs in this process.
+    Returns
+    -------
+    results : DataFrame
+        Data Frame with columns: ['group_1', 'group_2', 'mean_diff', 'ci_low', 'ci_high', 'perm_p_value'], and rows are each combination of groups.
+    '''
+    sorted_groups = ht.sort_groups(df,column,group_column)
+    if combos is None:
+        combos = list(combinations(sorted_groups,2))
+    groups = list(dict.fromkeys(group for pair in combos for group in pair))
+    values = {group: sorted_groups.get(group,np.empty(0)) for group in groups}
+
+    seed_sequence = np.random.SeedSequence(seed)
+    group_seeds = seed_sequence.spawn(len(groups))
+    # pairs with the same number of pooled values share their permutations
+    pooled_sizes = np.array([len(values[group1]) + len(values[group2]) for group1,group2 in combos])
+    sizes = list(dict.fromkeys(pooled_sizes))
+    size_seeds = seed_sequence.spawn(len(sizes))
+    pairs_of_size = [np.flatnonzero(pooled_sizes == size) for size in sizes]
+    bootstrap_tasks = [(values[group],size,batch_seed) for group,group_seed in zip(groups,group_seeds) for size,batch_seed in zip(*get_batches(num_resamples,group_seed))]
+    permutation_tasks = [([values[combos[i][0]] for i in pairs],[values[combos[i][1]] for i in pairs],size,batch_seed) for pairs,size_seed in zip(pairs_of_size,size_seeds) for size,batch_seed in zip(*get_batches(num_resamples,size_seed))]
+
+    if num_workers is None or num_workers > 1:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            bootstrap_batches = list(executor.map(bootstrap_means_of_group,*zip(*bootstrap_tasks)))
+            permutation_batches = list(executor.map(permutation_counts,*zip(*permutation_tasks)))
+    else:
+        bootstrap_batches = [bootstrap_means_of_group(*task) for task in bootstrap_tasks]
+        permutation_batches = [permutation_counts(*task) for task in permutation_tasks]
+    # every group and pooled size has the same number of batches, in task order
+    num_batches = -(-num_resamples // resample_batch_size)
+    bootstrap_means = [np.concatenate(bootstrap_batches[i:i + num_batches]) for i in range(0,len(bootstrap_batches),num_batches)]
+    p_values = np.empty(len(combos))
+    for j,pairs in enumerate(pairs_of_size):
+        num_extreme = np.sum(permutation_batches[j * num_batches:(j + 1) * num_batches],axis=0)
+        p_values[pairs] = (num_extreme + 1) / (num_resamples + 1)
+
+    bootstrap_means = dict(zip(groups,bootstrap_means))
+    diffs = np.array([bootstrap_means[group1] - bootstrap_means[group2] for group1,group2 in combos]).reshape(len(combos),num_resamples)
+    tail = (1 - confidence_level) / 2
+    ci_low,ci_high = np.quantile(diffs,[tail,1 - tail],axis=1)
+    means = {group: x.mean() if len(x) else np.nan for group,x in values.items()}
+    results = pd.DataFrame({
+            'group_1': [group1 for group1,_ in combos],
+            'group_2': [group2 for _,group2 in combos],
+            'mean_diff': [means[group1] - means[group2] for group1,group2 in combos],
+            'ci_low': ci_low,
+            'ci_high': ci_high,
+            'perm_p_value': p_values
+            })
+    return results
+
+def resample_month_combos(df, combos, column='Green', num_resamples=10000, confidence_level=0.95, seed=None, num_workers=1):
+    '''
+    Bootstrap confidence intervals and permutation p values for the difference in the mean of 'column' between each combination of months, see resample_group_combos.
+    Returns
+    -------
+    results : DataFrame
+        Data Frame with columns: ['month_1', 'month_2', 'mean_diff', 'ci_low', 'ci_high', 'perm_p_value'], and rows are each combination of months.
+    '''
+    results = resample_group_combos(df,combos,column=column,group_column='month',num_resamples=num_resamples,confidence_level=confidence_level,seed=seed,num_workers=num_workers)
+    results.columns = [col.replace('group','month') for col in results.columns]
+    return results
+
+def get_batches(num_resamples,seed):
+    '''
+    Split 'num_resamples' into batches of at most resample_batch_size.
+    Parameters
+    ----------
+    num_resamples : int
+    seed : SeedSequence
+    Returns
+    -------
+    sizes : list of int
+        resamples in each batch
+    seeds : list of SeedSequence
+        seed of each batch, spawned from 'seed'
+    '''
+    sizes = [min(resample_batch_size,num_resamples - start) for start in range(0,num_resamples,resample_batch_size)]
+    return sizes,seed.spawn(len(sizes))
+
+def bootstrap_means_of_group(values,num_resamples,seed):
+    '''
+    Means of 'num_resamples' bootstrap resamples (drawn with replacement) of the values of a group.
+    Parameters
+    ----------
+    values : array
+    num_resamples : int
+    seed : SeedSequence or int
+    Returns
+    -------
+    means : array
+        NaN if the group has no values
+    '''
+    num_values = len(values)
+    if num_values == 0:
+        return np.full(num_resamples,np.nan)
+    rng = np.random.default_rng(seed)
+    means = np.empty(num_resamples)
+    block = max(1,max_block_elements // num_values)
+    for start in range(0,num_resamples,block):
+        stop = min(start + block,num_resamples)
+        indices = rng.integers(0,num_values,size=(stop - start,num_values))
+        means[start:stop] = values[indices].mean(axis=1)
+    return means
+
+def permutation_p_values(x_list,y_list,num_resamples,seed):
+    '''
+    Two-sided permutation test p values for the difference in the means of each pair (x,y), from the counts of permutation_counts.
+    The p value is (number of permuted differences at least as extreme as the observed + 1) / (num_resamples + 1), so it is never 0.
+    Returns
+    -------
+    p_values : array
+        NaN for pairs where either group has no values
+    '''
+    return (permutation_counts(x_list,y_list,num_resamples,seed) + 1) / (num_resamples + 1)
+
+def permutation_counts(x_list,y_list,num_resamples,seed):
+    '''
+    Number of permutations with a difference in the means at least as extreme as the observed one, for each pair (x,y). All pairs must have the same number of pooled values n.
+    Each resample is a random permutation of the positions 0..n-1, and the pooled values at positions below len(x) form the permuted x. The sums of the permuted x of every pair are then a single matrix product of the (resamples x n) membership matrix with the (n x pairs) matrix of pooled values, so the permutations are shared by the pairs and never built value by value.
+    Parameters
+    ----------
+    x_list : list of arrays
+    y_list : list of arrays
+    num_resamples : int
+    seed : SeedSequence or int
+    Returns
+    -------
+    num_extreme : array
+        NaN for pairs where either group has no values
+    '''
+    n1 = np.array([len(x) for x in x_list])
+    n2 = np.array([len(y) for y in y_list])
+    n = n1[0] + n2[0]
+    counts = np.full(len(n1),np.nan)
+    is_valid = (n1 > 0) & (n2 > 0)
+    if not is_valid.any():
+        return counts
+    rng = np.random.default_rng(seed)
+    pooled = np.column_stack([np.concatenate([x,y]) for x,y in zip(x_list,y_list)])
+    totals = pooled.sum(axis=0)
+    observed = np.array([abs(x.mean() - y.mean()) if len(x) and len(y) else np.nan for x,y in zip(x_list,y_list)])
+    # allow for rounding differences between the observed and permuted sums
+    tolerance = observed * 1e-12
+    num_extreme = np.zeros(len(n1),dtype=np.int64)
+    block = max(1,max_block_elements // n)
+    positions = np.arange(n,dtype=np.int32)
+    for start in range(0,num_resamples,block):
+        stop = min(start + block,num_resamples)
+        permuted_positions = rng.permuted(np.broadcast_to(positions,(stop - start,n)),axis=1)
+        for size in np.unique(n1[is_valid]):
+            cols = np.flatnonzero(is_valid & (n1 == size))
+            sums = (permuted_positions < size).astype(float) @ pooled[:,cols]
+            diffs = np.abs(sums / size - (totals[cols] - sums) / (n - size))
+            num_extreme[cols] += np.count_nonzero(diffs >= observed[cols] - tolerance[cols],axis=0)
+    counts[is_valid] = num_extreme[is_valid]
+    return counts
+
+if __name__ == "__main__":
+    pass
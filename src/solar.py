@@ -0,0 +1,111 @@
+import pandas as pd
+import numpy as np
+
+# Haleakala summit, the archive timestamps are local Hawaii Standard Time (no daylight saving)
+latitude = 20.7083
+longitude = -156.2567
+elevation_m = 3055
+utc_offset_hours = -10
+# refraction and the sun's radius put the center 0.833 degrees below the horizon at sunset, lowered further by the summit's height above the horizon
+sunset_altitude = -0.833 - 2.076 * np.sqrt(elevation_m) / 60
+# altitude of the sun's center at the start and end of the night, from sunset to sunrise (use astronomical_twilight_altitude for the dark part of the night only)
+night_sun_altitude = sunset_altitude
+astronomical_twilight_altitude = -18.0
+
+def get_sun_crossings(dates,sun_altitude=night_sun_altitude,latitude=latitude,longitude=longitude,utc_offset_hours=utc_offset_hours):
+    '''
+    Local times at which the sun's center passes 'sun_altitude' in the morning and the evening of each date, from the sunrise equation (NOAA approximation, good to about a minute).
+    Parameters
+    ----------
+    dates : array of datetime64[D]
+        local dates
+    sun_altitude : float
+        degrees, negative below the horizon
+    latitude, longitude : float
+        degrees, longitude positive east
+    utc_offset_hours : float
+    Returns
+    -------
+    morning, evening : arrays of int64
+        local timestamps in nanoseconds
+    '''
+    days = np.asarray(dates,dtype='datetime64[D]').astype(np.int64)
+    # days since J2000 of each date, and the mean solar noon at the longitude
+    n = days - 10957
+    mean_noon = n - longitude / 360
+    mean_anomaly = np.radians((357.5291 + 0.98560028 * mean_noon) % 360)
+    center = 1.9148 * np.sin(mean_anomaly) + 0.02 * np.sin(2 * mean_anomaly) + 0.0003 * np.sin(3 * mean_anomaly)
+    ecliptic_longitude = np.radians((np.degrees(mean_anomaly) + center + 180 + 102.9372) % 360)
+    transit = mean_noon + 0.0053 * np.sin(mean_anomaly) - 0.0069 * np.sin(2 * ecliptic_longitude)
+    declination = np.arcsin(np.sin(ecliptic_longitude) * np.sin(np.radians(23.4397)))
+    phi = np.radians(latitude)
+    cos_hour_angle = (np.sin(np.radians(sun_altitude)) - np.sin(phi) * np.sin(declination)) / (np.cos(phi) * np.cos(declination))
+    # the sun never reaches the altitude (or never leaves it) near the poles, not at Haleakala
+    hour_angle = np.degrees(np.arccos(np.clip(cos_hour_angle,-1,1)))
+    # days since J2000 (noon UTC on 2000-01-01) to local nanoseconds since 1970
+    to_local_ns = lambda j2000_days: ((j2000_days + 10957.5) * 86400 + utc_offset_hours * 3600) * 1e9
+    morning = to_local_ns(transit - hour_angle / 360)
+    evening = to_local_ns(transit + hour_angle / 360)
+    return np.rint(morning).astype(np.int64),np.rint(evening).astype(np.int64)
+
+def get_night_windows(first_date,last_date,sun_altitude=night_sun_altitude):
+    '''
+    Start (evening) and end (next morning) of the night after each date from first_date to last_date.
+    Parameters
+    ----------
+    first_date, last_date : str, date or Timestamp
+    sun_altitude : float
+        see get_sun_crossings
+    Returns
+    -------
+    nights : array of datetime64[D]
+        date of the evening each night starts on
+    starts, ends : arrays of int64
+        local timestamps in nanoseconds
+    '''
+    nights = np.arange(np.datetime64(pd.Timestamp(first_date).date(),'D'),np.datetime64(pd.Timestamp(last_date).date(),'D') + 1)
+    _,starts = get_sun_crossings(nights,sun_altitude)
+    ends,_ = get_sun_crossings(nights + 1,sun_altitude)
+    return nights,starts,ends
+
+def get_night_codes(times,sun_altitude=night_sun_altitude):
+    '''
+    The night each timestamp falls in, found with one binary search of the sorted night boundaries.
+    Parameters
+    ----------
+    times : array of int64
+        local timestamps in nanoseconds, NaT (the minimum int64) is never in a night
+    sun_altitude : float
+        see get_sun_crossings
+    Returns
+    -------
+    night_codes : array of int64
+        index into nights, -1 for daytime
+    nights : array of datetime64[D]
+        date of the evening each night starts on
+    '''
+    is_valid = times != np.iinfo(np.int64).min
+    if not is_valid.any():
+        return np.full(len(times),-1,dtype=np.int64),np.array([],dtype='datetime64[D]')
+    valid_times = times[is_valid].astype('datetime64[ns]').astype('datetime64[D]')
+    # a night that ends on the first day starts the day before
+    nights,starts,ends = get_night_windows(valid_times.min() - 1,valid_times.max(),sun_altitude)
+    boundaries = np.empty(2 * len(nights),dtype=np.int64)
+    boundaries[0::2] = starts
+    boundaries[1::2] = ends
+    # odd positions are inside a night [start, end)
+    positions = np.searchsorted(boundaries,times,side='right')
+    night_codes = np.where(is_valid & (positions % 2 == 1),(positions - 1) // 2,-1)
+    return night_codes,nights
+
+def get_night_hours(nights,sun_altitude=night_sun_altitude):
+    '''
+    Length in hours of the night after each date.
+    '''
+    nights = np.asarray(nights,dtype='datetime64[D]')
+    _,starts = get_sun_crossings(nights,sun_altitude)
+    ends,_ = get_sun_crossings(nights + 1,sun_altitude)
+    return (ends - starts) / 3.6e12
+
+if __name__ == "__main__":
+    pass
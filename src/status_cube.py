@@ -0,0 +1,177 @@
+import pandas as pd
+import numpy as np
+
+statuses = ['Green','Yellow','Red']
+all_months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+# days of the climatology, every calendar day of a leap year so Feb 29 doesn't shift the rest of the year
+num_calendar_days = 366
+
+def build_cube(df,columns=None):
+    '''
+    Precompute the count, sum, mean and sum of squared deviations of the daily hours of each status for every year and month, and for every calendar day over all years (the climatology), in one pass over the daily rows.
+    Analyses and plots then read their means and variances from the cube (see summarize and climatology) instead of filtering or grouping the daily rows again.
+    Parameters
+    ----------
+    df : DataFrame
+        daily hours with the dates as the index, e.g. from prep_data.load_status_hours
+    columns : list
+        columns to aggregate, defaults to the statuses in df
+    Returns
+    -------
+    cube : dict
+        'columns': the aggregated columns
+        'years': array of the years in df
+        'count', 'sum', 'mean', 'm2': arrays of shape (columns, years, 12) of the number of days with a value, their sum, mean and sum of squared deviations from the mean
+        'day_count', 'day_sum', 'day_mean', 'day_m2': the same for each calendar day, shape (columns, 366)
+    '''
+    if columns is None:
+        columns = [col for col in statuses if col in df.columns]
+    dates = pd.DatetimeIndex(df.index)
+    years = np.unique(dates.year)
+    cells = np.searchsorted(years,dates.year) * 12 + dates.month.to_numpy() - 1
+    calendar_days = get_calendar_days(dates)
+    cube = {'columns': list(columns), 'years': years}
+    for prefix,bins,shape in [('',cells,(len(years),12)),('day_',calendar_days,(num_calendar_days,))]:
+        stats = [_group_stats(df[col].to_numpy(dtype=float),bins,int(np.prod(shape))) for col in columns]
+        for i,name in enumerate(['count','sum','mean','m2']):
+            cube[prefix + name] = np.stack([stat[i] for stat in stats]).reshape((len(columns),) + shape)
+    return cube
+
+def check_cube_matches(cube,df):
+    '''
+    Raise a ValueError if the cube wasn't built from the days of df (a cube of the full data passed with a filtered df), comparing the number of days of each column.
+    '''
+    for i,col in enumerate(cube['columns']):
+        if col in df.columns and cube['count'][i].sum() != df[col].notna().sum():
+            raise ValueError(f'The cube has {cube["count"][i].sum()} days of {col} but the data has {df[col].notna().sum()}, build the cube from the same days')
+
+def get_calendar_days(dates):
+    '''
+    Position (0-365) of each date in a leap year, so the same calendar day has the same position every year.
+    '''
+    day_of_year = dates.dayofyear.to_numpy() - 1
+    # days after Feb 28 of common years move up one, into the place they have in a leap year
+    return day_of_year + ((~dates.is_leap_year) & (dates.month > 2))
+
+def _group_stats(values,bins,num_bins):
+    '''
+    Count, sum, mean and sum of squared deviations from the mean of the non NaN values in each bin.
+    '''
+    is_valid = ~np.isnan(values)
+    values,bins = values[is_valid],bins[is_valid]
+    count = np.bincount(bins,minlength=num_bins)
+    sums = np.bincount(bins,weights=values,minlength=num_bins)
+    with np.errstate(invalid='ignore',divide='ignore'):
+        mean = sums / count
+    # deviations from the mean of each bin, more accurate than the sum of squares
+    m2 = np.bincount(bins,weights=(values - mean[bins])**2,minlength=num_bins)
+    return count,sums,mean,m2
+
+def _combine(count,mean,m2,axis):
+    '''
+    Pool the count, mean and sum of squared deviations of groups along 'axis'.
+    '''
+    total = count.sum(axis=axis)
+    with np.errstate(invalid='ignore',divide='ignore'):
+        pooled_mean = np.nansum(count * mean,axis=axis) / total
+        deviations = np.where(count > 0,count * (mean - np.expand_dims(pooled_mean,axis))**2,0)
+    pooled_m2 = np.nansum(m2,axis=axis) + deviations.sum(axis=axis)
+    return total,pooled_mean,pooled_m2
+
+def _get_month_indexes(months):
+    if months is None or months == 'All':
+        return np.arange(12)
+    if isinstance(months,(str,int)):
+        months = [months]
+    return np.array([all_months.index(month) if month in all_months else int(month) - 1 for month in months])
+
+def summarize(cube,column='Green',months=None,years=None,by=None):
+    '''
+    Number of days, sum, mean, variance and standard deviation of the daily hours of a column over some months and years, from the cube. E.g. the mean green hours of Jun-Aug over 2000-2010 is
+        summarize(cube,'Green',months=['Jun','Jul','Aug'],years=range(2000,2011))['mean']
+    Parameters
+    ----------
+    cube : dict
+        from build_cube
+    column : str
+    months : list or str
+        month names (three letter abreviations) or numbers (1-12), defaults to all
+    years : list
+        defaults to all the years in the cube
+    by : str
+        None pools all the selected days, 'month' or 'year' gives a row for each month or year, 'year_month' a row for each year and month
+    Returns
+    -------
+    summary : Series or DataFrame
+        'count', 'sum', 'mean', 'var' (with ddof=1, like pandas) and 'std'
+    '''
+    col = cube['columns'].index(column)
+    month_indexes = _get_month_indexes(months)
+    year_mask = np.ones(len(cube['years']),dtype=bool) if years is None else np.isin(cube['years'],list(years))
+    selected = np.ix_(year_mask,month_indexes)
+    count,mean,m2 = cube['count'][col][selected],cube['mean'][col][selected],cube['m2'][col][selected]
+    if by is None:
+        count,mean,m2 = _combine(count.ravel(),mean.ravel(),m2.ravel(),axis=0)
+        index = None
+    elif by == 'month':
+        count,mean,m2 = _combine(count,mean,m2,axis=0)
+        index = pd.CategoricalIndex([all_months[i] for i in month_indexes],categories=all_months,ordered=True,name='month')
+    elif by == 'year':
+        count,mean,m2 = _combine(count,mean,m2,axis=1)
+        index = pd.Index(cube['years'][year_mask],name='year')
+    elif by == 'year_month':
+        count,mean,m2 = count.ravel(),mean.ravel(),m2.ravel()
+        index = pd.MultiIndex.from_product([cube['years'][year_mask],[all_months[i] for i in month_indexes]],names=['year','month'])
+    else:
+        raise ValueError(f"Unknown by {by}, expected None, 'month', 'year' or 'year_month'")
+    with np.errstate(invalid='ignore',divide='ignore'):
+        var = np.where(count > 1,m2 / (count - 1),np.nan)
+    summary = {'count': count, 'sum': np.where(count > 0,count * mean,0.0), 'mean': mean, 'var': var, 'std': np.sqrt(var)}
+    if index is None:
+        return pd.Series({name: np.asarray(value).item() for name,value in summary.items()})
+    return pd.DataFrame(summary,index=index)
+
+def get_means(cube,columns=None,months=None,years=None,by='month'):
+    '''
+    Mean daily hours of several columns, one column each, e.g. the mean hours of each status for each month.
+    Returns
+    -------
+    means : DataFrame or Series
+    '''
+    if columns is None:
+        columns = cube['columns']
+    means = {column: summarize(cube,column,months=months,years=years,by=by)['mean'] for column in columns}
+    return pd.Series(means) if by is None else pd.DataFrame(means)
+
+def get_year_month_means(cube,column='Green'):
+    '''
+    Mean daily hours of a column with the years as rows and the months as columns, NaN for months without any days.
+    '''
+    col = cube['columns'].index(column)
+    return pd.DataFrame(cube['mean'][col],index=pd.Index(cube['years'],name='year'),columns=pd.Index(all_months,name='month'))
+
+def climatology(cube,column='Green',statistic='mean'):
+    '''
+    A statistic of the daily hours of a column for each calendar day over all years.
+    Parameters
+    ----------
+    cube : dict
+        from build_cube
+    column : str
+    statistic : str
+        'count', 'mean', 'var' or 'std'
+    Returns
+    -------
+    climatology : Series
+        indexed by the month and day ('01-01' to '12-31', including '02-29')
+    '''
+    col = cube['columns'].index(column)
+    count,mean = cube['day_count'][col],cube['day_mean'][col]
+    with np.errstate(invalid='ignore',divide='ignore'):
+        var = np.where(count > 1,cube['day_m2'][col] / (count - 1),np.nan)
+    values = {'count': count, 'mean': mean, 'var': var, 'std': np.sqrt(var)}[statistic]
+    index = pd.date_range('2000-01-01','2000-12-31',freq='D').strftime('%m-%d')
+    return pd.Series(values,index=pd.Index(index,name='day'),name=column)
+
+if __name__ == "__main__":
+    pass
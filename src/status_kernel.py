@@ -0,0 +1,137 @@
+import numpy as np
+
+# number of rows handled at a time, small enough that a block of every column and the temporaries stay in the cpu cache
+block_rows = 32768
+
+# comparisons that make a measurement Red (above/below the red threshold) or not Green (above/below the green threshold)
+above_columns = ['humidity','wind_sust','wind_gust','precipitation']
+below_columns = ['dewpoint_delta','visibility']
+
+def get_limits(thresholds):
+    '''
+    The green and red limit of each threshold column, worked out once instead of calling max/min on the threshold tuples for every comparison.
+    Parameters
+    ----------
+    thresholds : dict
+        column names as keys and (green, red) threshold tuples as values
+    Returns
+    -------
+    limits : dict
+        column names as keys and (green_limit, red_limit) as values. Values above (or below for 'dewpoint_delta' and 'visibility') the green limit aren't Green, above (or below) the red limit are Red.
+    '''
+    limits = {}
+    for col in above_columns:
+        limits[col] = (min(thresholds[col]),max(thresholds[col]))
+    for col in below_columns:
+        limits[col] = (max(thresholds[col]),min(thresholds[col]))
+    return limits
+
+def pack_columns(df,columns,float_dtype=None):
+    '''
+    Copy columns of a DataFrame into one contiguous 2-D array with a row per column, so each column is contiguous and a block of rows of every column is close together in memory.
+    Parameters
+    ----------
+    df : DataFrame
+    columns : list
+    float_dtype : str
+        dtype of the array, defaults to the common dtype of the columns (float64 unless they were all read as float32)
+    Returns
+    -------
+    block : 2-D array
+        shape (len(columns), len(df))
+    '''
+    if float_dtype is None:
+        float_dtype = np.result_type(*[df[col].dtype for col in columns])
+    block = np.empty((len(columns),len(df)),dtype=float_dtype)
+    for i,col in enumerate(columns):
+        block[i] = df[col].to_numpy()
+    return block
+
+def mask_out_of_range(values,low,high,flags=None,other_flags=None):
+    '''
+    Replace the values outside [low, high] with NaN, in place. 'flags' and 'other_flags' are optional boolean buffers of the same length to reuse.
+    '''
+    if flags is None:
+        flags = np.empty(len(values),dtype=bool)
+        other_flags = np.empty(len(values),dtype=bool)
+    np.less(values,low,out=flags)
+    np.greater(values,high,out=other_flags)
+    np.logical_or(flags,other_flags,out=flags)
+    np.copyto(values,np.nan,where=flags)
+
+def clean_and_classify_block(block,columns,range_limits,thresholds,wind_sust,is_raw,skip_columns=(),block_rows=block_rows):
+    '''
+    Mask the out of range measurements, work out the dew point delta and the wind gusts, and give each row its weather status code, going through the rows one cache sized block at a time so every column is read once.
+    The rules are the same as prep_data.remove_unreasonable_measurements, determine_wind_sust_and_gust and get_weather_status_codes: NaN measurements never make a row Red or stop it being Green, and Red takes priority over Green.
+    Parameters
+    ----------
+    block : 2-D array
+        measurements from pack_columns, changed in place
+    columns : list
+        column name of each row of block, must include 'temperature','humidity','wind_speed','visibility','precipitation' and 'dewpoint'
+    range_limits : dict
+        lower and upper limits for each column
+    thresholds : dict
+        (green, red) thresholds for 'humidity','wind_sust','wind_gust','visibility','precipitation' and 'dewpoint_delta'. None only cleans the measurements, without classifying them.
+    wind_sust : array of float
+        sustained wind of each row
+    is_raw : array of bool
+        true for raw (not 10 min average) measurements, the wind speed of these rows is also the gust
+    skip_columns : list
+        columns that are already masked
+    block_rows : int
+    Returns
+    -------
+    dewpoint_delta : array
+        temperature - dewpoint, same dtype as block
+    wind_gust : array
+        wind speed of the raw measurements, NaN for 10 min averages, same dtype as block
+    codes : array of uint8
+        0: Green, 1: Yellow, 2: Red. None if thresholds is None.
+    '''
+    num_rows = block.shape[1]
+    row_of = {col: i for i,col in enumerate(columns)}
+    limits = get_limits(thresholds) if thresholds is not None else None
+    dewpoint_delta = np.empty(num_rows,dtype=block.dtype)
+    wind_gust = np.full(num_rows,np.nan,dtype=block.dtype)
+    codes = np.empty(num_rows,dtype=np.uint8) if thresholds is not None else None
+    # buffers reused for every block
+    flags = np.empty(block_rows,dtype=bool)
+    other_flags = np.empty(block_rows,dtype=bool)
+    is_red = np.empty(block_rows,dtype=bool)
+    is_not_green = np.empty(block_rows,dtype=bool)
+    for start in range(0,num_rows,block_rows):
+        rows = slice(start,min(start + block_rows,num_rows))
+        size = rows.stop - start
+        flag,other_flag,red,not_green = flags[:size],other_flags[:size],is_red[:size],is_not_green[:size]
+        for col,(low,high) in range_limits.items():
+            if col in row_of and col not in skip_columns:
+                mask_out_of_range(block[row_of[col],rows],low,high,flag,other_flag)
+        np.subtract(block[row_of['temperature'],rows],block[row_of['dewpoint'],rows],out=dewpoint_delta[rows])
+        np.copyto(wind_gust[rows],block[row_of['wind_speed'],rows],where=is_raw[rows])
+        if limits is None:
+            continue
+
+        values = {'humidity': block[row_of['humidity'],rows], 'wind_sust': wind_sust[rows], 'wind_gust': wind_gust[rows],
+                  'precipitation': block[row_of['precipitation'],rows], 'dewpoint_delta': dewpoint_delta[rows], 'visibility': block[row_of['visibility'],rows]}
+        red[:] = False
+        not_green[:] = False
+        # comparisons with NaN are false, so missing measurements don't count against a row
+        for col in above_columns:
+            green_limit,red_limit = limits[col]
+            np.greater(values[col],red_limit,out=flag)
+            red |= flag
+            np.greater(values[col],green_limit,out=flag)
+            not_green |= flag
+        for col in below_columns:
+            green_limit,red_limit = limits[col]
+            np.less(values[col],red_limit,out=flag)
+            red |= flag
+            np.less(values[col],green_limit,out=flag)
+            not_green |= flag
+        # every Red row is also not Green, so the sum is 0, 1 or 2
+        np.add(not_green,red,out=codes[rows],dtype=np.uint8)
+    return dewpoint_delta,wind_gust,codes
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,161 @@
+import utilities as ut
+
+import pandas as pd
+import numpy as np
+import os
+import sqlite3
+
+# consolidated store of the daily tables of every prepped year, kept in the prepped data directory
+store_name = 'daily_status.sqlite'
+
+# tables in the store: the status hours of each day, of each hour of the day and of each night, and the daily quality table (see prep_data.get_status_tables)
+tables = ['status_hours','daily_quality','hourly_status','night_status']
+
+month_numbers = {month: i + 1 for i,month in enumerate(["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"])}
+
+def get_month_number(month):
+    '''
+    Number (1-12) of a month given as a name ('Jan', ...) or a number.
+    '''
+    return month_numbers[month] if month in month_numbers else int(month)
+
+def get_store_path(data_dir):
+    '''
+    Path of the store of a prepped data directory.
+    '''
+    return os.path.join(data_dir,store_name)
+
+def connect(store_path):
+    '''
+    Open the store, waiting for another writer to finish instead of failing.
+    '''
+    return sqlite3.connect(store_path,timeout=60)
+
+def write_year(df,year,store_path,table='status_hours'):
+    '''
+    Replace the days of 'year' in a table of the store with the rows of df. The old rows are deleted and the new ones inserted in one transaction, so readers see either the old or the new year, never a partial one.
+    The table is created on the first write with a column for each column of df, plus the date, year and month so range, year and month queries use an index. The year is the one the rows were prepped with, so the night of Dec 31 can be in the tables of both years.
+    Parameters
+    ----------
+    df : DataFrame
+        daily table with the dates as the index, e.g. the status hours of get_and_prep_data
+    year : int or str
+        year the rows were prepped with, a suffix like '_sample' is dropped
+    store_path : str
+    table : str
+        one of 'tables'
+    '''
+    _write_rows(df,year,store_path,table,replace_year=True)
+
+def _write_rows(df,year,store_path,table,replace_year):
+    '''
+    Write the rows of df to a table of the store in one transaction, first deleting the rest of the year if 'replace_year'.
+    '''
+    if table not in tables:
+        raise ValueError(f'Unknown table {table}, expected one of {tables}')
+    dates = pd.DatetimeIndex(df.index)
+    rows = pd.DataFrame({'date': dates.strftime('%Y-%m-%d'), 'year': ut.get_year_number(year), 'month': dates.month})
+    for col in df.columns:
+        # sqlite has no unsigned or small ints, NaN is stored as NULL
+        values = df[col].to_numpy()
+        rows[col] = values.astype(float) if values.dtype.kind == 'f' else values.astype(np.int64)
+    columns = ','.join(f'"{col}"' for col in rows.columns)
+    placeholders = ','.join('?' * len(rows.columns))
+    con = connect(store_path)
+    try:
+        with con:
+            _create_table(con,table,df)
+            if replace_year:
+                con.execute(f'DELETE FROM {table} WHERE year = ?',(ut.get_year_number(year),))
+            con.executemany(f'INSERT OR REPLACE INTO {table} ({columns}) VALUES ({placeholders})',rows.astype(object).where(rows.notna(),None).itertuples(index=False,name=None))
+    finally:
+        con.close()
+
+def update_days(df,year,store_path,table='status_hours'):
+    '''
+    Insert or replace only the days of df in a table of the store, e.g. the days changed by an incremental update, in one transaction.
+    Parameters
+    ----------
+    df : DataFrame
+        rows of the table with the dates as the index
+    year : int or str
+        year the rows were prepped with, a suffix like '_sample' is dropped
+    store_path : str
+    table : str
+        one of 'tables'
+    '''
+    _write_rows(df,year,store_path,table,replace_year=False)
+
+def _create_table(con,table,df):
+    '''
+    Create a table for the columns of df and its indexes if it doesn't exist yet.
+    '''
+    column_types = ','.join(f'"{col}" {"REAL" if df[col].dtype.kind == "f" else "INTEGER"}' for col in df.columns)
+    con.execute(f'CREATE TABLE IF NOT EXISTS {table} (date TEXT NOT NULL, year INTEGER NOT NULL, month INTEGER NOT NULL, {column_types}, PRIMARY KEY (date, year))')
+    con.execute(f'CREATE INDEX IF NOT EXISTS {table}_year ON {table} (year)')
+    con.execute(f'CREATE INDEX IF NOT EXISTS {table}_month ON {table} (month, date)')
+
+def read_days(store_path,table='status_hours',start=None,end=None,months=None,years=None,columns=None):
+    '''
+    Load the days of a table of the store, optionally only a date range, some months or some years. The filters are done by sqlite with the indexes, so only the matching days are read.
+    Parameters
+    ----------
+    store_path : str
+    table : str
+        one of 'tables'
+    start, end : str or Timestamp
+        first and last day to load (inclusive)
+    months : list
+        month numbers (1-12) or names ('Jan', ...) to load
+    years : list
+        years to load
+    columns : list
+        columns to load, defaults to all the columns written
+    Returns
+    -------
+    df : DataFrame
+        dates as the index named 'date', in date order
+    '''
+    conditions = []
+    params = []
+    if start is not None:
+        conditions.append('date >= ?')
+        params.append(pd.Timestamp(start).strftime('%Y-%m-%d'))
+    if end is not None:
+        conditions.append('date <= ?')
+        params.append(pd.Timestamp(end).strftime('%Y-%m-%d'))
+    if months:
+        conditions.append(f'month IN ({",".join("?" * len(months))})')
+        params += [get_month_number(month) for month in months]
+    if years:
+        conditions.append(f'year IN ({",".join("?" * len(years))})')
+        params += [int(year) for year in years]
+    selected = '*' if columns is None else ','.join(['date'] + [f'"{col}"' for col in columns])
+    query = f'SELECT {selected} FROM {table}'
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    con = connect(store_path)
+    try:
+        df = pd.read_sql_query(query + ' ORDER BY date',con,params=params)
+    finally:
+        con.close()
+    df['date'] = pd.to_datetime(df['date'],format='%Y-%m-%d')
+    df.set_index('date',inplace=True)
+    return df.drop(columns=['year','month'],errors='ignore')
+
+def get_store_years(store_path,table='status_hours'):
+    '''
+    Years that have been written to a table of the store, empty if there is no store yet.
+    '''
+    if not os.path.exists(store_path):
+        return []
+    con = connect(store_path)
+    try:
+        if not con.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",(table,)).fetchone():
+            return []
+        return [year for (year,) in con.execute(f'SELECT DISTINCT year FROM {table} ORDER BY year')]
+    finally:
+        con.close()
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,231 @@
+import prep_data as prep
+import raw_cache
+import utilities as ut
+import instrumentation as ins
+
+import requests
+import os
+import io
+import time
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# marks the end of the items in a queue
+end_of_stream = None
+
+def prep_all_available_data_streaming(csv_urls,range_limits,thresholds,save_path='data/',skip_years=None,num_workers=None,cache_dir=None,parsed_cache_dir=None,chunksize=100000,parser='auto',previous_runs_dir=None,queue_size=8,byte_chunk_size=1024*1024,retries=3,backoff=1.0):
+    '''
+    Prepare every year with the download of each year overlapped with its parsing and computing, so the total time is close to the larger of the network and CPU time instead of their sum.
+    Each year is prepared in a worker process, like prep_all_available_data with 'num_workers', so the CPU bound parsing and computing of different years run on different cores. In the worker a fetcher thread streams the raw bytes from the archive onto a bounded queue (saving them to the raw cache as well), while the worker parses them 'chunksize' rows at a time as they arrive and cleans, classifies and aggregates each chunk (prep_data.prep_chunks). The queue holds at most 'queue_size' blocks, so the memory in flight is bounded.
+    Years that are already local (a path or in the raw cache) have no download to overlap, so they are prepared like in prep_all_available_data, with the parser and parsed cache. Years whose inputs match their manifest entry or an earlier run in previous_runs_dir are skipped or copied (see prep_data.find_years_to_prep), the inputs of years that aren't cached yet are checked with a HEAD request. The results are written in year order, so the outputs are the same as prep_all_available_data.
+    Parameters
+    ----------
+    csv_urls : list
+        list of urls (or paths) for the csv files to prepare
+    range_limits : dict
+        lower and upper limits for each columns except the date_time
+    thresholds : dict
+        Must contain the columns above as keys with the values being a tuple with the green and red weather threshold values.
+    save_path : str
+        location to store the tables of each year, the NaN report and the manifest
+    skip_years : set
+        years (int) to skip
+    num_workers : int
+        number of worker processes, also the number of years downloaded at the same time. None uses every cpu.
+    cache_dir : str
+        directory of the raw data cache. Cached years are read from it, other years are saved to it as they stream in.
+    parsed_cache_dir : str
+        directory of the parsed data cache, used for the years that are already local
+    chunksize : int
+        number of rows parsed and computed at a time while a year downloads
+    parser : str
+        csv parser of the years that are already local, see prep_data.read_data_of_interest. Streamed years are parsed in chunks with the 'c' parser.
+    previous_runs_dir : str
+        directory with the 'prepped_data_XXXX' directories of earlier runs to copy unchanged years from
+    queue_size : int
+        number of byte blocks that can wait between the fetcher and the parser
+    byte_chunk_size : int
+        number of bytes read from the network at a time
+    retries : int
+        number of times a dropped download is resumed (with an HTTP Range request)
+    backoff : float
+        seconds to wait before the first retry, doubled for each retry after that
+    Returns
+    -------
+    timings : list of dicts
+        wall time, rows and memory of each stage for each year, also written to 'stage_timings.jsonl' in save_path
+    '''
+    manifest = ut.load_manifest(save_path)
+    urls_to_prep = prep.find_years_to_prep(csv_urls,range_limits,thresholds,save_path,manifest,skip_years=skip_years,cache_dir=cache_dir,previous_runs_dir=previous_runs_dir)
+    timings = []
+    year_options = {'cache_dir': cache_dir, 'parsed_cache_dir': parsed_cache_dir, 'chunksize': chunksize, 'parser': parser, 'queue_size': queue_size, 'byte_chunk_size': byte_chunk_size, 'retries': retries, 'backoff': backoff}
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        futures = [executor.submit(_prep_year,url,range_limits,thresholds,**year_options) for url,_,_ in urls_to_prep]
+        # collect in year order so the outputs are written deterministically
+        for (url,key,inputs),future in zip(urls_to_prep,futures):
+            year = prep.get_year_from_url(url)
+            try:
+                tables,year_timings = future.result()
+            except Exception as e:
+                print(f'Failed to prep data for {year} at: {url} ({e})')
+                continue
+            prep.save_prepped_year(tables,year_timings,year,key,inputs,save_path,manifest)
+            timings += year_timings
+    return timings
+
+def _prep_year(url,range_limits,thresholds,cache_dir=None,parsed_cache_dir=None,chunksize=100000,parser='auto',queue_size=8,byte_chunk_size=1024*1024,retries=3,backoff=1.0):
+    '''
+    Prepare a year in a worker process, streaming it if it has to be downloaded. Nothing is written except the raw cache.
+    Returns
+    -------
+    tables : dict
+        see prep_data.get_status_tables
+    timings : list of dicts
+    '''
+    if not url.startswith(('http://','https://')) or (cache_dir and raw_cache.find_cached_csv(url,cache_dir)):
+        return prep._prep_year_in_worker(url,range_limits,thresholds,cache_dir=cache_dir,parsed_cache_dir=parsed_cache_dir,parser=parser)
+    year = prep.get_year_from_url(url)
+    timings = []
+    stop = threading.Event()
+    byte_queue = queue.Queue(maxsize=queue_size)
+    fetcher = threading.Thread(target=_fetch_bytes,args=(url,byte_queue,stop,cache_dir,byte_chunk_size,retries,backoff,timings),daemon=True)
+    fetcher.start()
+    try:
+        source = io.BufferedReader(QueueReader(byte_queue,stop),buffer_size=byte_chunk_size)
+        chunks = ins.timed_iter(prep.read_data_in_chunks(source,prep.column_names,prep.columns_of_interest,chunksize),timings,year,'parse')
+        tables = prep.prep_chunks(chunks,range_limits,thresholds,year,timings=timings)
+    finally:
+        # let the fetcher stop if the parsing or computing failed
+        stop.set()
+        fetcher.join()
+    return tables,timings
+
+def _fetch_bytes(url,byte_queue,stop,cache_dir,byte_chunk_size,retries,backoff,timings):
+    '''
+    Fetcher thread: put the raw bytes of a year downloaded from the archive on the queue. Downloads are also written to the cache, and resumed with a Range request if the connection drops.
+    '''
+    year = prep.get_year_from_url(url)
+    try:
+        with ins.stage(timings,year,'download') as record:
+            record['rows'] = _stream_download(url,byte_queue,stop,cache_dir,byte_chunk_size,retries,backoff)
+        _put(byte_queue,end_of_stream,stop)
+    except Exception as e:
+        try:
+            _put(byte_queue,e,stop)
+        except RuntimeError:
+            # the parser already stopped
+            pass
+
+def _stream_download(url,byte_queue,stop,cache_dir,byte_chunk_size,retries,backoff):
+    '''
+    Stream a file from the archive onto the queue, with a Session of its own. Returns the number of bytes.
+    '''
+    year = prep.get_year_from_url(url)
+    part_path = os.path.join(cache_dir,f'{year}.csv.stream') if cache_dir else None
+    if cache_dir:
+        os.makedirs(cache_dir,exist_ok=True)
+    part_file = open(part_path,'wb') if part_path else None
+    offset = 0
+    validators = {}
+    session = requests.Session()
+    try:
+        for attempt in range(retries + 1):
+            # continue where the dropped connection stopped
+            headers = get_resume_headers(offset,validators) if offset else {}
+            try:
+                with session.get(url,headers=headers,stream=True,timeout=60) as response:
+                    response.raise_for_status()
+                    if offset and response.status_code != 206:
+                        raise IOError(f'{year} changed on the archive while downloading')
+                    if not offset:
+                        validators = {header: response.headers.get(header) for header in raw_cache.validator_headers}
+                    for block in response.iter_content(chunk_size=byte_chunk_size):
+                        _put(byte_queue,block,stop)
+                        if part_file:
+                            part_file.write(block)
+                        offset += len(block)
+                break
+            except (requests.ConnectionError,requests.Timeout,requests.exceptions.ChunkedEncodingError) as e:
+                if attempt == retries:
+                    raise
+                delay = backoff * 2**attempt
+                print(f'{year} download dropped after {offset} bytes ({e}), resuming in {delay:.1f} s')
+                time.sleep(delay)
+        expected_size = validators.get('Content-Length')
+        if expected_size is not None and offset != int(expected_size):
+            raise IOError(f'{year}: downloaded {offset} of {expected_size} bytes')
+        if part_file:
+            part_file.close()
+            raw_cache.add_file_to_cache(part_path,url,year,cache_dir,validators=validators)
+    finally:
+        session.close()
+        if part_file:
+            part_file.close()
+            if os.path.exists(part_path):
+                os.remove(part_path)
+    return offset
+
+def get_resume_headers(offset,validators):
+    '''
+    Headers to continue a download from byte 'offset'. If-Range has the ETag (or Last-Modified) of the first response, so a server whose file changed sends the whole new file instead of the rest. It is left out if the server sent neither, the 206 status is then the only check.
+    '''
+    headers = {'Range': f'bytes={offset}-'}
+    validator = validators.get('ETag') or validators.get('Last-Modified')
+    if validator:
+        headers['If-Range'] = validator
+    return headers
+
+def _put(q,item,stop):
+    '''
+    Put an item on a bounded queue, waiting while it is full unless the year has been stopped.
+    '''
+    while not stop.is_set():
+        try:
+            q.put(item,timeout=0.1)
+            return
+        except queue.Full:
+            continue
+    raise RuntimeError('stopped')
+
+def _get(q,stop):
+    '''
+    Get an item from a queue, waiting while it is empty unless the year has been stopped.
+    '''
+    while True:
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            if stop.is_set():
+                raise RuntimeError('stopped')
+
+class QueueReader(io.RawIOBase):
+    '''
+    Read only file object over the byte blocks put on a queue by the fetcher, so pandas can parse a file while it is still downloading.
+    '''
+
+    def __init__(self,byte_queue,stop):
+        self.byte_queue = byte_queue
+        self.stop = stop
+        self.buffer = b''
+        self.finished = False
+
+    def readable(self):
+        return True
+
+    def readinto(self,b):
+        while not self.buffer and not self.finished:
+            item = _get(self.byte_queue,self.stop)
+            if item is end_of_stream:
+                self.finished = True
+            elif isinstance(item,Exception):
+                raise item
+            else:
+                self.buffer = memoryview(item)
+        num_bytes = min(len(b),len(self.buffer))
+        b[:num_bytes] = self.buffer[:num_bytes]
+        self.buffer = self.buffer[num_bytes:]
+        return num_bytes
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,145 @@
+import prep_data as prep
+
+import pandas as pd
+import numpy as np
+import os
+
+# the archive switched from 10 minute averages to raw 10 second measurements in November 2006
+regime_seconds = {'10min': 600, '10s': 10}
+# value used by the archive for bad measurements, outside every acceptable range
+out_of_range_value = -6999.0
+
+def generate_synthetic_year(year,regime='10s',days=365,nan_rate=0.01,out_of_range_rate=0.001,seed=None):
+    '''
+    Generate a year of weather data in the exact column layout of the IfA archive files. Humidity, wind and temperature follow smoothed random walks with a daily cycle, so there are runs of green, yellow and red weather similar to the real data.
+    Parameters
+    ----------
+    year : int
+    regime : str ('10min' or '10s')
+        '10min' gives 10 minute averages ('10min' = 1) like the data before 2006, '10s' gives raw measurements roughly every 10 seconds ('10min' = 0) like the data after 2006
+    days : int
+        number of days of data, starting on Jan 1st
+    nan_rate : float
+        fraction of the measurements in each column that are missing
+    out_of_range_rate : float
+        fraction of the measurements in each column replaced with -6999, which is outside every acceptable range
+    seed : int
+        seed for the random number generator
+    Returns
+    -------
+    df : DataFrame
+        columns in the order of prep_data.column_names, 'date_time' as strings
+    '''
+    rng = np.random.default_rng(seed)
+    step = regime_seconds[regime]
+    if regime == '10s':
+        # raw measurements are 10 or 11 seconds apart
+        steps = rng.choice([10,11],size=int(days * 86400 / 10.5))
+        seconds = np.cumsum(steps) - steps[0]
+        seconds = seconds[seconds < days * 86400]
+    else:
+        seconds = np.arange(0,days * 86400,step)
+    num_rows = len(seconds)
+    date_time = np.datetime64(f'{year}-01-01') + seconds.astype('timedelta64[s]')
+    hour_of_day = (seconds % 86400) / 3600
+    daily_cycle = np.sin((hour_of_day - 9) / 24 * 2 * np.pi)
+
+    temperature = 10 + 4 * daily_cycle + _smooth_walk(rng,num_rows,step,scale=2)
+    humidity = np.clip(20 + 15 * _smooth_walk(rng,num_rows,step,scale=2) ** 2 - 5 * daily_cycle,1,100)
+    dewpoint = temperature - np.clip(15 * (1 - humidity / 100) + rng.normal(0,0.5,num_rows),0,None)
+    wind_speed = np.abs(6 + 4 * _smooth_walk(rng,num_rows,step,scale=1) + rng.normal(0,1.5 if regime == '10s' else 0.3,num_rows))
+    visibility = np.where(humidity > 80,rng.uniform(500,40000,num_rows),np.clip(rng.normal(50000,2000,num_rows),0,50000))
+    precipitation = np.where((humidity > 90) & (rng.random(num_rows) < 0.3),rng.exponential(0.02,num_rows),0.0)
+
+    df = pd.DataFrame({
+        'date_time': pd.to_datetime(date_time).strftime(prep.date_time_format),
+        'temperature': temperature,
+        'pressure': 710 + _smooth_walk(rng,num_rows,step,scale=1),
+        'humidity': humidity,
+        'wind_speed': wind_speed,
+        'wind_direction': rng.uniform(0,360,num_rows),
+        'visibility': np.round(visibility),
+        'co2': np.nan,
+        'insolation': np.clip(80 * daily_cycle,0.2,None),
+        'vertical_wind_speed': rng.normal(0,0.05,num_rows),
+        'precipitation': precipitation,
+        '10min': 1.0 if regime == '10min' else 0.0,
+        'dewpoint': dewpoint
+        },columns=prep.column_names)
+
+    measurement_columns = [col for col in prep.column_names if col not in ('date_time','10min','co2')]
+    for col in measurement_columns:
+        values = df[col].to_numpy()
+        values[rng.random(num_rows) < out_of_range_rate] = out_of_range_value
+        values[rng.random(num_rows) < nan_rate] = np.nan
+        df[col] = values
+    return df
+
+def _smooth_walk(rng,num_rows,step,scale=1,hours=6):
+    '''
+    Mean reverting random walk (AR(1)) with a correlation time of 'hours', sampled every 'step' seconds. Values are roughly standard normal times 'scale'.
+    '''
+    phi = np.exp(-step / (hours * 3600))
+    shocks = rng.normal(0,scale * np.sqrt(1 - phi ** 2),num_rows)
+    # AR(1) as a linear filter, done in blocks to avoid overflowing the powers of phi
+    walk = np.empty(num_rows)
+    level = rng.normal(0,scale)
+    block = 2000
+    for start in range(0,num_rows,block):
+        chunk = shocks[start:start + block]
+        powers = phi ** np.arange(1,len(chunk) + 1)
+        walk[start:start + block] = powers * (level + np.cumsum(chunk / powers))
+        level = walk[start + len(chunk) - 1]
+    return walk
+
+def write_archive_csv(df,path):
+    '''
+    Write a DataFrame from generate_synthetic_year in the archive format (no header or index, missing values as \\N).
+    Parameters
+    ----------
+    df : DataFrame
+    path : str
+    '''
+    df.to_csv(path,header=False,index=False,na_rep='\\N',float_format='%.2f')
+
+def generate_synthetic_status_hours(years,seed=None):
+    '''
+    Generate daily Green/Yellow/Red hours, in the format of the status_hours files, for each year in 'years'. Useful for benchmarking the combining and hypothesis testing steps without preparing raw data.
+    Parameters
+    ----------
+    years : list of int
+    seed : int
+    Returns
+    -------
+    status_hours : dict
+        year as keys and DataFrames with 'date' as index and columns ['Green','Yellow','Red'] as values
+    '''
+    rng = np.random.default_rng(seed)
+    status_hours = {}
+    for year in years:
+        dates = pd.date_range(f'{year}-01-01',f'{year}-12-31',freq='D')
+        # wetter winters, drier summers
+        seasonal = 0.5 + 0.3 * np.cos((dates.dayofyear.to_numpy() - 15) / 365 * 2 * np.pi)
+        fractions = rng.dirichlet([1,1,1],len(dates)) * 0.5 + np.column_stack([1 - seasonal,seasonal / 2,seasonal / 2]) * 0.5
+        df = pd.DataFrame(fractions * 24,columns=prep.statuses,index=pd.Index(dates.date,name='date'))
+        status_hours[year] = df
+    return status_hours
+
+def write_synthetic_year_files(save_dir,years,regime='10s',days=365,nan_rate=0.01,out_of_range_rate=0.001,seed=None):
+    '''
+    Write synthetic archive files named '<year>.csv' for each year.
+    Returns
+    -------
+    paths : list
+    '''
+    os.makedirs(save_dir,exist_ok=True)
+    paths = []
+    for i,year in enumerate(years):
+        df = generate_synthetic_year(year,regime=regime,days=days,nan_rate=nan_rate,out_of_range_rate=out_of_range_rate,seed=None if seed is None else seed + i)
+        path = os.path.join(save_dir,f'{year}.csv')
+        write_archive_csv(df,path)
+        paths.append(path)
+    return paths
+
+if __name__ == "__main__":
+    pass
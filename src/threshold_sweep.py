@@ -0,0 +1,131 @@
+import prep_data as prep
+
+import pandas as pd
+import numpy as np
+from itertools import product
+
+# columns compared against the thresholds and whether a high value is bad weather
+threshold_columns = {
+    'humidity': True,
+    'wind_sust': True,
+    'wind_gust': True,
+    'precipitation': True,
+    'dewpoint_delta': False,
+    'visibility': False
+    }
+
+def load_cleaned_data(link,range_limits,parser='auto'):
+    '''
+    Read a year and run the threshold independent part of the pipeline (prep_data.clean_and_classify without the thresholds: range checks, sustained wind and gusts, dew point delta) so it can be classified against many threshold sets.
+    Parameters
+    ----------
+    link : str
+        URL or path of the CSV file to read
+    range_limits : dict
+        lower and upper limits for each columns except the date_time
+    parser : str
+        see prep_data.read_data_of_interest
+    Returns
+    -------
+    df : DataFrame
+    '''
+    df = prep.read_data_of_interest(link,prep.column_names,prep.columns_of_interest,parser=parser)
+    return prep.clean_and_classify(df,range_limits,None)
+
+def threshold_grid(base_thresholds,**variations):
+    '''
+    Build a list of threshold dictionaries from every combination of the given variations.
+    Parameters
+    ----------
+    base_thresholds : dict
+        thresholds used for any column not in 'variations'
+    variations : list of tuples
+        keyword for each column to vary, with a list of ('Green','Red') threshold tuples to try, e.g. humidity=[(70,85),(75,85)]
+    Returns
+    -------
+    thresholds_list : list of dicts
+    '''
+    columns = list(variations)
+    thresholds_list = []
+    for values in product(*variations.values()):
+        thresholds = dict(base_thresholds)
+        thresholds.update(zip(columns,values))
+        thresholds_list.append(thresholds)
+    return thresholds_list
+
+def sweep_thresholds(df,thresholds_list,block_rows=200000):
+    '''
+    Classify every measurement against every threshold set in one pass over the data and calculate the daily hours of each status for each set. Uses the same rules as prep_data.get_weather_status, with the comparisons broadcast over all the threshold sets at once, and weights each row by prep_data.get_row_durations like the pipeline, so a set gives the same hours as prep_data.get_and_prep_data with those thresholds.
+    Parameters
+    ----------
+    df : DataFrame
+        Must contain datetimes as the index and the columns '10min','humidity','wind_sust','wind_gust','precipitation','visibility', and 'dewpoint_delta' (e.g. from load_cleaned_data)
+    thresholds_list : list of dicts
+        Each dict must contain the columns above as keys with the values being a tuple with the green and red weather threshold values.
+    block_rows : int
+        Number of rows classified at a time, limits the size of the (threshold sets x rows) temporary arrays.
+    Returns
+    -------
+    sweep_df : DataFrame
+        Index of ('threshold_set','date') and columns ['Green','Yellow','Red'] with the hours of each status. 'threshold_set' is the position in 'thresholds_list'.
+    '''
+    num_sets = len(thresholds_list)
+    # the limit that makes a value red and the limit it has to be within to be green, for each set
+    red_limits = {}
+    green_limits = {}
+    for col,high_is_bad in threshold_columns.items():
+        limits = np.array([thresholds[col] for thresholds in thresholds_list],dtype=float)
+        if high_is_bad:
+            red_limits[col] = limits.max(axis=1)[:,None]
+            green_limits[col] = limits.min(axis=1)[:,None]
+        else:
+            red_limits[col] = limits.min(axis=1)[:,None]
+            green_limits[col] = limits.max(axis=1)[:,None]
+
+    day_codes,days = prep.get_day_codes(df.index)
+    num_days = len(days)
+    seconds = prep.get_row_durations(df)
+    values = {col: df[col].to_numpy(dtype=float) for col in threshold_columns}
+    set_offsets = (np.arange(num_sets) * num_days)[:,None]
+
+    status_seconds = np.zeros(num_sets * num_days * 3)
+    for start in range(0,len(df),block_rows):
+        stop = start + block_rows
+        is_red = np.zeros((num_sets,len(seconds[start:stop])),dtype=bool)
+        is_green = np.ones_like(is_red)
+        for col,high_is_bad in threshold_columns.items():
+            block = values[col][start:stop][None,:]
+            if high_is_bad:
+                is_red |= block > red_limits[col]
+                is_green &= np.isnan(block) | (block <= green_limits[col])
+            else:
+                is_red |= block < red_limits[col]
+                is_green &= np.isnan(block) | (block >= green_limits[col])
+        # status codes in the order of prep.statuses
+        codes = np.where(is_red,2,np.where(is_green,0,1))
+        bins = (set_offsets + day_codes[start:stop][None,:]) * 3 + codes
+        weights = np.broadcast_to(seconds[start:stop],bins.shape)
+        status_seconds += np.bincount(bins.ravel(),weights=weights.ravel(),minlength=len(status_seconds))
+
+    status_seconds = status_seconds.reshape(num_sets * num_days,3)
+    hours = np.where(status_seconds > 0,status_seconds / 3600,np.nan)
+    index = pd.MultiIndex.from_product([range(num_sets),days],names=['threshold_set','date'])
+    return pd.DataFrame(hours,index=index,columns=prep.statuses)
+
+def summarize_sweep(sweep_df,thresholds_list):
+    '''
+    Mean daily hours of each status for each threshold set, with the thresholds that were used.
+    Parameters
+    ----------
+    sweep_df : DataFrame
+        output of sweep_thresholds
+    thresholds_list : list of dicts
+    Returns
+    -------
+    summary : DataFrame
+    '''
+    summary = prep.normalize_daily_hours_to_24(sweep_df).groupby(level='threshold_set').mean()
+    return pd.DataFrame(thresholds_list).join(summary)
+
+if __name__ == "__main__":
+    pass
@@ -1,5 +1,8 @@
 import os
 import glob
+import json
+import hashlib
+import re
 from shutil import copy2
 
 def save_df_to_csv(df,name,save_path):
@@ -77,7 +80,7 @@ def get_years(data_dir):
     list_of_years : list
         List containing the years 
     '''
-    list_of_years = [file.split('/')[-1].split('_')[-1].split('.')[0] for file in glob.glob(os.path.join(data_dir,'status_hours_*.csv'))]
+    list_of_years = [os.path.basename(file)[len('status_hours_'):-len('.csv')] for file in glob.glob(os.path.join(data_dir,'status_hours_*.csv'))]
     list_of_years = sorted(list_of_years)
     return list_of_years
 
@@ -99,6 +102,21 @@ def record_setup(thresholds,range_limits,years,file=None):
     print(f'Valid Range Limits:\n{range_limits}\n',file=file)
     print(f'Years included: \n{years}\n', file=file)
 
+def get_year_number(year):
+    '''
+    The year as an int from the name of a year's file, which can have a suffix (e.g. '2019_sample' in data/sample_data -> 2019)
+    Parameters
+    ----------
+    year : int or str
+    Return
+    ------
+    year_number : int
+    '''
+    digits = re.match(r'\d+',str(year))
+    if digits is None:
+        raise ValueError(f'No year in {year}')
+    return int(digits.group())
+
 def prepped_data_exists(year,base_path='data/'):
     '''
     Check if prepped data file 'status_hours_XXXX.csv' exists
@@ -113,6 +131,76 @@ def prepped_data_exists(year,base_path='data/'):
     does_exist = os.path.exists(os.path.join(base_path,f'status_hours_{year}.csv'))
     return does_exist
 
+def hash_inputs(inputs):
+    '''
+    Stable hash of a json serializable object (e.g. the inputs used to prep a year)
+    Parameters
+    ----------
+    inputs : dict
+    Return
+    ------
+    key : str
+        sha256 hex digest
+    '''
+    return hashlib.sha256(json.dumps(inputs,sort_keys=True,default=str).encode()).hexdigest()
+
+def load_manifest(data_dir):
+    '''
+    Load the 'manifest.json' recording the inputs used for each prepped year. Returns an empty dict if there isn't one.
+    Parameters
+    ----------
+    data_dir : str
+    Return
+    ------
+    manifest : dict
+        years as keys, with dicts containing the 'key' (hash of the inputs), 'inputs' and 'nan_report' as values
+    '''
+    manifest_path = os.path.join(data_dir,'manifest.json')
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path) as f:
+        return json.load(f)
+
+def save_manifest(data_dir,manifest):
+    '''
+    Save the manifest, written to a temporary file first so an interrupted run can't leave a partial manifest.
+    Parameters
+    ----------
+    data_dir : str
+    manifest : dict
+    '''
+    manifest_path = os.path.join(data_dir,'manifest.json')
+    with open(manifest_path + '.tmp','w') as f:
+        json.dump(manifest,f,indent=2)
+    os.replace(manifest_path + '.tmp',manifest_path)
+
+def find_prepped_year(year,key,parent_dir,base_name,exclude=None):
+    '''
+    Find the most recent numbered directory with prepped data for 'year' made from the same inputs.
+    Parameters
+    ----------
+    year : str
+    key : str
+        hash of the inputs for the year
+    parent_dir : str
+        Directory to look for numbered directories in
+    base_name : str
+        name of the numbered directories (excluding any numbers)
+    exclude : str
+        directory to ignore, e.g. the one for the current run
+    Return
+    ------
+    data_dir : str
+        None if no earlier run matches
+    '''
+    for data_dir in sorted(glob.glob(os.path.join(parent_dir,f'{base_name}_*')),reverse=True):
+        if exclude and os.path.abspath(data_dir) == os.path.abspath(exclude):
+            continue
+        entry = load_manifest(data_dir).get(str(year))
+        if entry and entry['key'] == key and prepped_data_exists(year,base_path=data_dir):
+            return data_dir
+    return None
+
 def copy_txt_files(source,destination):
     '''
     Copies the text files from one directory to another
@@ -0,0 +1,243 @@
+import pandas as pd
+import numpy as np
+
+# sustained wind windows computed by add_wind_columns when none are given
+default_windows = ['2min','5min','10min']
+
+def to_nanoseconds(duration):
+    '''
+    Length of a window or gap ('120s', '2min', a Timedelta, ...) in nanoseconds.
+    '''
+    return pd.Timedelta(duration).value
+
+def get_segment_starts(times,gap_tolerance=None):
+    '''
+    Index of the first row of the segment each row belongs to, a new segment starting after every gap between rows longer than 'gap_tolerance'.
+    Parameters
+    ----------
+    times : array of int64
+        sorted timestamps in nanoseconds
+    gap_tolerance : str or Timedelta
+        if None the rows form a single segment
+    Returns
+    -------
+    segment_starts : array of int64
+    '''
+    if gap_tolerance is None or len(times) == 0:
+        return np.zeros(len(times),dtype=np.int64)
+    is_start = np.empty(len(times),dtype=bool)
+    is_start[0] = True
+    is_start[1:] = np.diff(times) > to_nanoseconds(gap_tolerance)
+    return np.maximum.accumulate(np.where(is_start,np.arange(len(times)),0))
+
+def get_window_starts(times,window,segment_starts):
+    '''
+    Index of the first row in the window (t - window, t] of each row, the same window as pandas' time based rolling, not going back past the start of the row's segment.
+    '''
+    window_starts = np.searchsorted(times,times - to_nanoseconds(window),side='right')
+    return np.maximum(window_starts,segment_starts)
+
+def get_prefix_sums(values):
+    '''
+    Cumulative sums and counts of the non NaN values, with a leading 0, for rolling_mean. Measurements recorded with a fixed number of decimals are summed as integers, so the sums are exact and a mean right at a threshold isn't nudged over it by rounding.
+    Returns
+    -------
+    prefix_sums : tuple
+        (sums, counts, scale), the sums are of the values times scale
+    '''
+    is_valid = ~np.isnan(values)
+    valid_values = np.where(is_valid,values,0.0)
+    scale = get_decimal_scale(valid_values)
+    if scale is None:
+        sums = np.zeros(len(values) + 1)
+        np.cumsum(valid_values,out=sums[1:])
+    else:
+        sums = np.zeros(len(values) + 1,dtype=np.int64)
+        np.cumsum(np.rint(valid_values * scale).astype(np.int64),out=sums[1:])
+    counts = np.zeros(len(values) + 1,dtype=np.int64)
+    np.cumsum(is_valid,out=counts[1:])
+    return sums,counts,scale or 1
+
+def rolling_mean(values,window_starts,prefix_sums=None):
+    '''
+    Mean of the values from window_starts[i] to i (inclusive) for each row i from the cumulative sums, so the cost doesn't depend on the length of the window. NaN values are skipped and windows without any values are NaN.
+    Parameters
+    ----------
+    values : array of float
+    window_starts : array of int64
+    prefix_sums : tuple
+        from get_prefix_sums(values), pass it to reuse it for several windows
+    Returns
+    -------
+    means : array of float
+    '''
+    if prefix_sums is None:
+        prefix_sums = get_prefix_sums(values)
+    sums,counts,scale = prefix_sums
+    window_sums = sums[1:] - sums[window_starts]
+    window_counts = counts[1:] - counts[window_starts]
+    with np.errstate(invalid='ignore',divide='ignore'):
+        return window_sums / (window_counts * scale)
+
+def get_decimal_scale(values,max_decimals=6):
+    '''
+    Power of ten that makes every value a whole number (e.g. 10 for measurements with one decimal), None if there isn't one up to 10**max_decimals or the scaled values could overflow.
+    '''
+    if len(values) == 0:
+        return 1
+    largest = np.abs(values).max()
+    # find the scale on the first values then check it on all of them
+    for decimals in range(max_decimals + 1):
+        scale = 10**decimals
+        if largest * scale * len(values) >= 2**53:
+            return None
+        if _is_whole(values[:10000] * scale):
+            return scale if _is_whole(values * scale) else None
+    return None
+
+def _is_whole(scaled):
+    return np.abs(scaled - np.rint(scaled)).max() < 1e-6
+
+def rolling_max(values,window_starts,sparse_table=None):
+    '''
+    Maximum of the values from window_starts[i] to i (inclusive) for each row i, from a sparse table of the maximum of every power of two run of rows. Each window is covered by two overlapping runs, so any window length costs the same. NaN values are skipped and windows without any values are NaN.
+    Parameters
+    ----------
+    values : array of float
+    window_starts : array of int64
+    sparse_table : 2D array
+        from build_sparse_table(values), pass it to reuse it for several windows
+    Returns
+    -------
+    maxes : array of float
+    '''
+    if len(values) == 0:
+        return np.array([],dtype=float)
+    rows = np.arange(len(values))
+    lengths = rows - window_starts + 1
+    if sparse_table is None:
+        sparse_table = build_sparse_table(values,lengths.max())
+    # largest power of two that fits in each window, looked up from a small table instead of taking the log of every length
+    level_of_length = np.zeros(1 << sparse_table.shape[0],dtype=np.int64)
+    level_of_length[1:] = np.log2(np.arange(1,len(level_of_length))).astype(np.int64)
+    levels = level_of_length[lengths]
+    flat_table = sparse_table.ravel()
+    offsets = levels * sparse_table.shape[1]
+    # the run starting at the window start and the run ending at the row
+    return np.fmax(flat_table[offsets + window_starts],flat_table[offsets + rows - (1 << levels) + 1])
+
+def build_sparse_table(values,max_length=None):
+    '''
+    table[k,i] is the maximum of values[i:i + 2**k], NaN only if they are all NaN (or the run goes past the end).
+    Parameters
+    ----------
+    values : array of float
+    max_length : int
+        longest run that will be queried, defaults to all the values
+    Returns
+    -------
+    table : 2D array
+    '''
+    if max_length is None:
+        max_length = len(values)
+    num_levels = int(max_length).bit_length()
+    table = np.full((num_levels,len(values)),np.nan)
+    table[0] = values
+    for k in range(1,num_levels):
+        half = 1 << (k - 1)
+        np.fmax(table[k - 1,:len(values) - half],table[k - 1,half:],out=table[k,:len(values) - half])
+    return table
+
+def rolling_wind(times,speeds,windows,gap_tolerance=None):
+    '''
+    Sustained wind (rolling mean) and peak gust (rolling max) of raw wind speed measurements for several window lengths in one pass. The cumulative sums, segments and sparse table are shared by all the windows.
+    Parameters
+    ----------
+    times : array of int64
+        sorted timestamps of the measurements in nanoseconds
+    speeds : array of float
+        wind speed of each measurement, may contain NaN
+    windows : list
+        window lengths, e.g. ['2min','5min']
+    gap_tolerance : str or Timedelta
+        the windows don't reach back over gaps between measurements longer than this. If None only the window length limits them.
+    Returns
+    -------
+    results : dict
+        window as keys and (sustained, peak) arrays as values
+    '''
+    times = np.asarray(times,dtype=np.int64)
+    speeds = np.asarray(speeds,dtype=float)
+    if len(times) == 0:
+        return {window: (np.array([]),np.array([])) for window in windows}
+    segment_starts = get_segment_starts(times,gap_tolerance)
+    window_starts = {window: get_window_starts(times,window,segment_starts) for window in windows}
+    row_numbers = np.arange(len(times))
+    max_length = max(int((row_numbers - starts).max()) + 1 for starts in window_starts.values())
+    sparse_table = build_sparse_table(speeds,max_length)
+    prefix_sums = get_prefix_sums(speeds)
+    results = {}
+    for window,starts in window_starts.items():
+        results[window] = (rolling_mean(speeds,starts,prefix_sums),rolling_max(speeds,starts,sparse_table))
+    return results
+
+def add_wind_columns(df,windows=None,gap_tolerance=None):
+    '''
+    Add the sustained wind and peak gust for several window lengths, computed only from the raw (not 10 min average) measurements. Useful to compare definitions of sustained wind.
+    Parameters
+    ----------
+    df : DataFrame
+        sorted datetimes as the index and the columns 'wind_speed' and '10min'
+    windows : list
+        window lengths, defaults to default_windows
+    gap_tolerance : str or Timedelta
+        see rolling_wind
+    Returns
+    -------
+    df : DataFrame
+        Additional columns 'wind_sust_<window>' and 'wind_peak_<window>' for each window. 10 min average rows use their 'wind_speed' as the sustained wind and have NaN peaks.
+    '''
+    if windows is None:
+        windows = default_windows
+    is_raw = (df['10min'] != 1).to_numpy()
+    speeds = df['wind_speed'].to_numpy(dtype=float)
+    times = df.index.as_unit('ns').asi8
+    results = rolling_wind(times[is_raw],speeds[is_raw],windows,gap_tolerance)
+    for window,(sustained,peak) in results.items():
+        sustained_column = speeds.copy()
+        sustained_column[is_raw] = sustained
+        peak_column = np.full(len(df),np.nan)
+        peak_column[is_raw] = peak
+        df[f'wind_sust_{window}'] = sustained_column
+        df[f'wind_peak_{window}'] = peak_column
+    return df
+
+def sustained_wind(df,window,gap_tolerance=None):
+    '''
+    Sustained wind of each row: the 'wind_speed' of 10 min average rows and the rolling mean over 'window' of the raw measurements for the others.
+    Parameters
+    ----------
+    df : DataFrame
+        sorted datetimes as the index and the columns 'wind_speed' and '10min'
+    window : str or Timedelta
+    gap_tolerance : str or Timedelta
+        see rolling_wind
+    Returns
+    -------
+    wind_sust : array of float
+    '''
+    return sustained_wind_of_arrays(df.index.as_unit('ns').asi8,df['wind_speed'].to_numpy(dtype=float),(df['10min'] != 1).to_numpy(),window,gap_tolerance)
+
+def sustained_wind_of_arrays(times,speeds,is_raw,window,gap_tolerance=None):
+    '''
+    sustained_wind for the columns as arrays: int64 nanosecond timestamps, float wind speeds and whether each row is a raw measurement.
+    '''
+    wind_sust = np.array(speeds,dtype=float)
+    if is_raw.any():
+        raw_times = times[is_raw]
+        segment_starts = get_segment_starts(raw_times,gap_tolerance)
+        wind_sust[is_raw] = rolling_mean(wind_sust[is_raw],get_window_starts(raw_times,window,segment_starts))
+    return wind_sust
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,36 @@
+import os
+import sys
+import shutil
+
+import pytest
+
+# the modules in src import each other as top level modules (e.g. 'import utilities as ut')
+src_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),'src')
+sys.path.insert(0,src_dir)
+
+import config as cfg
+
+sample_dir = os.path.join(os.path.dirname(src_dir),'data','sample_data')
+
+@pytest.fixture
+def settings():
+    '''
+    Range limits and thresholds of the default config.
+    '''
+    config = cfg.load_config()
+    return config['acceptable_ranges'],config['thresholds']
+
+@pytest.fixture
+def sample_files():
+    return [os.path.join(sample_dir,'1994.csv'),os.path.join(sample_dir,'2019_sample.csv')]
+
+@pytest.fixture
+def archive_dir(tmp_path,sample_files):
+    '''
+    Directory to serve as the archive (see local_archive_server), with the sample years saved as '<year>.csv'.
+    '''
+    directory = tmp_path / 'archive'
+    os.makedirs(directory)
+    shutil.copy(sample_files[0],directory / '1994.csv')
+    shutil.copy(sample_files[1],directory / '2019.csv')
+    return directory
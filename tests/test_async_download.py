@@ -0,0 +1,53 @@
+import async_download
+import local_archive_server as las
+
+import os
+import gzip
+import json
+import pytest
+
+def read_cached(path):
+    with gzip.open(path,'rb') as f:
+        return f.read()
+
+def test_resumes_dropped_downloads_with_if_range(tmp_path,archive_dir):
+    request_log = []
+    server,base_url = las.start_server(str(archive_dir),fail_after_bytes=100000,num_failures=2,request_log=request_log)
+    try:
+        cached_paths = async_download.fetch_years([base_url + '2019.csv'],cache_dir=str(tmp_path / 'cache'),retries=3,backoff=0)
+    finally:
+        server.shutdown()
+    assert read_cached(cached_paths[base_url + '2019.csv']) == (archive_dir / '2019.csv').read_bytes()
+    gets = [request for request in request_log if request['method'] == 'GET']
+    assert [request['Range'] for request in gets] == [None,'bytes=100000-','bytes=200000-']
+    # the resumed requests are only for the same version of the file
+    assert gets[0]['If-Range'] is None and gets[1]['If-Range'] and gets[1]['If-Range'] == gets[2]['If-Range']
+
+def test_changed_file_is_downloaded_again(tmp_path,archive_dir):
+    part_path = str(tmp_path / '2019.csv.part')
+    with open(part_path,'wb') as f:
+        f.write(b'part of an older version')
+    with open(part_path + '.json','w') as f:
+        json.dump({'ETag': '"old"', 'Last-Modified': None, 'Content-Length': '100'},f)
+    request_log = []
+    server,base_url = las.start_server(str(archive_dir),request_log=request_log)
+    try:
+        with async_download.make_session() as session:
+            async_download.download_with_resume(session,base_url + '2019.csv',part_path)
+    finally:
+        server.shutdown()
+    assert request_log[0]['If-Range'] == '"old"'
+    with open(part_path,'rb') as f:
+        assert f.read() == (archive_dir / '2019.csv').read_bytes()
+
+def test_concurrent_downloads_use_their_own_sessions(tmp_path,archive_dir):
+    server,base_url = las.start_server(str(archive_dir))
+    urls = [base_url + '1994.csv',base_url + '2019.csv']
+    try:
+        cached_paths = async_download.fetch_years(urls,cache_dir=str(tmp_path / 'cache'),max_concurrency=2)
+        # cached files that haven't changed aren't downloaded again
+        assert async_download.fetch_years(urls,cache_dir=str(tmp_path / 'cache'),max_concurrency=2) == cached_paths
+    finally:
+        server.shutdown()
+    for url in urls:
+        assert read_cached(cached_paths[url]) == (archive_dir / url.split('/')[-1]).read_bytes()
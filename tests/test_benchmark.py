@@ -0,0 +1,39 @@
+import benchmark_pipeline as bp
+import prep_data as prep
+import synthetic_data as syn
+
+import json
+import pytest
+
+@pytest.mark.parametrize('regime,ten_min',[('10s',0),('10min',1)])
+def test_synthetic_year_reads_like_the_archive(tmp_path,regime,ten_min):
+    path = syn.write_synthetic_year_files(tmp_path,[2010],regime=regime,days=2,seed=1)[0]
+    with open(path) as f:
+        first_line = f.readline().rstrip('\n').split(',')
+    assert len(first_line) == len(prep.column_names)
+    df = prep.read_data_of_interest(path,prep.column_names,prep.columns_of_interest,parser='c')
+    assert list(df.columns) == prep.columns_of_interest[1:]
+    assert df.index.is_monotonic_increasing and df.index[0].year == 2010
+    assert (df['10min'] == ten_min).all()
+    # missing values are written as \N and read as NaN
+    assert df['humidity'].isna().any()
+
+def test_run_benchmarks_at_a_tiny_size(tmp_path):
+    results = bp.run_benchmarks(sizes={'10min': [2], '10s': [1]},num_years=[2],repeats=1)
+    records = results['results']
+    assert {record['regime'] for record in records} >= {'10min','10s'}
+    assert all(record['seconds'] >= 0 for record in records)
+    path = bp.save_results(results,str(tmp_path))
+    assert len(bp.load_results(path)) == len(records)
+
+def write_results(path,seconds):
+    with open(path,'w') as f:
+        json.dump({'results': [{'function': name, 'regime': '10s', 'days': 1, 'seconds': value} for name,value in seconds.items()]},f)
+
+def test_compare_results_flags_regressions(tmp_path):
+    baseline,current = str(tmp_path / 'baseline.json'),str(tmp_path / 'current.json')
+    write_results(baseline,{'parse': 1.0, 'aggregate': 1.0, 'write': 1.0})
+    write_results(current,{'parse': 1.1, 'aggregate': 1.5, 'write': 0.5})
+    comparison = bp.compare_results(baseline,current,tolerance=1.2).set_index('function')
+    assert comparison['is_regression'].to_dict() == {'parse': False, 'aggregate': True, 'write': False}
+    assert bp.compare_results(baseline,current,tolerance=1.05).set_index('function')['is_regression']['parse']
@@ -0,0 +1,74 @@
+import prep_data as prep
+import synthetic_data as syn
+
+import numpy as np
+import pandas as pd
+import pytest
+
+@pytest.fixture(params=['10s','10min'])
+def synthetic_year(request):
+    df = syn.generate_synthetic_year(2008,regime=request.param,days=20,seed=11)
+    return prep._format_raw_df(df,prep.column_names,prep.columns_of_interest)
+
+def classify_separately(df,range_limits,thresholds):
+    '''
+    The pipeline before the fused kernel: range checks, sustained wind and gusts, dew point delta and status, one pass each.
+    '''
+    df_new = prep.remove_unreasonable_measurements(df,range_limits)
+    df_new['10min'] = df['10min']
+    df_new = prep.determine_wind_sust_and_gust(df_new)
+    df_new['dewpoint_delta'] = df_new['temperature'] - df_new['dewpoint']
+    df_new['status'] = prep.get_weather_status(df_new,thresholds)
+    return df_new
+
+def baseline_status(df,thresholds):
+    '''
+    The status strings as np.select gave them before the integer codes.
+    '''
+    status_conditions = [(
+        (df['humidity'] > max(thresholds['humidity'])) |
+        (df['wind_sust'] > max(thresholds['wind_sust'])) |
+        (df['wind_gust'] > max(thresholds['wind_gust'])) |
+        (df['precipitation'] > max(thresholds['precipitation'])) |
+        (df['dewpoint_delta'] < min(thresholds['dewpoint_delta'])) |
+        (df['visibility'] < min(thresholds['visibility']))
+        ),(
+        ((df['humidity'].isna()) | (df['humidity'] <= min(thresholds['humidity']))) &
+        ((df['wind_sust'].isna()) | (df['wind_sust'] <= min(thresholds['wind_sust']))) &
+        ((df['wind_gust'].isna()) | (df['wind_gust'] <= min(thresholds['wind_gust']))) &
+        ((df['precipitation'].isna()) | (df['precipitation'] <= min(thresholds['precipitation']))) &
+        ((df['dewpoint_delta'].isna()) | (df['dewpoint_delta'] >= max(thresholds['dewpoint_delta']))) &
+        ((df['visibility'].isna()) | (df['visibility'] >= max(thresholds['visibility'])))
+        )]
+    return np.select(status_conditions,['Red','Green'],default='Yellow')
+
+def test_status_codes_match_baseline(synthetic_year,settings):
+    range_limits,thresholds = settings
+    df = classify_separately(synthetic_year,range_limits,thresholds)
+    status = np.asarray(prep.get_weather_status(df,thresholds))
+    assert (status == baseline_status(df,thresholds)).all()
+    assert set(status) == set(prep.statuses)
+
+def test_status_seconds_match_groupby(synthetic_year,settings):
+    range_limits,thresholds = settings
+    df = classify_separately(synthetic_year,range_limits,thresholds)
+    durations = prep.get_row_durations(df)
+    expected = pd.DataFrame({'seconds': durations, 'date': df.index.date, 'status': np.asarray(df['status'])}).groupby(['date','status'])['seconds'].sum().unstack()
+    expected = expected.reindex(columns=prep.statuses).rename_axis(columns=None)
+    result = prep.get_status_seconds_by_day(df,durations)
+    pd.testing.assert_frame_equal(result,expected,check_index_type=False)
+
+def test_clean_and_classify_matches_separate_steps(synthetic_year,settings,sample_files):
+    range_limits,thresholds = settings
+    for df in [synthetic_year] + [prep.read_data_of_interest(link,prep.column_names,prep.columns_of_interest) for link in sample_files]:
+        expected = classify_separately(df,range_limits,thresholds)
+        result = prep.clean_and_classify(df,range_limits,thresholds)
+        pd.testing.assert_frame_equal(result[expected.columns],expected)
+
+def test_clean_and_classify_in_chunks(synthetic_year,settings):
+    range_limits,thresholds = settings
+    expected = prep.clean_and_classify(synthetic_year,range_limits,thresholds)
+    split = len(synthetic_year) // 3
+    first = prep.clean_and_classify(synthetic_year.iloc[:split],range_limits,thresholds)
+    second = prep.clean_and_classify(synthetic_year.iloc[split:],range_limits,thresholds,previous_rows=first[['wind_speed','10min']])
+    pd.testing.assert_frame_equal(pd.concat([first,second]),expected)
@@ -0,0 +1,163 @@
+import cli
+import prep_data as prep
+import async_download
+import incremental
+import raw_store
+import myplots
+
+import os
+import json
+import pandas as pd
+import pytest
+
+links = ['http://archive/1993.csv','http://archive/2018.csv','http://archive/2019.csv']
+
+def record(calls,result=None):
+    '''
+    Stand in for a heavy function, appending its arguments to 'calls'.
+    '''
+    def func(*args,**kwargs):
+        calls.append((args,kwargs))
+        return result
+    return func
+
+@pytest.fixture
+def config_path(tmp_path):
+    path = tmp_path / 'config.json'
+    with open(path,'w') as f:
+        json.dump({'data_dir': str(tmp_path / 'data'), 'results_dir': str(tmp_path / 'results'), 'raw_cache_dir': None, 'raw_store_dir': str(tmp_path / 'raw_store')},f)
+    return str(path)
+
+@pytest.fixture
+def archive_links(monkeypatch):
+    monkeypatch.setattr(prep,'get_csv_file_links',lambda base_url: links)
+
+@pytest.fixture
+def prepped_dir(tmp_path,settings,sample_files):
+    range_limits,thresholds = settings
+    data_dir = tmp_path / 'prepped_data_0001'
+    os.makedirs(data_dir)
+    prep.prep_all_available_data(sample_files,range_limits,thresholds,save_path=str(data_dir))
+    return data_dir
+
+def test_test_command_only_pairs_the_selected_months(tmp_path,prepped_dir):
+    config_path = tmp_path / 'config.json'
+    with open(config_path,'w') as f:
+        json.dump({'num_resamples': 0, 'data_dir': str(tmp_path), 'results_dir': str(tmp_path / 'results')},f)
+    results_dir = tmp_path / 'results_0001'
+    cli.main(['--config',str(config_path),'test','--data-dir',str(prepped_dir),'--results-dir',str(results_dir),'--months','Oct','Nov','Dec'])
+    results = pd.read_csv(results_dir / 'hyp_test_results.csv')
+    assert len(results) == 3
+    assert not results['p_value'].isna().any()
+    with open(results_dir / 'run_info.txt') as f:
+        run_info = f.read()
+    assert '3 combinations' in run_info
+    assert f'{0.05 / 3:.5f}' in run_info
+
+@pytest.mark.parametrize('argv,expected',[
+    (['status','--json'],{'command': 'status', 'json': True, 'data_dir': None}),
+    (['fetch','--years','2018','2019'],{'command': 'fetch', 'years': [2018,2019]}),
+    (['prep','--streaming'],{'command': 'prep', 'streaming': True, 'years': None}),
+    (['update','--year','2019','--follow','30','--flush'],{'command': 'update', 'year': 2019, 'follow': 30.0, 'flush': True, 'file': None}),
+    (['raw-store','--float-dtype','float32'],{'command': 'raw-store', 'float_dtype': 'float32', 'years': None}),
+    (['combine','--start','2019-01-01','--months','Jan','2'],{'command': 'combine', 'start': '2019-01-01', 'end': None, 'months': ['Jan','2']}),
+    (['test','--column','Red','--years','2019'],{'command': 'test', 'column': 'Red', 'years': [2019]}),
+    (['--workers','2','plot','--preview'],{'command': 'plot', 'preview': True, 'workers': 2}),
+    ])
+def test_parse_args(argv,expected):
+    args = vars(cli.parse_args(argv))
+    assert {key: args[key] for key in expected} == expected
+
+@pytest.mark.parametrize('argv',[[],['unknown'],['raw-store','--float-dtype','float16'],['test','--column','Blue']])
+def test_parse_args_rejects(argv):
+    with pytest.raises(SystemExit):
+        cli.parse_args(argv)
+
+def test_main_dispatches_with_the_config(monkeypatch,config_path):
+    calls = []
+    for name in cli.commands:
+        monkeypatch.setitem(cli.commands,name,record(calls))
+    cli.main(['--config',config_path,'--workers','3','raw-store'])
+    (args,config), = [call[0] for call in calls]
+    assert args.command == 'raw-store'
+    assert config['num_workers'] == 3
+    assert config['raw_store_dir'].endswith('raw_store')
+
+def test_status(capsys,config_path,prepped_dir):
+    cli.main(['--config',config_path,'status','--data-dir',str(prepped_dir),'--json'])
+    output = capsys.readouterr().out
+    assert f'Data directory: {prepped_dir}' in output
+    assert json.loads(output.splitlines()[-1])['years'] == ['1994','2019_sample']
+    assert 'raw_cache_dir: disabled' in output
+
+def test_no_prepped_data(config_path):
+    with pytest.raises(SystemExit,match='No prepped data'):
+        cli.main(['--config',config_path,'status'])
+
+def test_fetch_exits_when_files_are_missing(monkeypatch,config_path,archive_links):
+    calls = []
+    monkeypatch.setattr(async_download,'fetch_years',record(calls,result=['2018.csv']))
+    with pytest.raises(SystemExit):
+        cli.main(['--config',config_path,'fetch','--years','2018','2019'])
+    assert calls[0][0][0] == links[1:]
+
+def test_prep_skips_years_and_saves_the_config(monkeypatch,tmp_path,config_path,archive_links):
+    calls = []
+    monkeypatch.setattr(prep,'prep_all_available_data',record(calls,result={}))
+    cli.main(['--config',config_path,'--workers','2','prep'])
+    (csv_urls,range_limits,thresholds),kwargs = calls[0]
+    # 1993 is in the default skip_years
+    assert csv_urls == links[1:]
+    assert kwargs['num_workers'] == 2
+    data_dir = kwargs['save_path']
+    assert os.path.dirname(data_dir) == str(tmp_path / 'data')
+    assert os.path.exists(os.path.join(data_dir,'config.json'))
+
+def test_prep_streaming(monkeypatch,tmp_path,config_path,archive_links):
+    import streaming_pipeline
+    calls = []
+    monkeypatch.setattr(streaming_pipeline,'prep_all_available_data_streaming',record(calls,result={}))
+    monkeypatch.setattr(prep,'prep_all_available_data',record([],result={}))
+    cli.main(['--config',config_path,'prep','--streaming','--years','2019','--data-dir',str(tmp_path / 'prepped')])
+    assert calls[0][0][0] == links[2:]
+    assert calls[0][1]['save_path'] == str(tmp_path / 'prepped')
+
+def test_update(monkeypatch,config_path,prepped_dir,archive_links):
+    calls,follow_calls = [],[]
+    monkeypatch.setattr(incremental,'update_year',record(calls,result=pd.DataFrame()))
+    monkeypatch.setattr(incremental,'follow_year',record(follow_calls))
+    cli.main(['--config',config_path,'update','--data-dir',str(prepped_dir),'--year','2018','--flush'])
+    assert calls[0][0][0] == links[1]
+    assert calls[0][1]['flush'] and calls[0][1]['save_path'] == str(prepped_dir)
+    cli.main(['--config',config_path,'update','--data-dir',str(prepped_dir),'--file','growing.csv','--follow','5'])
+    assert follow_calls[0][0][0] == 'growing.csv'
+    assert follow_calls[0][1]['interval'] == 5
+    assert len(calls) == 1
+    with pytest.raises(SystemExit,match='No archive file'):
+        cli.main(['--config',config_path,'update','--data-dir',str(prepped_dir),'--year','1990'])
+
+def test_raw_store(monkeypatch,config_path,archive_links):
+    calls = []
+    monkeypatch.setattr(raw_store,'build_store',record(calls,result={'rows': 10, 'years': ['2018']}))
+    cli.main(['--config',config_path,'raw-store','--years','2018','--float-dtype','float32'])
+    assert calls[0][0][0] == [links[1]]
+    assert calls[0][1]['float_dtype'] == 'float32'
+
+def test_combine_passes_the_selection(monkeypatch,config_path,prepped_dir):
+    calls = []
+    days = pd.DataFrame({'Green': [1.0]},index=pd.Index(pd.to_datetime(['2019-01-01']),name='date'))
+    monkeypatch.setattr(prep,'load_status_hours',record(calls,result=days))
+    cli.main(['--config',config_path,'combine','--data-dir',str(prepped_dir),'--start','2019-01-01','--months','Jan','--years','2019'])
+    assert calls[0][0] == (str(prepped_dir),)
+    assert {key: calls[0][1][key] for key in ['start','end','months','years']} == {'start': '2019-01-01', 'end': None, 'months': ['Jan'], 'years': [2019]}
+    assert os.path.exists(prepped_dir / 'combined_status_hours.csv')
+
+def test_plot(monkeypatch,tmp_path,config_path,prepped_dir):
+    calls = []
+    monkeypatch.setattr(myplots,'render_figures',record(calls))
+    results_dir = tmp_path / 'results_0001'
+    cli.main(['--config',config_path,'--workers','1','plot','--data-dir',str(prepped_dir),'--results-dir',str(results_dir),'--preview','--years','2019'])
+    (df,image_dir),kwargs = calls[0]
+    assert image_dir == os.path.join(str(results_dir),'images') and os.path.isdir(image_dir)
+    assert kwargs == {'preview': True, 'num_workers': 1}
+    assert (df['year'] == 2019).all()
@@ -0,0 +1,42 @@
+import compact
+import prep_data as prep
+import synthetic_data as syn
+
+import re
+import numpy as np
+import pandas as pd
+import pytest
+
+@pytest.fixture
+def links(tmp_path,sample_files):
+    return syn.write_synthetic_year_files(tmp_path,[2008],days=3,seed=9) + sample_files
+
+def read_prepped(link,range_limits,thresholds,float_dtype):
+    df = prep.read_data_of_interest(link,prep.column_names,prep.columns_of_interest,parser='c',float_dtype=float_dtype)
+    return prep.clean_and_classify(df,range_limits,thresholds)
+
+def test_expand_frame_round_trip(settings,links):
+    range_limits,thresholds = settings
+    for link in links:
+        prepped = read_prepped(link,range_limits,thresholds,'float32')
+        compact_df = compact.compact_frame(prepped)
+        expanded = compact.expand_frame(compact_df)
+        # the float32 values and whole second timestamps come back exactly
+        pd.testing.assert_frame_equal(expanded,prepped.astype({col: np.float64 for col in prepped.columns if prepped[col].dtype.kind == 'f'}),check_freq=False)
+        pd.testing.assert_frame_equal(compact.compact_frame(expanded),compact_df)
+
+def test_status_hours_within_tolerance(settings,links,capsys):
+    range_limits,thresholds = settings
+    for link in links:
+        compact_df = compact.load_compact_year(link,range_limits,thresholds,parser='c')
+        full = read_prepped(link,range_limits,thresholds,'float64')
+        # the bytes per row reported at full precision are those of the float64 frame
+        full_precision_bytes,compact_bytes = map(float,re.findall(r'([\d.]+) bytes per row at full precision, ([\d.]+) compact',capsys.readouterr().out)[0])
+        assert full_precision_bytes == pytest.approx(compact.bytes_per_row(full),abs=0.05)
+        assert compact_bytes < full_precision_bytes / 2
+        expected = prep.finish_status_tables(prep.get_status_seconds(full))
+        result = compact.get_status_hours(compact_df)
+        for name in ['status_hours','hourly_status','night_status']:
+            assert result[name].index.equals(expected[name].index)
+            difference = (result[name].fillna(0) - expected[name].fillna(0)).abs().to_numpy()
+            assert difference.max() <= compact.status_hours_tolerance
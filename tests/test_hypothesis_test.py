@@ -0,0 +1,51 @@
+import hypothesis_test as ht
+import status_cube as sc
+import myplots
+import prep_data as prep
+
+import numpy as np
+import pandas as pd
+import pytest
+import scipy.stats as stats
+
+@pytest.fixture
+def daily_hours():
+    rng = np.random.default_rng(0)
+    dates = pd.date_range('2000-01-01','2003-12-31',freq='D',name='date')
+    green = rng.uniform(0,24,len(dates))
+    yellow = rng.uniform(0,24 - green)
+    return pd.DataFrame({'Green': green, 'Yellow': yellow, 'Red': 24 - green - yellow},index=dates)
+
+def test_monthly_means_from_df_and_cube_match_pandas(daily_hours):
+    expected = daily_hours.groupby(daily_hours.index.month)['Green'].mean()
+    for data in [daily_hours,sc.build_cube(daily_hours)]:
+        means = ht.get_monthly_means(data)
+        assert list(means) == sc.all_months
+        assert np.allclose([means[month] for month in sc.all_months],expected.values)
+
+def test_monthly_means_leave_out_months_without_days(daily_hours):
+    selected = daily_hours[daily_hours.index.month.isin([1,2,3])]
+    assert sorted(ht.get_monthly_means(selected)) == ['Feb','Jan','Mar']
+
+def test_plots_reject_a_cube_of_other_days(daily_hours):
+    selected = daily_hours[daily_hours.index.year == 2001].copy()
+    prep.add_month_year_columns(selected)
+    with pytest.raises(ValueError):
+        myplots.compute_plot_aggregates(selected,cube=sc.build_cube(daily_hours))
+    myplots.compute_plot_aggregates(selected,cube=sc.build_cube(selected))
+
+@pytest.mark.parametrize('sizes,ties',[((5,7),False),((6,40),False),((60,80),False),((60,80),True),((5,7),True)])
+def test_batched_mann_whitney_matches_scipy(sizes,ties):
+    rng = np.random.default_rng(sum(sizes))
+    groups = {}
+    for i,size in enumerate(sizes + (30,)):
+        # rounded values give many ties, like daily hours read back from a csv
+        values = rng.normal(i,1,size)
+        groups[f'g{i}'] = np.round(values) if ties else values
+    df = pd.DataFrame({'Green': np.concatenate(list(groups.values())), 'month': np.repeat(list(groups),[len(x) for x in groups.values()])})
+    combos = [('g0','g1'),('g1','g0'),('g0','g2'),('g1','g2')]
+    results = ht.mwu_test_group_combos(df,combos)
+    for (group1,group2),u,p in zip(combos,results['u_statistic'],results['p_value']):
+        expected = stats.mannwhitneyu(groups[group1],groups[group2])
+        assert u == pytest.approx(expected.statistic,rel=1e-12)
+        assert p == pytest.approx(expected.pvalue,rel=1e-9)
@@ -0,0 +1,84 @@
+import incremental
+import local_archive_server as las
+import prep_data as prep
+import synthetic_data as syn
+import utilities as ut
+
+import os
+import io
+import pandas as pd
+import pytest
+
+def read_tables(save_path,year):
+    return {name: pd.read_csv(os.path.join(save_path,f'{name}_{year}.csv'),index_col='date') for name in ['status_hours','daily_quality','hourly_status','night_status']}
+
+@pytest.mark.parametrize('served,with_header',[(False,False),(True,False),(False,True)])
+def test_growing_file_matches_full_run(tmp_path,settings,sample_files,served,with_header):
+    range_limits,thresholds = settings
+    if with_header:
+        # saved by pandas, with a header and an index column
+        os.makedirs(tmp_path / 'full')
+        full_path = str(tmp_path / 'full' / '2008.csv')
+        with open(sample_files[1],'rb') as f1, open(full_path,'wb') as f2:
+            f2.write(f1.read().replace(b',2019-',b',2008-'))
+    else:
+        full_path = syn.write_synthetic_year_files(tmp_path / 'full',[2008],days=5,seed=7)[0]
+    full_dir = tmp_path / 'full_run'
+    os.makedirs(full_dir)
+    prep.prep_all_available_data([full_path],range_limits,thresholds,save_path=str(full_dir))
+
+    with open(full_path,'rb') as f:
+        data = f.read()
+    archive_dir = tmp_path / 'archive'
+    os.makedirs(archive_dir)
+    growing_path = archive_dir / '2008.csv'
+    save_path = tmp_path / 'incremental'
+    os.makedirs(save_path)
+    if served:
+        server,base_url = las.start_server(str(archive_dir))
+        link = base_url + '2008.csv'
+    else:
+        link = str(growing_path)
+    try:
+        # cuts in the middle of lines and days, the last update reads the complete file
+        for fraction in [0.2,0.43,0.71,1]:
+            with open(growing_path,'wb') as f:
+                f.write(data[:int(len(data) * fraction)])
+            incremental.update_year(link,range_limits,thresholds,save_path=str(save_path),flush=fraction == 1,block_size=256*1024)
+            if fraction < 1:
+                assert '2008' not in ut.load_manifest(save_path)
+        key,_ = prep.get_year_input_key(link,range_limits,thresholds)
+        assert ut.load_manifest(save_path)['2008']['key'] == key
+        # a later prep of the same file takes the year as prepped
+        assert prep.find_years_to_prep([link],range_limits,thresholds,str(save_path),ut.load_manifest(save_path)) == []
+    finally:
+        if served:
+            server.shutdown()
+
+    expected = read_tables(full_dir,2008)
+    result = read_tables(save_path,2008)
+    for name in expected:
+        pd.testing.assert_frame_equal(result[name],expected[name])
+    with open(full_dir / 'NaN_info.txt') as f1, open(save_path / 'NaN_info.txt') as f2:
+        assert f1.read() == f2.read()
+    assert ut.load_manifest(save_path)['2008']['nan_report'] == ut.load_manifest(full_dir)['2008']['nan_report']
+
+def test_replace_csv_days(tmp_path):
+    df = pd.DataFrame({'Green': [1.0,2.0,3.0,4.0]},index=pd.Index(pd.date_range('2008-01-01',periods=4),name='date'))
+    path = tmp_path / 'status_hours_2008.csv'
+    df.iloc[:3].to_csv(path)
+    updated = df.iloc[2:] + 10
+    incremental.replace_csv_days(updated,str(path))
+    expected = pd.concat([df.iloc[:2],updated])
+    pd.testing.assert_frame_equal(pd.read_csv(path,index_col='date',parse_dates=['date']),expected,check_freq=False)
+    incremental.replace_csv_days(df,str(path))
+    pd.testing.assert_frame_equal(pd.read_csv(path,index_col='date',parse_dates=['date']),df,check_freq=False)
+
+def test_find_day_offset_with_small_blocks():
+    data = pd.DataFrame({'Green': [1.0,2.0]},index=pd.Index(pd.date_range('2008-01-01',periods=2),name='date')).to_csv().encode()
+    header_end = data.index(b'\n') + 1
+    # blocks smaller than a line are read back in growing blocks
+    for block_size in [1,4,1000]:
+        assert incremental._find_day_offset(io.BytesIO(data),b'2007-12-31',block_size) == header_end
+        assert incremental._find_day_offset(io.BytesIO(data),b'2008-01-02',block_size) == data.index(b'2008-01-02')
+        assert incremental._find_day_offset(io.BytesIO(data),b'2008-01-05',block_size) == len(data)
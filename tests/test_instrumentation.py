@@ -0,0 +1,14 @@
+import prep_data as prep
+import instrumentation as ins
+
+import io
+import pytest
+
+@pytest.mark.parametrize('chunksize',[None,5000])
+def test_recorded_stages_are_documented(settings,sample_files,chunksize):
+    range_limits,thresholds = settings
+    timings = []
+    prep.get_and_prep_data(sample_files[1],range_limits,thresholds,save_results=False,nan_file=io.StringIO(),chunksize=chunksize,timings=timings)
+    recorded = [record['stage'] for record in timings]
+    assert set(recorded) == set(ins.stage_names) - {'download','write'}
+    assert all(record['seconds'] >= 0 for record in timings)
@@ -0,0 +1,41 @@
+import myplots
+import prep_data as prep
+
+import os
+import matplotlib
+import numpy as np
+import pandas as pd
+import pytest
+
+@pytest.fixture
+def daily_hours():
+    '''
+    Two years of random daily hours of each status.
+    '''
+    rng = np.random.default_rng(2)
+    index = pd.date_range('2010-01-01','2011-12-31',freq='D',name='date')
+    green = rng.uniform(0,24,len(index))
+    yellow = rng.uniform(0,24 - green)
+    df = pd.DataFrame({'Green': green, 'Yellow': yellow, 'Red': 24 - green - yellow},index=index)
+    prep.add_month_year_columns(df)
+    return df
+
+def test_render_figures_with_agg(tmp_path,daily_hours):
+    myplots.render_figures(daily_hours,str(tmp_path),preview=True,num_workers=1)
+    assert matplotlib.get_backend().lower() == 'agg'
+    assert len(os.listdir(tmp_path)) == len(myplots.report_figures)
+    assert all(os.path.getsize(tmp_path / name) for name in os.listdir(tmp_path))
+
+def test_plot_computes_only_its_aggregates(monkeypatch,daily_hours):
+    computed = []
+    compute_plot_aggregates = myplots.compute_plot_aggregates
+    def compute(df,cube=None,names=None):
+        aggregates = compute_plot_aggregates(df,cube,names)
+        computed.append(sorted(aggregates))
+        return aggregates
+    monkeypatch.setattr(myplots,'compute_plot_aggregates',compute)
+    myplots._use_agg_backend()
+    myplots.avg_daily_hours(daily_hours)
+    myplots.plot_combined_distribution_wx_stacked(daily_hours)
+    myplots.plt.close('all')
+    assert computed == [['monthly_means'],['status_histograms']]
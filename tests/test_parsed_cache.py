@@ -0,0 +1,55 @@
+import parsed_cache
+import prep_data as prep
+import local_archive_server as las
+
+import os
+import shutil
+import pandas as pd
+
+def counting_reader(calls):
+    def read_func(link,column_names,columns_of_interest,**kwargs):
+        calls.append(kwargs)
+        return prep.read_data_of_interest(link,column_names,columns_of_interest,**kwargs)
+    return read_func
+
+def test_round_trip(tmp_path,sample_files):
+    calls = []
+    cache_dir = str(tmp_path / 'parsed')
+    expected = prep.read_data_of_interest(sample_files[0],prep.column_names,prep.columns_of_interest,parser='c')
+    for _ in range(2):
+        df = parsed_cache.read_data_of_interest_cached(sample_files[0],prep.column_names,prep.columns_of_interest,cache_dir=cache_dir,read_func=counting_reader(calls),parser='c')
+        pd.testing.assert_frame_equal(df,expected)
+    assert len(calls) == 1
+
+def test_rebuilt_when_source_schema_or_dtype_changes(tmp_path,sample_files):
+    calls = []
+    cache_dir = str(tmp_path / 'parsed')
+    link = str(tmp_path / '1994.csv')
+    shutil.copy(sample_files[0],link)
+    read_func = counting_reader(calls)
+
+    def read(columns_of_interest=prep.columns_of_interest,float_dtype='float64'):
+        return parsed_cache.read_data_of_interest_cached(link,prep.column_names,columns_of_interest,cache_dir=cache_dir,read_func=read_func,parser='c',float_dtype=float_dtype)
+
+    read()
+    assert read(float_dtype='float32')['humidity'].dtype == 'float32'
+    # a float32 parse isn't returned to a float64 caller
+    assert read()['humidity'].dtype == 'float64'
+    assert len(calls) == 3
+    read(columns_of_interest=[col for col in prep.columns_of_interest if col != 'visibility'])
+    assert len(calls) == 4
+    read()
+    # a new modification time is a changed source
+    os.utime(link,ns=(0,0))
+    read()
+    assert len(calls) == 6
+
+def test_url_uses_the_raw_cache_dir(tmp_path,sample_files):
+    server,base_url = las.start_server(os.path.dirname(sample_files[0]))
+    raw_cache_dir = tmp_path / 'raw'
+    try:
+        df = parsed_cache.read_data_of_interest_cached(base_url + '1994.csv',prep.column_names,prep.columns_of_interest,cache_dir=str(tmp_path / 'parsed'),parser='c',raw_cache_dir=str(raw_cache_dir))
+    finally:
+        server.shutdown()
+    assert os.listdir(raw_cache_dir)
+    pd.testing.assert_frame_equal(df,prep.read_data_of_interest(sample_files[0],prep.column_names,prep.columns_of_interest,parser='c'))
@@ -0,0 +1,132 @@
+import prep_data as prep
+import utilities as ut
+import raw_cache
+import local_archive_server as las
+import synthetic_data as syn
+
+import os
+import io
+import filecmp
+import pandas as pd
+import pytest
+
+def test_get_year_number():
+    assert ut.get_year_number('2019_sample') == 2019
+    assert ut.get_year_number(1994) == 1994
+
+def test_skip_years_with_sample_names(tmp_path,settings,sample_files):
+    range_limits,thresholds = settings
+    prep.prep_all_available_data(sample_files,range_limits,thresholds,save_path=str(tmp_path),skip_years={2019},num_workers=1)
+    assert ut.get_years(str(tmp_path)) == ['1994']
+
+def test_parallel_matches_serial_on_sample_data(tmp_path,settings,sample_files):
+    range_limits,thresholds = settings
+    serial_dir,parallel_dir = tmp_path / 'serial',tmp_path / 'parallel'
+    for save_path,num_workers in [(serial_dir,1),(parallel_dir,2)]:
+        os.makedirs(save_path)
+        prep.prep_all_available_data(sample_files,range_limits,thresholds,save_path=str(save_path),skip_years={1993},num_workers=num_workers)
+    assert ut.get_years(str(serial_dir)) == ['1994','2019_sample']
+    csv_files = sorted(name for name in os.listdir(serial_dir) if name.endswith('.csv'))
+    _,mismatch,errors = filecmp.cmpfiles(serial_dir,parallel_dir,csv_files + ['NaN_info.txt'],shallow=False)
+    assert not mismatch and not errors
+    assert prep.load_status_hours(str(serial_dir)).equals(prep.load_status_hours(str(parallel_dir)))
+
+def test_header_files_read_over_http_and_from_the_cache(tmp_path,sample_files):
+    local = prep.read_data_of_interest(sample_files[1],prep.column_names,prep.columns_of_interest,parser='c')
+    server,base_url = las.start_server(os.path.dirname(sample_files[1]))
+    try:
+        url = base_url + '2019_sample.csv'
+        remote = prep.read_data_of_interest(url,prep.column_names,prep.columns_of_interest,parser='c')
+        cached = prep.read_data_of_interest(raw_cache.get_cached_csv(url,cache_dir=str(tmp_path)),prep.column_names,prep.columns_of_interest,parser='c')
+    finally:
+        server.shutdown()
+    assert remote.equals(local)
+    assert cached.equals(local)
+
+def test_read_failure_is_raised(tmp_path,settings):
+    range_limits,thresholds = settings
+    with pytest.raises(Exception):
+        prep.get_and_prep_data(str(tmp_path / '2019.csv'),range_limits,thresholds,save_results=False)
+
+def test_year_without_manifest_entry_is_prepped_again(tmp_path,settings,sample_files):
+    range_limits,thresholds = settings
+    prep.prep_all_available_data(sample_files[:1],range_limits,thresholds,save_path=str(tmp_path))
+    ut.save_manifest(str(tmp_path),{})
+    changed_thresholds = dict(thresholds,humidity=(50,60))
+    prep.prep_all_available_data(sample_files[:1],range_limits,changed_thresholds,save_path=str(tmp_path))
+    key,_ = prep.get_year_input_key(sample_files[0],range_limits,changed_thresholds)
+    assert ut.load_manifest(str(tmp_path))['1994']['key'] == key
+
+@pytest.mark.parametrize('chunksize',[5,12])
+def test_chunks_shorter_than_the_wind_window_match_the_whole_year(tmp_path,settings,chunksize):
+    range_limits,thresholds = settings
+    # low enough that the sustained wind decides the status of many rows
+    thresholds = dict(thresholds,wind_sust=(2,4))
+    link = syn.write_synthetic_year_files(tmp_path,[2008],days=1,seed=2)[0]
+    whole = prep.get_and_prep_data(link,range_limits,thresholds,save_results=False,return_df=True,return_tables=True,nan_file=io.StringIO())
+    chunked = prep.get_and_prep_data(link,range_limits,thresholds,save_results=False,return_df=True,return_tables=True,nan_file=io.StringIO(),chunksize=chunksize)
+    for name in ['status_hours','hourly_status','night_status']:
+        pd.testing.assert_frame_equal(chunked[name],whole[name])
+
+def test_no_chunks(settings):
+    range_limits,thresholds = settings
+    with pytest.raises(ValueError):
+        prep.prep_chunks(iter([]),range_limits,thresholds,'2008')
+
+def test_uncached_years_are_keyed_without_downloading(tmp_path,settings,archive_dir):
+    range_limits,thresholds = settings
+    request_log = []
+    server,base_url = las.start_server(str(archive_dir),request_log=request_log)
+    cache_dir = str(tmp_path / 'cache')
+    save_path = str(tmp_path / 'prepped')
+    os.makedirs(save_path)
+    try:
+        urls = [base_url + '1994.csv',base_url + '2019.csv']
+        urls_to_prep = prep.find_years_to_prep(urls,range_limits,thresholds,save_path,{},cache_dir=cache_dir)
+        assert [url for url,_,_ in urls_to_prep] == urls
+        assert {request['method'] for request in request_log} == {'HEAD'}
+        # the workers download the years, and their keys match those of the cached files
+        prep.prep_all_available_data(urls,range_limits,thresholds,save_path=save_path,num_workers=2,cache_dir=cache_dir)
+        assert all(raw_cache.find_cached_csv(url,cache_dir) for url in urls)
+        del request_log[:]
+        assert prep.find_years_to_prep(urls,range_limits,thresholds,save_path,ut.load_manifest(save_path),cache_dir=cache_dir) == []
+    finally:
+        server.shutdown()
+    assert not [request for request in request_log if request['method'] == 'GET']
+
+def old_nan_report(df_raw,df_prepped):
+    '''
+    NaN_info.txt as it was written before the daily quality table, from the NaNs of the whole year before and after prepping.
+    '''
+    with io.StringIO() as f:
+        print('',file=f)
+        prep.count_NaNs(df_raw,f)
+        print('After prep',file=f)
+        prep.count_NaNs(df_prepped,f)
+        return f.getvalue()
+
+def test_nan_report_from_the_daily_quality_matches_the_old_report(settings,sample_files):
+    range_limits,thresholds = settings
+    synthetic = prep._format_raw_df(syn.generate_synthetic_year(2008,days=3,nan_rate=0.02,out_of_range_rate=0.01,seed=4),prep.column_names,prep.columns_of_interest)
+    for df_raw in [synthetic] + [prep.read_data_of_interest(link,prep.column_names,prep.columns_of_interest) for link in sample_files]:
+        df_prepped = prep.clean_and_classify(df_raw,range_limits,thresholds)
+        df_quality = prep.get_daily_quality(df_raw,df_prepped)
+        assert prep.get_nan_report(df_quality) == old_nan_report(df_raw,df_prepped)
+        # and after the quality tables of two chunks are added up
+        split = len(df_raw) // 2
+        tables = [prep.get_status_tables(df_raw.iloc[part],df_prepped.iloc[part]) for part in [slice(None,split),slice(split,None)]]
+        df_quality = prep.finish_status_tables({'daily_quality': tables[0]['daily_quality'].add(tables[1]['daily_quality'],fill_value=0), 'night_status': tables[0]['night_status']})['daily_quality']
+        assert prep.get_nan_report(df_quality) == old_nan_report(df_raw,df_prepped)
+
+def test_parse_raw_block_matches_reading_the_file(tmp_path,sample_files):
+    archive_path = syn.write_synthetic_year_files(tmp_path,[2008],days=1,seed=2)[0]
+    for path in [archive_path,sample_files[1]]:
+        with open(path,'rb') as f:
+            data = f.read()
+        # blocks of whole lines, the first one starts with the header if the file has one
+        cuts = [0] + [data.index(b'\n',len(data) * i // 3) + 1 for i in [1,2]] + [len(data)]
+        blocks = [data[start:end] for start,end in zip(cuts[:-1],cuts[1:])]
+        header = prep.get_block_header(blocks[0])
+        assert (header is None) == (path == archive_path)
+        df = pd.concat([prep.parse_raw_block(block,prep.column_names,prep.columns_of_interest,header=header) for block in blocks])
+        pd.testing.assert_frame_equal(df,prep.read_data_of_interest(path,prep.column_names,prep.columns_of_interest,parser='c'))
@@ -0,0 +1,79 @@
+import raw_store
+import prep_data as prep
+import synthetic_data as syn
+
+import numpy as np
+import pandas as pd
+import pytest
+
+@pytest.fixture
+def year_files(tmp_path):
+    return syn.write_synthetic_year_files(tmp_path / 'archive',[2008,2009],days=2,seed=3)
+
+def cleaned_years(links,range_limits):
+    '''
+    The rows the store should have, cleaned the way prep_data does.
+    '''
+    frames = []
+    for link in links:
+        df = prep.read_data_of_interest(link,prep.column_names,prep.columns_of_interest,parser='c')
+        cleaned = prep.remove_unreasonable_measurements(df,range_limits)
+        cleaned['10min'] = df['10min']
+        frames.append(cleaned[raw_store._stored_columns()])
+    return pd.concat(frames)
+
+def test_append_a_year(tmp_path,settings,year_files):
+    range_limits,_ = settings
+    store_dir = str(tmp_path / 'store')
+    meta = raw_store.build_store(year_files[:1],range_limits,store_dir=store_dir,parser='c')
+    first_year = dict(meta['years']['2008'])
+    meta = raw_store.build_store(year_files,range_limits,store_dir=store_dir,parser='c')
+    # 2008 is kept as it was and 2009 starts after it
+    assert meta['years']['2008'] == first_year
+    assert meta['years']['2009']['start_row'] == first_year['end_row']
+    expected = cleaned_years(year_files,range_limits)
+    assert meta['rows'] == len(expected)
+    store = raw_store.open_store(store_dir)
+    pd.testing.assert_frame_equal(raw_store.read_range_df(store),expected)
+    year_rows = raw_store.get_year_rows(store,2009)
+    np.testing.assert_array_equal(year_rows['time'],expected.loc['2009'].index.to_numpy())
+
+def test_range_across_the_year_boundary(tmp_path,settings,year_files):
+    range_limits,_ = settings
+    store_dir = str(tmp_path / 'store')
+    raw_store.build_store(year_files,range_limits,store_dir=store_dir,parser='c')
+    store = raw_store.open_store(store_dir)
+    expected = cleaned_years(year_files,range_limits)
+    start,end = '2008-01-02 23:00','2009-01-01 01:00'
+    rows = raw_store.read_range_df(store,start,end,columns=['humidity','wind_speed'])
+    in_range = expected[(expected.index >= start) & (expected.index < end)]
+    pd.testing.assert_frame_equal(rows,in_range[['humidity','wind_speed']])
+    assert rows.index[0].year == 2008 and rows.index[-1].year == 2009
+    # the start is included and the end excluded
+    first_2009 = expected.loc['2009'].index[0]
+    first_row,end_row = raw_store.get_row_range(store,first_2009,first_2009 + pd.Timedelta('1s'))
+    assert (first_row,end_row) == (store['meta']['years']['2009']['start_row'],store['meta']['years']['2009']['start_row'] + 1)
+    assert raw_store.get_row_range(store,end,start) == raw_store.get_row_range(store,end,end)
+
+def test_read_range_returns_views_of_the_files(tmp_path,settings,year_files):
+    range_limits,_ = settings
+    store_dir = str(tmp_path / 'store')
+    raw_store.build_store(year_files,range_limits,store_dir=store_dir,parser='c')
+    store = raw_store.open_store(store_dir)
+    rows = raw_store.read_range(store,'2008-01-02','2009-01-02')
+    for col in ['time'] + store['meta']['columns']:
+        assert np.shares_memory(rows[col],store[col])
+        assert isinstance(rows[col].base,np.memmap)
+        assert not rows[col].flags.writeable
+
+def test_year_out_of_order(tmp_path,settings,year_files):
+    range_limits,_ = settings
+    store_dir = str(tmp_path / 'store')
+    meta = raw_store.build_store(year_files[1:],range_limits,store_dir=store_dir,parser='c')
+    rows = meta['rows']
+    df = prep.read_data_of_interest(year_files[0],prep.column_names,prep.columns_of_interest,parser='c')
+    with pytest.raises(ValueError,match='time order'):
+        raw_store.append_year(df,'2008',store_dir,meta,range_limits)
+    # nothing was written
+    assert raw_store.load_meta(store_dir)['rows'] == rows
+    assert len(raw_store.open_store(store_dir)['time']) == rows
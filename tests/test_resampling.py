@@ -0,0 +1,37 @@
+import resampling as rs
+
+import numpy as np
+import pandas as pd
+import pytest
+from itertools import combinations
+
+@pytest.fixture
+def monthly_hours():
+    rng = np.random.default_rng(1)
+    months = ['Jan','Feb','Mar','Apr']
+    # groups of different sizes, with Jan and Feb the same size so they share their permutations with other pairs
+    sizes = [40,40,55,70]
+    return pd.DataFrame({'Green': np.concatenate([rng.normal(10 + i,3,size) for i,size in enumerate(sizes)]), 'month': np.repeat(months,sizes)})
+
+def test_results_do_not_depend_on_the_number_of_workers(monthly_hours):
+    # not a multiple of the batch size, so the last batch is shorter
+    num_resamples = rs.resample_batch_size * 2 + 500
+    serial = rs.resample_group_combos(monthly_hours,num_resamples=num_resamples,seed=3,num_workers=1)
+    parallel = rs.resample_group_combos(monthly_hours,num_resamples=num_resamples,seed=3,num_workers=3)
+    pd.testing.assert_frame_equal(serial,parallel)
+    assert len(serial) == 6
+
+def test_p_values_and_intervals(monthly_hours):
+    num_resamples = 2000
+    combos = list(combinations(['Jan','Feb','Mar','Apr'],2))
+    results = rs.resample_group_combos(monthly_hours,combos,num_resamples=num_resamples,seed=3)
+    assert ((results['perm_p_value'] >= 1 / (num_resamples + 1)) & (results['perm_p_value'] <= 1)).all()
+    assert ((results['ci_low'] <= results['mean_diff']) & (results['mean_diff'] <= results['ci_high'])).all()
+    # the means of Jan and Apr are a standard deviation apart, those of Jan and Feb a third of one
+    p_values = results.set_index(['group_1','group_2'])['perm_p_value']
+    assert p_values['Jan','Apr'] < 0.01
+    assert p_values['Jan','Feb'] > 0.01
+
+def test_group_without_values(monthly_hours):
+    results = rs.resample_group_combos(monthly_hours,combos=[('Jan','Dec')],num_resamples=100,seed=0)
+    assert results[['ci_low','ci_high','perm_p_value']].isna().all(axis=None)
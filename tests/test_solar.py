@@ -0,0 +1,57 @@
+import solar
+import prep_data as prep
+
+import numpy as np
+import pandas as pd
+import pytest
+
+def to_ns(times):
+    return pd.DatetimeIndex(times).as_unit('ns').asi8
+
+def test_sunrise_and_sunset_at_the_summit():
+    sunrise,sunset = solar.get_sun_crossings(np.array(['2019-06-21'],dtype='datetime64[D]'),solar.sunset_altitude)
+    # the times published for the summit (HST) are to the minute
+    assert abs(sunrise[0] - to_ns(['2019-06-21 05:36'])[0]) < 60e9
+    assert abs(sunset[0] - to_ns(['2019-06-21 19:17'])[0]) < 60e9
+    # the default night is from sunset to sunrise, astronomical twilight is later in the evening
+    assert solar.night_sun_altitude == solar.sunset_altitude
+    _,dark = solar.get_sun_crossings(np.array(['2019-06-21'],dtype='datetime64[D]'),solar.astronomical_twilight_altitude)
+    assert dark[0] - sunset[0] > 3600e9
+
+def test_night_codes():
+    times = to_ns(['2019-06-21 12:00','2019-06-21 19:00','2019-06-21 20:00','2019-06-22 05:00','2019-06-22 06:00','2019-06-22 23:00'])
+    times = np.append(times,np.iinfo(np.int64).min)
+    night_codes,nights = solar.get_night_codes(times)
+    night_dates = [str(nights[code]) if code >= 0 else None for code in night_codes]
+    assert night_dates == [None,None,'2019-06-21','2019-06-21',None,'2019-06-22',None]
+    night_hours = solar.get_night_hours(np.array(['2019-06-21'],dtype='datetime64[D]'))[0]
+    assert night_hours == pytest.approx(24 - (19 + 17 / 60) + 5 + 36 / 60,abs=0.05)
+
+@pytest.fixture
+def small_frame():
+    '''
+    Ten minute averages over two days with the status changing every hour.
+    '''
+    index = pd.date_range('2019-06-21 00:00','2019-06-22 23:50',freq='10min',name='date_time')
+    status = np.array(prep.statuses)[index.hour % 3]
+    return pd.DataFrame({'10min': 1, 'status': status},index=index)
+
+def test_hourly_and_night_tables(small_frame):
+    tables = prep.get_status_seconds(small_frame)
+    hourly,night = tables['hourly_status'],tables['night_status']
+    # each hour has one status for the full hour
+    assert hourly.shape == (2,72)
+    assert hourly.loc[:,'Green_00'].tolist() == [3600,3600]
+    assert np.isnan(hourly.loc[:,'Yellow_00']).all()
+    assert hourly.loc[:,'Yellow_01'].tolist() == [3600,3600]
+    # the hourly table adds up to the daily one
+    daily = hourly.T.groupby(lambda col: col.split('_')[0]).sum().T[prep.statuses]
+    pd.testing.assert_frame_equal(daily,tables['status_hours'],check_names=False)
+    # the nights before the first day and of the last day are partly covered
+    assert [str(night) for night in night.index] == ['2019-06-20','2019-06-21','2019-06-22']
+    night_codes,nights = solar.get_night_codes(small_frame.index.as_unit('ns').asi8)
+    is_night = night_codes >= 0
+    expected = pd.Series(600.0,index=small_frame.index[is_night]).groupby([nights[night_codes[is_night]],small_frame['status'][is_night]]).sum().unstack()
+    np.testing.assert_array_equal(night[prep.statuses].to_numpy(),expected[prep.statuses].to_numpy())
+    # the night of the first day is covered from sunset to sunrise, to the nearest measurement
+    assert night[prep.statuses].sum(axis=1).iloc[1] == pytest.approx(solar.get_night_hours(nights[1:2])[0] * 3600,abs=600)
@@ -0,0 +1,56 @@
+import status_store
+import prep_data as prep
+
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import pytest
+
+def daily_table(dates,green):
+    return pd.DataFrame({'Green': green, 'rows': np.arange(len(dates))},index=pd.Index(pd.to_datetime(dates),name='date'))
+
+def test_update_days_replaces_the_row_of_each_date_and_year(tmp_path):
+    store_path = str(tmp_path / status_store.store_name)
+    status_store.write_year(daily_table(['2019-01-01','2019-01-02','2019-12-31'],[1.0,2.0,3.0]),2019,store_path)
+    # the night of Dec 31 2019 is also in the tables of 2020
+    status_store.write_year(daily_table(['2019-12-31','2020-01-01'],[4.0,5.0]),'2020_sample',store_path)
+    status_store.update_days(daily_table(['2019-01-02','2019-01-03'],[np.nan,6.0]),2019,store_path)
+    df = status_store.read_days(store_path)
+    assert list(df.index.strftime('%Y-%m-%d')) == ['2019-01-01','2019-01-02','2019-01-03','2019-12-31','2019-12-31','2020-01-01']
+    assert np.isnan(df['Green'].iloc[1])
+    assert df['Green'].iloc[2] == 6.0
+    assert sorted(df['Green'].iloc[3:5]) == [3.0,4.0]
+    assert status_store.get_store_years(store_path) == [2019,2020]
+    # writing a year again drops the days that aren't in it anymore
+    status_store.write_year(daily_table(['2019-01-01'],[7.0]),2019,store_path)
+    assert list(status_store.read_days(store_path,years=[2019])['Green']) == [7.0]
+
+def test_unknown_table(tmp_path):
+    with pytest.raises(ValueError):
+        status_store.write_year(daily_table(['2019-01-01'],[1.0]),2019,str(tmp_path / status_store.store_name),table='status')
+
+@pytest.fixture
+def prepped_dirs(tmp_path,settings,sample_files):
+    '''
+    The sample years prepped into a directory with the store, and a copy without it so the tables are read from the csv files.
+    '''
+    range_limits,thresholds = settings
+    store_dir,csv_dir = tmp_path / 'store',tmp_path / 'csv'
+    os.makedirs(store_dir)
+    os.makedirs(csv_dir)
+    prep.prep_all_available_data(sample_files,range_limits,thresholds,save_path=str(store_dir),num_workers=1)
+    for name in os.listdir(store_dir):
+        if name != status_store.store_name:
+            shutil.copy(store_dir / name,csv_dir / name)
+    return store_dir,csv_dir
+
+def test_read_days_matches_the_csv_files(prepped_dirs):
+    store_dir,csv_dir = prepped_dirs
+    assert os.path.exists(status_store.get_store_path(store_dir))
+    for table in status_store.tables:
+        for filters in [{},{'start': '1994-10-01', 'end': '2019-01-02'},{'months': ['Jan',11]},{'years': [2019]},{'start': '1994-10-15', 'months': ['Oct','Dec'], 'years': [1994,2019]}]:
+            from_store = prep._combine_daily_tables(str(store_dir),table,**filters)
+            from_csv = prep._combine_daily_tables(str(csv_dir),table,**filters)
+            assert len(from_store)
+            pd.testing.assert_frame_equal(from_store,from_csv,check_index_type=False,check_freq=False)
@@ -0,0 +1,46 @@
+import prep_data as prep
+import streaming_pipeline
+import local_archive_server as las
+import utilities as ut
+
+import os
+import filecmp
+
+def prep_batch(archive_dir,save_path,settings):
+    range_limits,thresholds = settings
+    os.makedirs(save_path)
+    prep.prep_all_available_data([str(archive_dir / '1994.csv'),str(archive_dir / '2019.csv')],range_limits,thresholds,save_path=str(save_path))
+
+def assert_same_outputs(dir1,dir2):
+    names = sorted(name for name in os.listdir(dir1) if name.endswith('.csv')) + ['NaN_info.txt']
+    _,mismatch,errors = filecmp.cmpfiles(dir1,dir2,names,shallow=False)
+    assert not mismatch and not errors
+
+def test_streaming_matches_batch_with_a_dropped_download(tmp_path,archive_dir,settings):
+    range_limits,thresholds = settings
+    prep_batch(archive_dir,tmp_path / 'batch',settings)
+    request_log = []
+    server,base_url = las.start_server(str(archive_dir),fail_after_bytes=300000,num_failures=1,request_log=request_log)
+    save_path = tmp_path / 'runs' / 'prepped_data_0001'
+    os.makedirs(save_path)
+    try:
+        urls = [base_url + '1994.csv',base_url + '2019.csv']
+        streaming_pipeline.prep_all_available_data_streaming(urls,range_limits,thresholds,save_path=str(save_path),num_workers=2,cache_dir=str(tmp_path / 'cache'),chunksize=5000,byte_chunk_size=64*1024,backoff=0)
+        assert_same_outputs(tmp_path / 'batch',save_path)
+        resumed = [request for request in request_log if request['Range']]
+        assert resumed and all(request['If-Range'] for request in resumed)
+
+        # a new run reuses both years from the earlier one without downloading them
+        del request_log[:]
+        new_path = tmp_path / 'runs' / 'prepped_data_0002'
+        os.makedirs(new_path)
+        streaming_pipeline.prep_all_available_data_streaming(urls,range_limits,thresholds,save_path=str(new_path),num_workers=2,cache_dir=str(tmp_path / 'cache'),previous_runs_dir=str(tmp_path / 'runs'))
+    finally:
+        server.shutdown()
+    assert not [request for request in request_log if request['method'] == 'GET']
+    assert ut.get_years(str(new_path)) == ['1994','2019']
+    assert_same_outputs(tmp_path / 'batch',new_path)
+
+def test_resume_headers_without_validators():
+    assert streaming_pipeline.get_resume_headers(100,{'ETag': None, 'Last-Modified': None}) == {'Range': 'bytes=100-'}
+    assert streaming_pipeline.get_resume_headers(100,{'ETag': '"a"'}) == {'Range': 'bytes=100-', 'If-Range': '"a"'}
@@ -0,0 +1,37 @@
+import io
+import numpy as np
+import pandas as pd
+import pytest
+
+import prep_data as prep
+import synthetic_data as syn
+import threshold_sweep as sweep
+
+@pytest.fixture(params=['10s','10min'])
+def synthetic_file(request,tmp_path):
+    return syn.write_synthetic_year_files(tmp_path,[2008],regime=request.param,days=40,seed=3)[0]
+
+def check_sweep_matches_pipeline(link,settings):
+    range_limits,thresholds = settings
+    thresholds_list = sweep.threshold_grid(thresholds,humidity=[thresholds['humidity'],(60,70)],wind_sust=[thresholds['wind_sust'],(5,20)])
+    sweep_df = sweep.sweep_thresholds(sweep.load_cleaned_data(link,range_limits),thresholds_list,block_rows=5000)
+    for i,set_thresholds in enumerate(thresholds_list):
+        expected = prep.get_and_prep_data(link,range_limits,set_thresholds,save_results=False,return_df=True,nan_file=io.StringIO())
+        result = sweep_df.xs(i,level='threshold_set')
+        result.index.name = 'date'
+        pd.testing.assert_frame_equal(result,expected,check_names=False,check_index_type=False)
+
+def test_sweep_matches_pipeline_synthetic(synthetic_file,settings):
+    check_sweep_matches_pipeline(synthetic_file,settings)
+
+def test_sweep_matches_pipeline_sample(sample_files,settings):
+    for link in sample_files:
+        check_sweep_matches_pipeline(link,settings)
+
+def test_load_cleaned_data_matches_clean_and_classify(sample_files,settings):
+    range_limits,thresholds = settings
+    cleaned = sweep.load_cleaned_data(sample_files[1],range_limits)
+    prepped = prep.clean_and_classify(prep.read_data_of_interest(sample_files[1],prep.column_names,prep.columns_of_interest),range_limits,thresholds)
+    assert 'status' not in cleaned
+    pd.testing.assert_frame_equal(cleaned,prepped.drop(columns='status'))
+    assert np.isfinite(cleaned['wind_sust']).any()
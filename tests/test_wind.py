@@ -0,0 +1,49 @@
+import prep_data as prep
+import synthetic_data as syn
+import wind
+
+import numpy as np
+import pandas as pd
+import pytest
+
+@pytest.fixture
+def raw_wind():
+    '''
+    Two days of raw wind speeds with NaNs and gaps of a few minutes to an hour.
+    '''
+    df = prep._format_raw_df(syn.generate_synthetic_year(2008,days=2,nan_rate=0.05,seed=5),prep.column_names,prep.columns_of_interest)
+    rng = np.random.default_rng(5)
+    keep = np.ones(len(df),dtype=bool)
+    for start in rng.integers(0,len(df) - 400,size=20):
+        keep[start:start + rng.integers(10,400)] = False
+    df = df[keep]
+    return pd.Series(df['wind_speed'].where(df['wind_speed'] >= 0).to_numpy(),index=df.index)
+
+@pytest.mark.parametrize('window',wind.default_windows + ['120s'])
+def test_rolling_wind_matches_pandas(raw_wind,window):
+    sustained,peak = wind.rolling_wind(raw_wind.index.as_unit('ns').asi8,raw_wind.to_numpy(),[window])[window]
+    rolling = raw_wind.rolling(window)
+    # the kernel sums the two decimal measurements exactly, pandas' running sum drifts by about 1e-12
+    np.testing.assert_allclose(sustained,rolling.mean().to_numpy(),rtol=1e-9)
+    np.testing.assert_array_equal(peak,rolling.max().to_numpy())
+
+def test_gap_tolerance_matches_pandas_by_segment(raw_wind):
+    gap_tolerance = '60s'
+    sustained,peak = wind.rolling_wind(raw_wind.index.as_unit('ns').asi8,raw_wind.to_numpy(),['5min'],gap_tolerance=gap_tolerance)['5min']
+    segments = (raw_wind.index.to_series().diff() > pd.Timedelta(gap_tolerance)).cumsum()
+    rolling = raw_wind.groupby(segments.to_numpy()).rolling('5min')
+    assert segments.iloc[-1] > 0
+    np.testing.assert_allclose(sustained,rolling.mean().to_numpy(),rtol=1e-9)
+    np.testing.assert_array_equal(peak,rolling.max().to_numpy())
+
+def test_sustained_wind_uses_only_raw_rows():
+    index = pd.date_range('2008-01-01',periods=6,freq='10s')
+    df = pd.DataFrame({'wind_speed': [9.9,10.1,30.0,9.9,10.1,np.nan], '10min': [0,0,1,0,0,0]},index=index)
+    wind_sust = wind.sustained_wind(df,'120s')
+    raw = df[df['10min'] == 0]['wind_speed']
+    expected = raw.rolling('120s').mean().reindex(index).to_numpy()
+    expected[2] = 30.0
+    np.testing.assert_allclose(wind_sust,expected)
+    # means of measurements with two decimals are exact, so 10 isn't put over a threshold of 10
+    assert wind_sust[1] == 10.0
+    assert wind_sust[4] == 10.0